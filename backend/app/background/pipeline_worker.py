@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..routers.pipeline import PIPELINE_RUN_JOB, PipelineRequest, execute_pipeline_run
+from ..storage.job_queue import Job, JobQueue, job_queue
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 5.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+Report = Callable[[Dict[str, Any]], None]
+JobHandler = Callable[[Job, Report], Awaitable[Dict[str, Any]]]
+
+
+async def _pipeline_run(job: Job, report: Report) -> Dict[str, Any]:
+  return await execute_pipeline_run(job.user_id, PipelineRequest(**job.payload), on_progress=report)
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {PIPELINE_RUN_JOB: _pipeline_run}
+
+
+class PipelineWorker:
+  """
+  Consumes the job queue: claims up to ``concurrency`` jobs at a time, runs each through the
+  handler for its kind and heartbeats the latest progress while it runs, which also keeps the
+  lease alive. Jobs left behind by a worker that died are re-claimed once their lease expires.
+  """
+
+  def __init__(
+    self,
+    queue: JobQueue,
+    *,
+    handlers: Optional[Dict[str, JobHandler]] = None,
+    worker_id: Optional[str] = None,
+    concurrency: int = 1,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+  ):
+    self.queue = queue
+    self.handlers = handlers if handlers is not None else JOB_HANDLERS
+    self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    self.concurrency = max(1, concurrency)
+    self.poll_interval = poll_interval
+
+  async def run(self, stop: asyncio.Event) -> None:
+    slots = asyncio.Semaphore(self.concurrency)
+    running: Set[asyncio.Task] = set()
+    logger.info("Pipeline worker started", extra={"worker_id": self.worker_id, "concurrency": self.concurrency})
+    try:
+      while await self._acquire_unless_stopped(slots, stop):
+        try:
+          job = await run_in_threadpool(self.queue.claim, self.worker_id)
+        except Exception as exc:
+          logger.warning("Job claim failed", extra={"worker_id": self.worker_id, "error": str(exc)})
+          job = None
+        if job is None:
+          slots.release()
+          try:
+            await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+          except asyncio.TimeoutError:
+            pass
+          continue
+        task = asyncio.create_task(self._run_job(job))
+        running.add(task)
+
+        def finished(done: asyncio.Task) -> None:
+          running.discard(done)
+          slots.release()
+
+        task.add_done_callback(finished)
+    finally:
+      # Interrupted jobs keep their lease until it expires; then another worker takes them over.
+      for task in running:
+        task.cancel()
+      await asyncio.gather(*running, return_exceptions=True)
+
+  @staticmethod
+  async def _acquire_unless_stopped(slots: asyncio.Semaphore, stop: asyncio.Event) -> bool:
+    """Wait for a free slot; False (holding no slot) as soon as ``stop`` is set."""
+    if stop.is_set():
+      return False
+    acquire = asyncio.ensure_future(slots.acquire())
+    stopped = asyncio.ensure_future(stop.wait())
+    try:
+      await asyncio.wait({acquire, stopped}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+      stopped.cancel()
+      acquired = acquire.done() and not acquire.cancelled()
+      if not acquired:
+        acquire.cancel()
+    if acquired and stop.is_set():
+      slots.release()
+      acquired = False
+    return acquired
+
+  async def run_once(self) -> Optional[Job]:
+    """Claim and run a single job, if one is waiting; returns it in its final state."""
+    job = await run_in_threadpool(self.queue.claim, self.worker_id)
+    if job is None:
+      return None
+    await self._run_job(job)
+    return await run_in_threadpool(self.queue.get, job.id)
+
+  async def _run_job(self, job: Job) -> None:
+    handler = self.handlers.get(job.kind)
+    if handler is None:
+      await run_in_threadpool(self.queue.fail, job.id, self.worker_id, f"Unknown job kind: {job.kind}")
+      return
+    progress: Dict[str, Any] = dict(job.progress)
+    work = asyncio.create_task(handler(job, progress.update))
+    heartbeat = asyncio.create_task(self._heartbeat(job, progress, work))
+    logger.info("Job started", extra={"job_id": job.id, "kind": job.kind, "attempt": job.attempts})
+    try:
+      result = await work
+    except asyncio.CancelledError:
+      # The heartbeat only finishes on its own after cancelling a job whose lease was lost.
+      if heartbeat.done() and not heartbeat.cancelled():
+        logger.warning("Job abandoned after losing its lease", extra={"job_id": job.id, "worker_id": self.worker_id})
+        return
+      raise
+    except Exception as exc:
+      logger.exception("Job failed", extra={"job_id": job.id, "kind": job.kind})
+      error = str(exc) or exc.__class__.__name__
+      owned = await run_in_threadpool(self.queue.fail, job.id, self.worker_id, error, progress=dict(progress))
+      if not owned:
+        logger.warning("Job failure not recorded; lease was lost", extra={"job_id": job.id})
+      return
+    finally:
+      heartbeat.cancel()
+      work.cancel()
+    owned = await run_in_threadpool(self.queue.complete, job.id, self.worker_id, result, progress=dict(progress))
+    if owned:
+      logger.info("Job finished", extra={"job_id": job.id, "kind": job.kind})
+    else:
+      logger.warning("Job result discarded; lease was lost", extra={"job_id": job.id, "worker_id": self.worker_id})
+
+  async def _heartbeat(self, job: Job, progress: Dict[str, Any], work: asyncio.Task) -> None:
+    interval = min(HEARTBEAT_SECONDS, self.queue.lease_seconds / 3)
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        owned = await run_in_threadpool(self.queue.heartbeat, job.id, self.worker_id, dict(progress))
+      except Exception as exc:
+        logger.warning("Job heartbeat failed", extra={"job_id": job.id, "error": str(exc)})
+        continue
+      if not owned:
+        # Another worker may already have claimed the job; stop instead of running it twice.
+        logger.warning("Job lease lost", extra={"job_id": job.id, "worker_id": self.worker_id})
+        work.cancel()
+        return
+
+
+pipeline_worker = PipelineWorker(job_queue, concurrency=max(1, settings.pipeline_embedded_workers))
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run queued /api/pipeline/run jobs.")
+  parser.add_argument("--concurrency", type=int, default=1, help="Jobs run at the same time by this process")
+  parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+  parser.add_argument("--once", action="store_true", help="Run at most one job and exit")
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.INFO)
+
+  worker = PipelineWorker(job_queue, concurrency=args.concurrency, poll_interval=args.poll_interval)
+  if args.once:
+    asyncio.run(worker.run_once())
+  else:
+    asyncio.run(worker.run(asyncio.Event()))
@@ -8,11 +8,14 @@ from datetime import datetime, timezone
 from typing import Any, Dict, List
 
 import httpx
+from fastapi.concurrency import run_in_threadpool
 
 from ..services.token_service import get_or_refresh_tokens, log_token_event
 from ..services.gmail_oauth import refresh_token as gmail_refresh
 from ..services.supabase_client import get_supabase_client
 from ..services.hubspot_client import hubspot_client
+from ..services.gmail_ingest import gmail_ingestor, message_to_snapshot
+from ..storage.message_snapshots import message_snapshots
 
 logger = logging.getLogger(__name__)
 
@@ -169,6 +172,7 @@ async def poll_gmail_for_user(user_id: str) -> Dict[str, Any]:
 
   now_iso = datetime.now(timezone.utc).isoformat()
   rows = []
+  snapshots: Dict[str, Dict[str, Any]] = {}
   # Filter by baseline_at using internalDate if available
   for msg in msgs:
     try:
@@ -211,10 +215,16 @@ async def poll_gmail_for_user(user_id: str) -> Dict[str, Any]:
         skipped += 1
         continue
       rows.append(row)
+      # Messages with attachments are left to the first fetch, which extracts their text too.
+      if not gmail_ingestor.has_attachments(full):
+        snapshots[row["message_id"]] = message_to_snapshot(gmail_ingestor.parse_message(full, []))
     except Exception as exc:
       logger.error("gmail:message_parse_failed user_id=%s msg_id=%s error=%s", user_id, msg.get("id"), exc)
       errors += 1
 
+  # Compressing and writing the snapshots is blocking work; keep it off the event loop.
+  await run_in_threadpool(message_snapshots.put_many, user_id, snapshots)
+
   if rows:
     to_insert = []
     for r in rows:
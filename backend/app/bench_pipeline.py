@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .config import settings
+from .services.ai_router import ai_router
+from .services.gmail_ingest import AttachmentText, GmailMessage
+from .services.llm import async_gemini_client
+from .services.llm_telemetry import llm_telemetry
+from .services.llm_transport import TRANSPORT_MODES
+from .services.planner import build_enhanced_crm_plan
+from .services.validator import validator_service
+from .storage.llm_cache import llm_cache
+
+_SUBJECTS = ["Quote for {n} seats", "Invoice #{n} overdue", "Login broken since update {n}", "Intro call re: project {n}"]
+_BODIES = [
+  "Hi, could you send pricing for {n} licenses? We'd like to start next quarter.",
+  "Our invoice {n} shows the wrong amount, please correct it before the end of the month.",
+  "Since the last release (build {n}) nobody on our team can log in. This is urgent.",
+  "Great meeting you at the conference. Would love to discuss project {n} with your team.",
+]
+
+
+def generated_messages(count: int, *, seed: int = 0) -> List[GmailMessage]:
+  rng = random.Random(seed)
+  messages = []
+  for idx in range(count):
+    kind, n = rng.randrange(len(_SUBJECTS)), rng.randint(10, 9999)
+    messages.append(
+      GmailMessage(
+        message_id=f"bench_{idx}",
+        thread_id=None,
+        subject=_SUBJECTS[kind].format(n=n),
+        sender=f"Contact {idx} <contact{idx}@customer{idx % 50}.example>",
+        recipients=["sales@ours.example"],
+        sent_at=None,
+        snippet=None,
+        body_text=_BODIES[kind].format(n=n),
+        attachments=[],
+      )
+    )
+  return messages
+
+
+def load_messages(path: Path) -> List[GmailMessage]:
+  """A JSON list of GmailMessage-shaped objects (attachments as {filename, mime_type, text})."""
+  rows = json.loads(path.read_text(encoding="utf-8"))
+  return [
+    GmailMessage(
+      message_id=row["message_id"],
+      thread_id=row.get("thread_id"),
+      subject=row.get("subject"),
+      sender=row.get("sender"),
+      recipients=row.get("recipients") or [],
+      sent_at=None,
+      snippet=row.get("snippet"),
+      body_text=row.get("body_text") or "",
+      attachments=[AttachmentText(**att) for att in row.get("attachments") or []],
+    )
+    for row in rows
+  ]
+
+
+async def run(messages: List[GmailMessage], *, user_id: str | None, concurrency: int) -> Dict[str, Any]:
+  """The LLM half of /api/pipeline/run (routing, extraction, validation, planning) without Supabase or CRM I/O."""
+  semaphore = asyncio.Semaphore(concurrency)
+  latencies: List[float] = []
+  sources: Dict[str, int] = {}
+  errors = 0
+
+  async def one(message: GmailMessage) -> None:
+    nonlocal errors
+    async with semaphore:
+      start = time.perf_counter()
+      try:
+        routing, raw_json = await ai_router.aclassify_and_extract(message, user_id=user_id)
+        extraction = await validator_service.avalidate(message, raw_json, user_id=user_id)
+        build_enhanced_crm_plan(message, extraction, routing)
+      except Exception:
+        errors += 1
+        return
+      latencies.append((time.perf_counter() - start) * 1000)
+      source = routing.source.split(":", 1)[0]
+      sources[source] = sources.get(source, 0) + 1
+
+  start = time.perf_counter()
+  await asyncio.gather(*(one(message) for message in messages))
+  elapsed = time.perf_counter() - start
+  await async_gemini_client.aclose()
+  return {
+    "messages": len(messages),
+    "errors": errors,
+    "elapsed_seconds": round(elapsed, 3),
+    "messages_per_second": round(len(messages) / elapsed, 2) if elapsed else None,
+    "latency_ms": {f"p{p}": round(float(np.percentile(latencies, p)), 2) for p in (50, 95, 99)} if latencies else None,
+    "routing_sources": sources,
+    "llm": llm_telemetry.summary(fresh=True)["groups"],
+  }
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Benchmark pipeline throughput against recorded or synthetic Gemini responses.")
+  parser.add_argument("--mode", choices=TRANSPORT_MODES, default="synthetic")
+  parser.add_argument("--messages", type=Path, help="JSON list of messages; generated messages are used when omitted")
+  parser.add_argument("--count", type=int, default=100, help="Number of generated messages")
+  parser.add_argument("--latency-ms", type=float, default=settings.llm_transport_latency_ms)
+  parser.add_argument("--concurrency", type=int, default=settings.pipeline_message_concurrency)
+  parser.add_argument("--user-id")
+  parser.add_argument("--use-cache", action="store_true", help="Serve repeated prompts from the LLM response cache")
+  args = parser.parse_args()
+
+  settings.llm_transport_mode = args.mode
+  settings.llm_transport_latency_ms = args.latency_ms
+  llm_cache.enabled = args.use_cache
+  batch = load_messages(args.messages) if args.messages else generated_messages(args.count)
+  print(json.dumps(asyncio.run(run(batch, user_id=args.user_id, concurrency=args.concurrency)), indent=2))
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
 from pydantic import AnyHttpUrl, Field, HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -21,6 +21,75 @@ class Settings(BaseSettings):
   gemini_endpoint: HttpUrl = Field("https://generativelanguage.googleapis.com/v1beta/models", alias="GEMINI_ENDPOINT")
   gemini_model: str = Field("gemini-2.0-flash", alias="GEMINI_MODEL")
   gemini_api_keys_raw: str = Field(..., alias="GEMINI_API_KEYS")
+  gemini_max_in_flight: int = Field(8, alias="GEMINI_MAX_IN_FLIGHT")
+  # Per-purpose model overrides, e.g. "routing=gemini-2.0-flash-lite,analysis=gemini-2.5-flash".
+  llm_purpose_models_raw: str = Field("", alias="LLM_PURPOSE_MODELS")
+  # Cascade: route with the cheap model first and re-ask the purpose's model when the answer is
+  # below AIRouter.confidence_threshold or unusable.
+  llm_cascade_enabled: bool = Field(False, alias="LLM_CASCADE_ENABLED")
+  llm_cascade_model: str = Field("gemini-2.0-flash-lite", alias="LLM_CASCADE_MODEL")
+  llm_prompt_token_budget: int = Field(12000, alias="LLM_PROMPT_TOKEN_BUDGET")
+  # Sender, company, amounts and dates found locally are handed to the model as known fields.
+  llm_local_extraction_enabled: bool = Field(True, alias="LLM_LOCAL_EXTRACTION_ENABLED")
+  # Content beyond llm_map_reduce_min_tokens is condensed chunk by chunk before extraction.
+  llm_map_reduce_enabled: bool = Field(True, alias="LLM_MAP_REDUCE_ENABLED")
+  llm_map_reduce_min_tokens: int = Field(12000, alias="LLM_MAP_REDUCE_MIN_TOKENS")
+  llm_map_reduce_chunk_tokens: int = Field(6000, alias="LLM_MAP_REDUCE_CHUNK_TOKENS")
+  llm_map_reduce_concurrency: int = Field(4, alias="LLM_MAP_REDUCE_CONCURRENCY")
+  llm_map_reduce_deadline_seconds: float = Field(45.0, alias="LLM_MAP_REDUCE_DEADLINE_SECONDS")
+  llm_packed_routing_batch_size: int = Field(8, alias="LLM_PACKED_ROUTING_BATCH_SIZE")
+  llm_streaming_enabled: bool = Field(True, alias="LLM_STREAMING_ENABLED")
+  llm_hedging_enabled: bool = Field(True, alias="LLM_HEDGING_ENABLED")
+  llm_breaker_enabled: bool = Field(True, alias="LLM_BREAKER_ENABLED")
+  llm_breaker_failure_threshold: int = Field(5, alias="LLM_BREAKER_FAILURE_THRESHOLD")
+  llm_breaker_reset_seconds: float = Field(30.0, alias="LLM_BREAKER_RESET_SECONDS")
+  # live | record | replay | synthetic; the offline modes ignore the API keys (placeholders are fine).
+  llm_transport_mode: str = Field("live", alias="LLM_TRANSPORT_MODE")
+  llm_fixture_dir: str = Field("", alias="LLM_FIXTURE_DIR")
+  llm_transport_latency_ms: float = Field(0.0, alias="LLM_TRANSPORT_LATENCY_MS")
+  llm_context_cache_enabled: bool = Field(True, alias="LLM_CONTEXT_CACHE_ENABLED")
+  llm_context_cache_ttl_seconds: int = Field(3600, alias="LLM_CONTEXT_CACHE_TTL_SECONDS")
+  llm_telemetry_capacity: int = Field(5000, alias="LLM_TELEMETRY_CAPACITY")
+  # USD per million tokens, used for cost estimates only (defaults: gemini-2.0-flash list price).
+  llm_price_input_per_mtok: float = Field(0.10, alias="LLM_PRICE_INPUT_PER_MTOK")
+  llm_price_output_per_mtok: float = Field(0.40, alias="LLM_PRICE_OUTPUT_PER_MTOK")
+  llm_price_cached_input_per_mtok: float = Field(0.025, alias="LLM_PRICE_CACHED_INPUT_PER_MTOK")
+  pre_router_enabled: bool = Field(True, alias="PRE_ROUTER_ENABLED")
+  pre_router_rules_path: str = Field("", alias="PRE_ROUTER_RULES_PATH")
+  near_duplicate_enabled: bool = Field(True, alias="NEAR_DUPLICATE_ENABLED")
+  near_duplicate_max_distance: int = Field(3, alias="NEAR_DUPLICATE_MAX_DISTANCE")
+  learned_router_enabled: bool = Field(True, alias="LEARNED_ROUTER_ENABLED")
+  learned_router_min_confidence: float = Field(0.85, alias="LEARNED_ROUTER_MIN_CONFIDENCE")
+  learned_router_model_dir: str = Field("", alias="LEARNED_ROUTER_MODEL_DIR")
+  llm_cache_enabled: bool = Field(True, alias="LLM_CACHE_ENABLED")
+  llm_cache_path: str = Field("", alias="LLM_CACHE_PATH")
+  llm_cache_ttl_seconds: int = Field(7 * 24 * 3600, alias="LLM_CACHE_TTL_SECONDS")
+  llm_cache_max_entries: int = Field(512, alias="LLM_CACHE_MAX_ENTRIES")
+  # Routing/extraction/plan per message, reused by /accept, Salesforce routing and the Sheets sync.
+  analysis_store_enabled: bool = Field(True, alias="ANALYSIS_STORE_ENABLED")
+  analysis_store_path: str = Field("", alias="ANALYSIS_STORE_PATH")
+  analysis_store_ttl_seconds: int = Field(30 * 24 * 3600, alias="ANALYSIS_STORE_TTL_SECONDS")
+  # Parsed Gmail messages kept after ingest so later actions skip the Gmail fetch.
+  message_snapshot_enabled: bool = Field(True, alias="MESSAGE_SNAPSHOT_ENABLED")
+  message_snapshot_path: str = Field("", alias="MESSAGE_SNAPSHOT_PATH")
+  message_snapshot_ttl_seconds: int = Field(14 * 24 * 3600, alias="MESSAGE_SNAPSHOT_TTL_SECONDS")
+  # Per-message stage outputs that /api/pipeline/retry resumes from.
+  stage_checkpoint_enabled: bool = Field(True, alias="STAGE_CHECKPOINT_ENABLED")
+  stage_checkpoint_path: str = Field("", alias="STAGE_CHECKPOINT_PATH")
+  stage_checkpoint_ttl_seconds: int = Field(30 * 24 * 3600, alias="STAGE_CHECKPOINT_TTL_SECONDS")
+
+  # Background /api/pipeline/run jobs: sqlite (local dev) or supabase (the pipeline_jobs table).
+  pipeline_job_backend: str = Field("sqlite", alias="PIPELINE_JOB_BACKEND")
+  pipeline_job_db_path: str = Field("", alias="PIPELINE_JOB_DB_PATH")
+  pipeline_job_lease_seconds: int = Field(300, alias="PIPELINE_JOB_LEASE_SECONDS")
+  pipeline_job_max_attempts: int = Field(3, alias="PIPELINE_JOB_MAX_ATTEMPTS")
+  # Jobs the API process works on itself; 0 leaves them to `python -m app.background.pipeline_worker`.
+  pipeline_embedded_workers: int = Field(1, alias="PIPELINE_EMBEDDED_WORKERS")
+  # Messages of one run processed concurrently (LLM calls are also capped by the Gemini client).
+  pipeline_message_concurrency: int = Field(16, alias="PIPELINE_MESSAGE_CONCURRENCY")
+  # gmail_messages rows from a run are upserted in batches of this size, or after this many seconds.
+  pipeline_write_batch_size: int = Field(50, alias="PIPELINE_WRITE_BATCH_SIZE")
+  pipeline_write_flush_seconds: float = Field(2.0, alias="PIPELINE_WRITE_FLUSH_SECONDS")
 
   hubspot_client_id: str = Field(..., alias="HUBSPOT_CLIENT_ID")
   hubspot_client_secret: str = Field(..., alias="HUBSPOT_CLIENT_SECRET")
@@ -70,6 +139,11 @@ class Settings(BaseSettings):
   def gemini_api_keys(self) -> List[str]:
     return [key.strip() for key in self.gemini_api_keys_raw.replace(",", " ").split() if key.strip()]
 
+  @property
+  def llm_purpose_models(self) -> Dict[str, str]:
+    pairs = (item.split("=", 1) for item in self.llm_purpose_models_raw.replace(",", " ").split() if "=" in item)
+    return {purpose.strip(): model.strip() for purpose, model in pairs if purpose.strip() and model.strip()}
+
   @property
   def salesforce_scope_list(self) -> List[str]:
     return [scope.strip() for scope in self.salesforce_scopes.replace(",", " ").split() if scope.strip()]
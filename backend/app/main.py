@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,9 +19,14 @@ from .routers import (
     hubspot_contact_sync, 
     messages, 
     salesforce,
-    google_sheets
+    google_sheets,
+    llm_metrics,
 )
 from .auth import attach_user_to_request
+from .background.pipeline_worker import pipeline_worker
+from .services.llm import async_gemini_client
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="NextEdge Backend", version="1.0.0")
 
@@ -41,6 +49,7 @@ app.include_router(gmail_poll.router)
 app.include_router(hubspot_contact_sync.router)
 app.include_router(messages.router)
 app.include_router(google_sheets.router)
+app.include_router(llm_metrics.router)
 
 
 @app.middleware("http")
@@ -52,6 +61,35 @@ async def supabase_auth_middleware(request: Request, call_next):  # type: ignore
   return await call_next(request)
 
 
+WORKER_SHUTDOWN_SECONDS = 30
+_worker_stop = asyncio.Event()
+_worker_task: asyncio.Task | None = None
+
+
+@app.on_event("startup")
+async def start_pipeline_worker() -> None:
+  global _worker_task
+  if settings.pipeline_embedded_workers > 0:
+    _worker_stop.clear()
+    _worker_task = asyncio.create_task(pipeline_worker.run(_worker_stop))
+
+
+@app.on_event("shutdown")
+async def stop_pipeline_worker() -> None:
+  if _worker_task is not None:
+    _worker_stop.set()
+    # The worker cancels its running jobs on stop; the timeout only guards a job that ignores that.
+    try:
+      await asyncio.wait_for(_worker_task, timeout=WORKER_SHUTDOWN_SECONDS)
+    except asyncio.TimeoutError:
+      logger.warning("Pipeline worker did not stop within %ss", WORKER_SHUTDOWN_SECONDS)
+
+
+@app.on_event("shutdown")
+async def close_llm_clients() -> None:
+  await async_gemini_client.aclose()
+
+
 @app.get("/healthz")
 def healthcheck():
   return {"status": "ok"}
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+# Bump the version for a purpose whenever its prompt template changes so cached responses
+# produced by the old template are no longer served.
+PROMPT_VERSIONS = {
+  "analysis": "analysis-v2",
+  "routing": "routing-v1",
+  "routing_batch": "routing-batch-v1",
+  "combined": "combined-v2",
+  "repair": "repair-v1",
+  "sheets_enrichment": "sheets-enrichment-v1",
+  "chunk_notes": "chunk-notes-v1",
+}
+
+# Any prompt change that can alter a stored analysis part (routing, extraction, plan, Sheets
+# enrichment) changes this, so results stored under the old prompts stop being reused.
+ANALYSIS_VERSION = "|".join(
+  PROMPT_VERSIONS[purpose] for purpose in ("routing", "routing_batch", "combined", "analysis", "sheets_enrichment")
+)
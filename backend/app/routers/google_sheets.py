@@ -16,6 +16,7 @@ from ..config import settings
 from ..services.supabase_client import get_supabase
 from ..services.google_sheets_service import GoogleSheetsService
 from ..services.llm import gemini_client
+from ..storage.analysis_store import analysis_store
 from ..models.email import EmailMessage, AIExtraction
 
 router = APIRouter(prefix="/api/google-sheets", tags=["Google Sheets"])
@@ -29,6 +30,8 @@ class SyncEmailRequest(BaseModel):
   email_id: str
   reasoning: Optional[str] = None
   classification: Optional[str] = None
+  # Re-run the AI enrichment instead of reusing the stored one.
+  force: bool = False
 
 
 def _get_or_create_default_spreadsheet(supabase, connection: dict, service: GoogleSheetsService, workspace_id: str) -> dict:
@@ -79,21 +82,24 @@ def _truncate(text: str, limit: int) -> str:
   return text[:limit] + ("..." if len(text) > limit else "")
 
 
-def _run_ai_enrichment(email_row: dict) -> dict:
+_ENRICHMENT_DEFAULTS = {
+  "classification": "None",
+  "confidence": 0.0,
+  "intent": "N/A",
+  "urgency": "Medium",
+  "sentiment": "Neutral",
+  "sender_label": "Unknown",
+  "entities": [],
+  "reasoning": "N/A",
+}
+
+
+def _run_ai_enrichment(email_row: dict, *, use_cache: bool = True) -> dict:
   """
   Run an AI pass to fill classification/intent/sender_label/entities/etc.
   Uses subject + body only; falls back to safe defaults.
   """
-  defaults = {
-    "classification": "None",
-    "confidence": 0.0,
-    "intent": "N/A",
-    "urgency": "Medium",
-    "sentiment": "Neutral",
-    "sender_label": "Unknown",
-    "entities": [],
-    "reasoning": "N/A",
-  }
+  defaults = {**_ENRICHMENT_DEFAULTS, "entities": []}
 
   subject = (email_row.get("subject") or "").strip()
   body = (email_row.get("body_text") or email_row.get("snippet") or "").strip()
@@ -119,7 +125,10 @@ Body: {body or "N/A"}
 """.strip()
 
   try:
-    raw = gemini_client._invoke(prompt, email_row.get("message_id", "") or email_row.get("id", ""), "sheets_enrichment")
+    message_id = email_row.get("message_id", "") or email_row.get("id", "")
+    raw = gemini_client._invoke(
+      prompt, message_id, "sheets_enrichment", use_cache=use_cache, user_id=email_row.get("user_id")
+    )
     parsed = json.loads(raw)
   except Exception:
     return defaults
@@ -158,6 +167,22 @@ Body: {body or "N/A"}
     return defaults
 
 
+def _stored_ai_enrichment(email_row: dict, *, force: bool = False) -> dict:
+  """The enrichment stored for this message, running the AI pass only on a miss or when forced."""
+  user_id, message_id = email_row.get("user_id"), email_row.get("message_id")
+  if not (user_id and message_id):
+    return _run_ai_enrichment(email_row, use_cache=not force)
+  if not force:
+    stored = analysis_store.get(user_id, message_id).get("sheets_enrichment")
+    if stored:
+      return stored
+  enriched = _run_ai_enrichment(email_row, use_cache=not force)
+  # Defaults mean the pass failed; leave the next sync free to try again.
+  if enriched != _ENRICHMENT_DEFAULTS:
+    analysis_store.save(user_id, message_id, sheets_enrichment=enriched)
+  return enriched
+
+
 def _derive_ai_fields(email_row: dict) -> dict:
   # Defaults
   defaults = {
@@ -430,7 +455,7 @@ async def sync_email_to_sheets(request: SyncEmailRequest):
         raise HTTPException(status_code=404, detail="Gmail message not found")
     email = email_response.data[0]
 
-    enriched_ai = _run_ai_enrichment(email)
+    enriched_ai = _stored_ai_enrichment(email, force=request.force)
     routing_ai = _derive_ai_fields(email)
     ai_fields = {**routing_ai, **enriched_ai}
 
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Query, Request
+
+from ..auth import resolve_user_id
+from ..services.gemini_keys import gemini_key_pool
+from ..services.learned_router import learned_router
+from ..services.llm_context_cache import context_cache
+from ..services.llm_resilience import breaker_registry
+from ..services.llm_telemetry import llm_telemetry
+from ..services.local_extractor import local_extractor
+from ..services.long_text import long_text_reducer
+from ..services.model_cascade import model_cascade
+from ..services.near_duplicate import near_duplicate_index
+from ..services.pre_router import pre_router
+from ..services.prompt_budget import prompt_budgeter
+from ..services.validator import validator_service
+from ..storage.analysis_store import analysis_store
+from ..storage.llm_cache import llm_cache
+
+router = APIRouter(prefix="/api/llm", tags=["llm"])
+
+
+@router.get("/cache")
+def cache_stats():
+  return {"enabled": llm_cache.enabled, "ttl_seconds": llm_cache.ttl_seconds, "purposes": llm_cache.stats()}
+
+
+@router.get("/artifacts")
+def artifact_stats():
+  return analysis_store.stats()
+
+
+@router.get("/keys")
+def key_stats():
+  return {"keys": gemini_key_pool.stats()}
+
+
+@router.get("/budget")
+def budget_stats():
+  return prompt_budgeter.stats()
+
+
+@router.get("/cascade")
+def cascade_stats():
+  return model_cascade.stats()
+
+
+@router.get("/local-extraction")
+def local_extraction_stats():
+  return local_extractor.stats()
+
+
+@router.get("/map-reduce")
+def map_reduce_stats():
+  return long_text_reducer.stats()
+
+
+@router.get("/context-cache")
+def context_cache_stats():
+  return context_cache.stats()
+
+
+@router.get("/pre-router")
+def pre_router_stats():
+  return pre_router.stats()
+
+
+@router.get("/repairs")
+def repair_stats():
+  return validator_service.repair_stats()
+
+
+@router.get("/dedupe")
+def dedupe_stats():
+  return near_duplicate_index.stats()
+
+
+@router.get("/learned-router")
+def learned_router_stats():
+  return learned_router.stats()
+
+
+@router.get("/telemetry")
+def telemetry_summary(request: Request, user_id: str | None = None):
+  """The caller's own LLM calls and cost, by purpose; other tenants' usage is never included."""
+  user_id = resolve_user_id(request, user_id)
+  return llm_telemetry.summary("purpose", user_id=user_id)
+
+
+@router.get("/telemetry/recent")
+def telemetry_recent(request: Request, user_id: str | None = None, limit: int = Query(50, ge=1, le=1000)):
+  user_id = resolve_user_id(request, user_id)
+  calls = llm_telemetry.recent(limit, user_id=user_id)
+  for call in calls:
+    call.pop("user_id", None)
+  return {"calls": calls}
+
+
+@router.get("/breakers")
+def breaker_stats():
+  return {"enabled": breaker_registry.enabled, "breakers": breaker_registry.stats()}
@@ -1,36 +1,52 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import logging
 import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from email.utils import parseaddr
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
 from ..services.gmail_ingest import gmail_ingestor
-from ..services.llm import gemini_client
-from ..services.ai_router import ai_router
-from ..services.validator import validator_service
-from ..services.planner import build_enhanced_crm_plan
+from ..config import settings
+from ..services.ai_router import RoutingDecision, ai_router
+from ..services.validator import ValidatedExtraction, validator_service
+from ..services.planner import EnhancedCrmPlan, build_enhanced_crm_plan
 from ..services.hubspot_client import hubspot_client
-from ..services.hubspot_oauth import get_hubspot_token
-from ..storage.message_store import message_store
+from ..services.learned_router import CONFIRMED_KEY
+from ..services.stage_graph import StageGraph
+from ..storage.analysis_store import analysis_store
+from ..storage.job_queue import job_queue
+from ..storage.message_store import message_store, preview_text
+from ..storage.stage_checkpoints import Checkpoint, stage_checkpoints
+from ..storage.write_buffer import SupabaseWriteBuffer
 from ..services.supabase_client import get_supabase_client
 
 router = APIRouter(prefix="/api/pipeline", tags=["pipeline"])
 logger = logging.getLogger(__name__)
 
+PIPELINE_RUN_JOB = "pipeline_run"
+
 
 class PipelineRequest(BaseModel):
   user_id: str | None = Field(None, description="Supabase user id")
   max_messages: int = Field(3, ge=1, le=500)
   execute_hubspot: bool = False
+  packed_routing: bool | None = Field(
+    None, description="Route emails in packed multi-email requests; defaults to on for runs of a full pack or more"
+  )
 
 class AnalyzeRequest(BaseModel):
   user_id: str | None = None
   message_id: str
   note_override: str | None = None
+  # Recompute instead of reusing the stored analysis.
+  force: bool = False
 
 class RejectRequest(BaseModel):
   user_id: str | None = None
@@ -41,81 +57,388 @@ class AcceptRequest(BaseModel):
   user_id: str | None = None
   message_id: str
   note_override: str | None = None
+  force: bool = False
+
+class RetryRequest(BaseModel):
+  user_id: str | None = None
+  message_id: str
+  # Defaults to what the failed run was doing, so a retry of an analysis-only run stays out of HubSpot.
+  execute_hubspot: bool | None = None
 
 from ..auth import resolve_user_id
 
 
-@router.post("/run")
-def run_pipeline(payload: PipelineRequest, request: Request):
+class _HubSpotPrefetch:
+  """
+  Routing callback that starts the HubSpot token fetch and sender contact search as soon as
+  the routing fields say HubSpot will be written, overlapping them with the rest of the analysis.
+  """
+
+  def __init__(self, user_id: str, message):
+    self.user_id = user_id
+    _, self.sender_email = parseaddr(getattr(message, "sender", None) or "")
+    self.task: asyncio.Task | None = None
+
+  def __call__(self, fields: Dict[str, Any]) -> None:
+    if fields.get("primary_object") == "none":
+      return
+    if "hubspot" not in (fields.get("target_crm") or ["hubspot"]):
+      return
+    self.start()
+
+  def start(self) -> None:
+    if self.task is None:
+      self.task = asyncio.create_task(run_in_threadpool(hubspot_client.prefetch, self.user_id, self.sender_email or None))
+
+  async def wait(self) -> None:
+    if self.task is not None:
+      await self.task
+
+  def close(self) -> None:
+    """Drop a prefetch nobody waited for (the CRM write was skipped or an earlier stage failed)."""
+    if self.task is None:
+      return
+    if not self.task.done():
+      self.task.cancel()
+    elif not self.task.cancelled():
+      # Retrieve the outcome so a failed warm-up is not reported as an unhandled task exception.
+      self.task.exception()
+
+
+@router.post("/run", status_code=202)
+async def run_pipeline(payload: PipelineRequest, request: Request):
+  """Queue a run; a pipeline worker picks it up and /jobs/{job_id} reports progress and results."""
   user_id = resolve_user_id(request, payload.user_id)
-  start = time.perf_counter()
+  # Checked here so a missing Gmail connection is still a 400 rather than a failed job.
   try:
-    messages = gmail_ingestor.poll(user_id, max_messages=payload.max_messages)
+    await run_in_threadpool(gmail_ingestor.ensure_ready, user_id)
   except RuntimeError as exc:
     raise HTTPException(status_code=400, detail=str(exc)) from exc
+  job = await run_in_threadpool(job_queue.enqueue, user_id, PIPELINE_RUN_JOB, payload.model_dump())
+  return {"job_id": job.id, "status": job.status, "status_url": f"/api/pipeline/jobs/{job.id}"}
 
-  supabase = get_supabase_client()
-  results = []
-  portal_id = None
-  try:
-    connection = get_hubspot_token(user_id)
-    portal_id = connection.get("external_user_id") or connection.get("portal_id")
-  except Exception:
-    portal_id = None
 
-  for message in messages:
-    message_start = time.perf_counter()
-    try:
-      routing = ai_router.classify(message)
-      raw_json = gemini_client.analyze_email(message)
-      extraction = validator_service.validate(message, raw_json)
-      extraction.routing_decision = routing.__dict__
-      enhanced_plan = build_enhanced_crm_plan(message, extraction, routing)
-
-      status = "ai_analyzed"
-      hubspot_result = None
-      if payload.execute_hubspot:
-        hubspot_result = hubspot_client.execute_enhanced_plan(user_id, enhanced_plan)
-        status = "accepted"
-
-      now_iso = datetime.now(timezone.utc).isoformat()
-      upsert_payload = _build_supabase_row(
-        user_id=user_id,
-        message=message,
-        status=status,
-        routing=routing.__dict__,
-        hubspot_result=hubspot_result or {},
-        updated_at=now_iso,
+@router.get("/jobs")
+async def list_pipeline_jobs(request: Request, user_id: str | None = None, limit: int = Query(20, ge=1, le=100)):
+  user_id = resolve_user_id(request, user_id)
+  jobs = await run_in_threadpool(job_queue.list_jobs, user_id, limit=limit)
+  return {"jobs": [job.to_dict(include_result=False) for job in jobs]}
+
+
+@router.get("/jobs/{job_id}")
+async def get_pipeline_job(job_id: str, request: Request, user_id: str | None = None, include_results: bool = True):
+  user_id = resolve_user_id(request, user_id)
+  job = await run_in_threadpool(job_queue.get, job_id)
+  if job is None or job.user_id != user_id:
+    raise HTTPException(status_code=404, detail="Job not found")
+  return job.to_dict(include_result=include_results)
+
+
+async def execute_pipeline_run(
+  user_id: str,
+  payload: PipelineRequest,
+  *,
+  on_progress: Callable[[Dict[str, Any]], None] | None = None,
+) -> dict:
+  """
+  Poll Gmail and run every message through routing, extraction, planning and (optionally)
+  HubSpot. Runs inside a pipeline worker; ``on_progress`` gets the counts after each message.
+  """
+  start = time.perf_counter()
+  progress = {"stage": "polling", "total": None, "processed": 0, "failed": 0}
+
+  def report(**changes) -> None:
+    progress.update(changes)
+    if on_progress:
+      on_progress(dict(progress))
+
+  async def poll(_):
+    return await run_in_threadpool(gmail_ingestor.poll, user_id, max_messages=payload.max_messages)
+
+  async def route(done):
+    messages = done["poll"]
+    packed_routing = payload.packed_routing
+    if packed_routing is None:
+      packed_routing = len(messages) >= settings.llm_packed_routing_batch_size
+    if packed_routing and messages:
+      return list(await ai_router.aclassify_batch(messages, user_id=user_id))
+    if messages:
+      # Score the whole poll against the learned router at once; the rest routes per message.
+      return await run_in_threadpool(ai_router.shortcuts, messages, user_id)
+    return []
+
+  # HubSpot's token is warmed per message by _HubSpotPrefetch once routing says it will be written.
+  graph = StageGraph().add("poll", poll).add("routing", route, after=("poll",))
+  done = await graph.run()
+  messages, routings = done["poll"], done["routing"]
+  report(stage="processing", total=len(messages))
+
+  # LLM calls are additionally capped process-wide by the async Gemini client's limiter.
+  semaphore = asyncio.Semaphore(max(1, settings.pipeline_message_concurrency))
+
+  async with _gmail_message_rows() as rows:
+
+    async def process(message, routing):
+      async with semaphore:
+        outcome = await _process_message(user_id, message, payload.execute_hubspot, rows, routing=routing)
+      report(processed=progress["processed"] + 1, failed=progress["failed"] + (outcome is None))
+      return outcome
+
+    outcomes = await asyncio.gather(*(process(message, routing) for message, routing in zip(messages, routings)))
+  results = [outcome for outcome in outcomes if outcome is not None]
+  report(stage="done")
+
+  return {
+    "processed": len(results),
+    "failed": progress["failed"],
+    "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+    "stage_ms": graph.timings,
+    "db_writes": rows.stats(),
+    "results": results,
+  }
+
+
+@dataclass
+class _PriorWork:
+  """What earlier calls left for this message: its stage checkpoint and reusable analysis parts."""
+
+  checkpoint: Checkpoint
+  # routing / raw_extraction / extraction / plan
+  parts: Dict[str, Any]
+
+  async def record(self, stage: str, output: Any = True) -> None:
+    if stage not in self.checkpoint.outputs:
+      self.checkpoint.outputs[stage] = output
+      await run_in_threadpool(
+        stage_checkpoints.record, self.checkpoint.user_id, self.checkpoint.message_id, stage, output
       )
-      supabase.table("gmail_messages").upsert(upsert_payload, on_conflict="user_id,message_id").execute()
-
-      results.append(
-        {
-          "message_id": message.message_id,
-          "extraction": extraction.model_dump(),
-          "plan": enhanced_plan.model_dump(),
-          "hubspot": hubspot_result,
-          "latency_ms": round((time.perf_counter() - message_start) * 1000, 2),
-        }
+
+
+# Checkpointed stage outputs, under the names the analysis graph uses.
+_CHECKPOINT_PARTS = {"route": "routing", "extract": "raw_extraction", "validate": "extraction", "plan": "plan"}
+
+
+def _analysis_graph(
+  user_id: str,
+  message,
+  *,
+  routing: RoutingDecision | None = None,
+  shortcuts_checked: bool = False,
+  prefetch: _HubSpotPrefetch | None = None,
+  note_override: str | None = None,
+  force: bool = False,
+) -> StageGraph:
+  """
+  prior -> analysis -> extraction -> plan for one message; callers hang HubSpot and lookups off
+  it. Each stage records a checkpoint, and whatever a checkpoint or the stored artifacts already
+  hold (routing, raw extraction, validated extraction, plan) is reused unless ``force``.
+  """
+
+  async def prior(_):
+    parts: Dict[str, Any] = {}
+    if force:
+      # Start over: every stage runs again, the CRM write included, without resuming stale partial ids.
+      await run_in_threadpool(stage_checkpoints.clear, user_id, message.message_id)
+      checkpoint = Checkpoint(user_id=user_id, message_id=message.message_id)
+    else:
+      checkpoint = await run_in_threadpool(stage_checkpoints.load, user_id, message.message_id)
+      parts.update(await run_in_threadpool(analysis_store.get, user_id, message.message_id))
+      parts.update(
+        {name: checkpoint.outputs[stage] for stage, name in _CHECKPOINT_PARTS.items() if stage in checkpoint.outputs}
       )
-    except Exception as exc:
-      logger.exception("Pipeline failed", extra={"message_id": message.message_id})
-      try:
-        now_iso = datetime.now(timezone.utc).isoformat()
-        error_payload = _build_supabase_row(
-          user_id=user_id,
-          message=message,
-          status="error",
-          routing=None,
-          hubspot_result={},
-          updated_at=now_iso,
-          error=str(exc),
-        )
-        supabase.table("gmail_messages").upsert(error_payload, on_conflict="user_id,message_id").execute()
-      except Exception:
-        message_store.update_status(user_id, message.message_id, status="error", error=str(exc))
-
-  return {"processed": len(results), "latency_ms": round((time.perf_counter() - start) * 1000, 2), "results": results}
+    work = _PriorWork(checkpoint, parts)
+    await work.record("fetch")
+    return work
+
+  async def analyze(done):
+    work = done["prior"]
+    parts = work.parts
+    decision = RoutingDecision(**parts["routing"]) if parts.get("routing") else routing
+    if decision is not None:
+      if prefetch:
+        prefetch(ai_router.early_fields(decision))
+      if parts.get("extraction"):
+        raw_json = None
+      elif parts.get("raw_extraction"):
+        raw_json = parts["raw_extraction"]
+      else:
+        raw_json = await ai_router.aextract(message, decision, user_id=user_id, use_cache=not force)
+    elif prefetch:
+      decision, raw_json = await ai_router.aclassify_and_extract(
+        message, user_id=user_id, shortcuts_checked=shortcuts_checked, on_routing=prefetch, use_cache=not force
+      )
+    else:
+      decision, raw_json = await ai_router.aclassify_and_extract(
+        message, user_id=user_id, shortcuts_checked=shortcuts_checked, use_cache=not force
+      )
+    await work.record("route", decision.__dict__)
+    if raw_json is not None:
+      await work.record("extract", raw_json)
+    return decision, raw_json
+
+  async def extract(done):
+    decision, raw_json = done["analysis"]
+    work = done["prior"]
+    stored = work.parts.get("extraction")
+    if stored:
+      extraction = ValidatedExtraction(**stored)
+    else:
+      extraction = await validator_service.avalidate(message, raw_json, user_id=user_id)
+    extraction.routing_decision = decision.__dict__
+    await work.record("validate", extraction.model_dump())
+    return extraction
+
+  async def plan(done):
+    work = done["prior"]
+    stored = work.parts
+    if stored.get("plan") and stored.get("extraction"):
+      enhanced_plan = EnhancedCrmPlan(**stored["plan"])
+    else:
+      enhanced_plan = build_enhanced_crm_plan(message, done["extraction"], done["analysis"][0])
+      await run_in_threadpool(
+        analysis_store.save,
+        user_id,
+        message.message_id,
+        routing=done["analysis"][0].__dict__,
+        extraction=done["extraction"].model_dump(),
+        plan=enhanced_plan.model_dump(),
+      )
+    await work.record("plan", enhanced_plan.model_dump())
+    if note_override and enhanced_plan.note:
+      enhanced_plan.note.body = note_override
+    return enhanced_plan
+
+  return (
+    StageGraph()
+    .add("prior", prior)
+    .add("analysis", analyze, after=("prior",))
+    .add("extraction", extract, after=("analysis", "prior"))
+    .add("plan", plan, after=("extraction",))
+  )
+
+
+async def _execute_hubspot(
+  user_id: str, enhanced_plan, prefetch: _HubSpotPrefetch | None, work: _PriorWork
+) -> dict:
+  """The CRM write stage: a completed write is returned as is, an interrupted one is resumed."""
+  checkpoint = work.checkpoint
+  if "crm_write" in checkpoint.outputs:
+    return checkpoint.outputs["crm_write"]
+  if prefetch:
+    await prefetch.wait()
+
+  def record_partial(ids: Dict[str, Any]) -> None:
+    stage_checkpoints.record_partial(user_id, checkpoint.message_id, ids)
+
+  result = await run_in_threadpool(
+    hubspot_client.execute_enhanced_plan,
+    user_id,
+    enhanced_plan,
+    resume=checkpoint.partial or None,
+    on_progress=record_partial,
+  )
+  await work.record("crm_write", result)
+  return result
+
+
+async def _run_checkpointed(
+  graph: StageGraph, user_id: str, message_id: str, *, execute_hubspot: bool
+) -> Dict[str, Any]:
+  """Run a message's stage graph, leaving the error (and whether it wrote to HubSpot) on its checkpoint."""
+  try:
+    return await graph.run()
+  except Exception as exc:
+    await run_in_threadpool(
+      stage_checkpoints.mark_failed,
+      user_id,
+      message_id,
+      str(exc) or exc.__class__.__name__,
+      execute_hubspot=execute_hubspot,
+    )
+    raise
+
+
+def _gmail_message_rows() -> SupabaseWriteBuffer:
+  """Buffer for gmail_messages upserts; rows Supabase will not take are kept in the local store."""
+
+  def keep_locally(row: Dict[str, Any], exc: Exception) -> None:
+    message_store.update_status(
+      row["user_id"],
+      row["message_id"],
+      status=row["status"],
+      ai_routing_decision=row.get("ai_routing_decision"),
+      ai_confidence=row.get("ai_confidence"),
+      error=row.get("error"),
+    )
+
+  return SupabaseWriteBuffer(
+    get_supabase_client(),
+    "gmail_messages",
+    on_conflict="user_id,message_id",
+    batch_size=settings.pipeline_write_batch_size,
+    flush_seconds=settings.pipeline_write_flush_seconds,
+    on_row_failed=keep_locally,
+  )
+
+
+async def _process_message(
+  user_id: str,
+  message,
+  execute_hubspot: bool,
+  rows: SupabaseWriteBuffer,
+  *,
+  routing: RoutingDecision | None = None,
+  shortcuts_checked: bool = True,
+) -> dict | None:
+  message_start = time.perf_counter()
+  prefetch = _HubSpotPrefetch(user_id, message) if execute_hubspot else None
+  graph = _analysis_graph(user_id, message, routing=routing, shortcuts_checked=shortcuts_checked, prefetch=prefetch)
+  if execute_hubspot:
+    graph.add(
+      "hubspot", lambda done: _execute_hubspot(user_id, done["plan"], prefetch, done["prior"]), after=("plan",)
+    )
+  try:
+    done = await _run_checkpointed(graph, user_id, message.message_id, execute_hubspot=execute_hubspot)
+    routing, extraction, enhanced_plan = done["analysis"][0], done["extraction"], done["plan"]
+    hubspot_result = done.get("hubspot")
+    status = "accepted" if execute_hubspot else "ai_analyzed"
+
+    now_iso = datetime.now(timezone.utc).isoformat()
+    upsert_payload = _build_supabase_row(
+      user_id=user_id,
+      message=message,
+      status=status,
+      routing=routing.__dict__,
+      hubspot_result=hubspot_result or {},
+      updated_at=now_iso,
+    )
+    await rows.add(upsert_payload)
+
+    return {
+      "message_id": message.message_id,
+      "extraction": extraction.model_dump(),
+      "plan": enhanced_plan.model_dump(),
+      "hubspot": hubspot_result,
+      "latency_ms": round((time.perf_counter() - message_start) * 1000, 2),
+      "stage_ms": graph.timings,
+    }
+  except Exception as exc:
+    logger.exception("Pipeline failed", extra={"message_id": message.message_id})
+    now_iso = datetime.now(timezone.utc).isoformat()
+    error_payload = _build_supabase_row(
+      user_id=user_id,
+      message=message,
+      status="error",
+      routing=None,
+      hubspot_result={},
+      updated_at=now_iso,
+      error=str(exc),
+    )
+    await rows.add(error_payload)
+    return None
+  finally:
+    if prefetch:
+      prefetch.close()
 
 
 def _build_supabase_row(
@@ -144,7 +467,8 @@ def _build_supabase_row(
     "subject": getattr(message, "subject", None),
     "sender": getattr(message, "sender", None),
     "snippet": getattr(message, "snippet", None),
-    "preview": getattr(message, "snippet", None),
+    # The learned router trains on this column and predicts on preview_text(body_text); keep them equal.
+    "preview": preview_text(getattr(message, "body_text", None)),
     "status": status,
     "has_attachments": bool(getattr(message, "attachments", [])),
     "has_images": any(getattr(att, "mime_type", "").startswith("image/") for att in getattr(message, "attachments", [])),
@@ -191,22 +515,41 @@ def _resolve_message_identifiers(user_id: str, raw_identifier: str) -> Tuple[str
   return raw_identifier, None
 
 
+async def _fetch_requested_message(user_id: str, raw_identifier: str):
+  """
+  Resolve a DB row id or Gmail message id and fetch the message. The identifier is usually
+  already the Gmail id, so that fetch starts alongside the lookup and is only redone when the
+  lookup maps a row id to a different message id.
+  """
+
+  async def speculative_fetch():
+    try:
+      return await run_in_threadpool(gmail_ingestor.fetch_message, user_id, raw_identifier), None
+    except Exception as exc:
+      return None, exc
+
+  (resolved_message_id, _), (message, error) = await asyncio.gather(
+    run_in_threadpool(_resolve_message_identifiers, user_id, raw_identifier), speculative_fetch()
+  )
+  if resolved_message_id != raw_identifier:
+    message, error = None, None
+    try:
+      message = await run_in_threadpool(gmail_ingestor.fetch_message, user_id, resolved_message_id)
+    except Exception as exc:
+      error = exc
+  if message is None:
+    raise HTTPException(status_code=404, detail=f"Message not found: {error}") from error
+  return message
+
+
 @router.post("/analyze")
-def analyze_message(payload: AnalyzeRequest, request: Request):
+async def analyze_message(payload: AnalyzeRequest, request: Request):
   user_id = resolve_user_id(request, payload.user_id)
-  resolved_message_id, _ = _resolve_message_identifiers(user_id, payload.message_id)
-  try:
-    message = gmail_ingestor.fetch_message(user_id, resolved_message_id)
-  except Exception as exc:
-    raise HTTPException(status_code=404, detail=f"Message not found: {exc}") from exc
+  message = await _fetch_requested_message(user_id, payload.message_id)
 
-  routing = ai_router.classify(message)
-  raw_json = gemini_client.analyze_email(message)
-  extraction = validator_service.validate(message, raw_json)
-  extraction.routing_decision = routing.__dict__
-  enhanced_plan = build_enhanced_crm_plan(message, extraction, routing)
-  if payload.note_override and enhanced_plan.note:
-    enhanced_plan.note.body = payload.note_override
+  graph = _analysis_graph(user_id, message, note_override=payload.note_override, force=payload.force)
+  done = await _run_checkpointed(graph, user_id, message.message_id, execute_hubspot=False)
+  routing, extraction, enhanced_plan = done["analysis"][0], done["extraction"], done["plan"]
 
   now_iso = datetime.now(timezone.utc).isoformat()
   supabase = get_supabase_client()
@@ -219,7 +562,7 @@ def analyze_message(payload: AnalyzeRequest, request: Request):
     updated_at=now_iso,
   )
   upsert_payload["ai_summary"] = extraction.summary
-  supabase.table("gmail_messages").upsert(upsert_payload, on_conflict="user_id,message_id").execute()
+  await run_in_threadpool(supabase.table("gmail_messages").upsert(upsert_payload, on_conflict="user_id,message_id").execute)
 
   return {
     "status": "pending_ai_analysis",
@@ -227,27 +570,26 @@ def analyze_message(payload: AnalyzeRequest, request: Request):
     "extraction": extraction.model_dump(),
     "plan": enhanced_plan.model_dump(),
     "ai_summary": extraction.summary,
+    "stage_ms": graph.timings,
   }
 
 
 @router.post("/accept")
-def accept_message(payload: AcceptRequest, request: Request):
+async def accept_message(payload: AcceptRequest, request: Request):
   user_id = resolve_user_id(request, payload.user_id)
-  resolved_message_id, _ = _resolve_message_identifiers(user_id, payload.message_id)
-  try:
-    message = gmail_ingestor.fetch_message(user_id, resolved_message_id)
-  except Exception as exc:
-    raise HTTPException(status_code=404, detail=f"Message not found: {exc}") from exc
-
-  routing = ai_router.classify(message)
-  raw_json = gemini_client.analyze_email(message)
-  extraction = validator_service.validate(message, raw_json)
-  extraction.routing_decision = routing.__dict__
-  enhanced_plan = build_enhanced_crm_plan(message, extraction, routing)
-  if payload.note_override and enhanced_plan.note:
-    enhanced_plan.note.body = payload.note_override
+  message = await _fetch_requested_message(user_id, payload.message_id)
 
-  hubspot_result = hubspot_client.execute_enhanced_plan(user_id, enhanced_plan)
+  # Accepting always writes to HubSpot, so warm the token and contact search alongside the analysis.
+  prefetch = _HubSpotPrefetch(user_id, message)
+  prefetch.start()
+  graph = _analysis_graph(user_id, message, note_override=payload.note_override, force=payload.force)
+  graph.add("hubspot", lambda done: _execute_hubspot(user_id, done["plan"], prefetch, done["prior"]), after=("plan",))
+  try:
+    done = await _run_checkpointed(graph, user_id, message.message_id, execute_hubspot=True)
+  finally:
+    prefetch.close()
+  routing, extraction, enhanced_plan = done["analysis"][0], done["extraction"], done["plan"]
+  hubspot_result = done["hubspot"]
 
   now_iso = datetime.now(timezone.utc).isoformat()
   supabase = get_supabase_client()
@@ -255,12 +597,13 @@ def accept_message(payload: AcceptRequest, request: Request):
     user_id=user_id,
     message=message,
     status="ai_analyzed",
-    routing=routing.__dict__,
+    # The user accepted this routing, which makes it a training label for the learned router.
+    routing={**routing.__dict__, CONFIRMED_KEY: True},
     hubspot_result=hubspot_result or {},
     updated_at=now_iso,
   )
   upsert_payload["ai_summary"] = extraction.summary
-  supabase.table("gmail_messages").upsert(upsert_payload, on_conflict="user_id,message_id").execute()
+  await run_in_threadpool(supabase.table("gmail_messages").upsert(upsert_payload, on_conflict="user_id,message_id").execute)
 
   return {
     "status": "ai_analyzed",
@@ -269,6 +612,48 @@ def accept_message(payload: AcceptRequest, request: Request):
     "plan": enhanced_plan.model_dump(),
     "hubspot": hubspot_result,
     "ai_summary": extraction.summary,
+    "stage_ms": graph.timings,
+  }
+
+
+@router.get("/checkpoints")
+async def list_failed_checkpoints(request: Request, user_id: str | None = None, limit: int = Query(50, ge=1, le=500)):
+  """Messages whose last pipeline attempt failed, with the stage a retry would resume from."""
+  user_id = resolve_user_id(request, user_id)
+  checkpoints = await run_in_threadpool(stage_checkpoints.failed, user_id, limit=limit)
+  return {"checkpoints": [checkpoint.to_dict() for checkpoint in checkpoints]}
+
+
+@router.post("/retry")
+async def retry_message(payload: RetryRequest, request: Request):
+  """
+  Resume a message from the first stage its checkpoint has no output for: completed LLM stages
+  are not rerun and HubSpot objects created before a failed write are not created again.
+  """
+  user_id = resolve_user_id(request, payload.user_id)
+  message_id, _ = await run_in_threadpool(_resolve_message_identifiers, user_id, payload.message_id)
+  checkpoint = await run_in_threadpool(stage_checkpoints.load, user_id, message_id)
+  if not checkpoint.outputs and checkpoint.error is None:
+    raise HTTPException(status_code=404, detail="No pipeline checkpoint for this message")
+  execute_hubspot = checkpoint.execute_hubspot if payload.execute_hubspot is None else payload.execute_hubspot
+  resumed_from = checkpoint.first_incomplete()
+  if resumed_from is None or (resumed_from == "crm_write" and not execute_hubspot):
+    return {"status": "complete", "resumed_from": None, "checkpoint": checkpoint.to_dict()}
+
+  message = await _fetch_requested_message(user_id, message_id)
+  async with _gmail_message_rows() as rows:
+    outcome = await _process_message(user_id, message, execute_hubspot, rows, shortcuts_checked=False)
+  checkpoint = await run_in_threadpool(stage_checkpoints.load, user_id, message_id)
+  if outcome is None:
+    raise HTTPException(
+      status_code=502,
+      detail={"error": checkpoint.error, "failed_stage": checkpoint.first_incomplete(), "checkpoint": checkpoint.to_dict()},
+    )
+  return {
+    "status": "accepted" if execute_hubspot else "ai_analyzed",
+    "resumed_from": resumed_from,
+    **outcome,
+    "checkpoint": checkpoint.to_dict(),
   }
 
 
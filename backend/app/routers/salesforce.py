@@ -15,9 +15,10 @@ from ..services.oauth_state import sign_state, verify_state
 from ..services.salesforce_client import salesforce_client
 from ..services.salesforce_oauth import exchange_code, get_authorization_url, get_salesforce_token
 from ..services.token_service import delete_tokens
+from ..storage.analysis_store import analysis_store
 from ..storage.supabase_token_store import salesforce_token_store
 from ..services.supabase_client import get_supabase_client
-from ..services.ai_router import ai_router
+from ..services.ai_router import RoutingDecision, ai_router
 from ..services.gmail_ingest import GmailIngestor
 
 router = APIRouter(prefix="/api/salesforce", tags=["salesforce"])
@@ -32,6 +33,8 @@ class DisconnectRequest(BaseModel):
 class RouteEmailRequest(BaseModel):
   user_id: Optional[str] = None
   message_id: str
+  # Reclassify instead of reusing the stored routing decision.
+  force: bool = False
 
 
 @router.get("/connect")
@@ -117,17 +120,22 @@ def route_email_to_salesforce(payload: RouteEmailRequest, request: Request):
   if not row:
     raise HTTPException(status_code=404, detail="Message not found")
 
-  # Fetch full email message for AI classification
-  try:
-    message = gmail_ingestor.fetch_message(user_id, row.get("message_id"))
-  except Exception as exc:
-    logger.error(f"Failed to fetch message for AI routing: {exc}")
-    message = None
-
-  # AI Classification to determine which Salesforce object to use
+  # Reuse the routing decision stored by an earlier analysis; classify only on a miss.
   routing = None
-  if message:
-    routing = ai_router.classify(message)
+  stored = {} if payload.force else analysis_store.get(user_id, row.get("message_id"))
+  if stored.get("routing"):
+    routing = RoutingDecision(**stored["routing"])
+  else:
+    # Fetch full email message for AI classification
+    try:
+      message = gmail_ingestor.fetch_message(user_id, row.get("message_id"))
+    except Exception as exc:
+      logger.error(f"Failed to fetch message for AI routing: {exc}")
+      message = None
+    if message:
+      routing = ai_router.classify(message, user_id=user_id, use_cache=not payload.force)
+      analysis_store.save(user_id, message.message_id, routing=routing.__dict__)
+  if routing:
     logger.info(f"AI Routing Decision: {routing.primary_object} (confidence: {routing.confidence})")
 
   # === Helper Function: Build Comprehensive Description ===
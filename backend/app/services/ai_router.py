@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from ..config import settings
 from .gmail_ingest import GmailMessage
-from .llm import gemini_client
+from .json_repair import lenient_loads
+from .learned_router import Prediction, learned_router
+from .llm import async_gemini_client, gemini_client
+from .llm_resilience import CircuitOpenError
+from .llm_schemas import ExtractionPayload
+from .local_extractor import local_extractor
+from .long_text import long_text_reducer
+from .model_cascade import model_cascade
+from .near_duplicate import near_duplicate_index
+from .pre_router import pre_router
 
 logger = logging.getLogger(__name__)
 
+PACKED_BATCH_SIZE = settings.llm_packed_routing_batch_size
+
 
 @dataclass
 class RoutingDecision:
@@ -22,38 +36,396 @@ class RoutingDecision:
   suggested_properties: Dict[str, Any] = field(default_factory=dict)
   create_note: bool = True
   target_crm: List[str] = field(default_factory=lambda: ["hubspot"])
+  source: str = "llm"
 
 
 class AIRouter:
   def __init__(self, *, confidence_threshold: float = 0.7):
     self.confidence_threshold = confidence_threshold
 
-  def classify(self, email: GmailMessage) -> RoutingDecision:
-    try:
-      raw = gemini_client.classify_email_route(email)
-      parsed = json.loads(raw)
-      primary = str(parsed.get("primary_object") or "none").lower()
-      secondary = [str(o).lower() for o in parsed.get("secondary_objects") or [] if o]
-      target_crm = [str(c).lower() for c in parsed.get("target_crm") or ["hubspot"] if c]
-      confidence = float(parsed.get("confidence") or 0.0)
-      reasoning = parsed.get("reasoning") or ""
-      intent = (parsed.get("intent") or "other").lower()
-      urgency = (parsed.get("urgency") or "medium").lower()
-      suggested_props = parsed.get("suggested_properties") or {}
-      return RoutingDecision(
-        primary_object=primary,
-        secondary_objects=secondary,
-        confidence=confidence,
-        reasoning=reasoning,
-        intent=intent,
-        urgency=urgency,
-        suggested_properties=suggested_props,
-        create_note=True,
-        target_crm=target_crm,
+  def classify(self, email: GmailMessage, *, user_id: str | None = None, use_cache: bool = True) -> RoutingDecision:
+    shortcut = self.shortcut(email, user_id)
+    if shortcut:
+      return shortcut
+
+    def route(model: str | None) -> RoutingDecision:
+      raw = gemini_client.classify_email_route(
+        email, user_id=user_id, **_model_kwargs(model), **_cache_kwargs(use_cache)
       )
+      return self._parse_route(email, raw)
+
+    try:
+      return self._remember(email, user_id, model_cascade.run("routing", route, self._escalation))
+    except Exception as exc:
+      logger.warning("AI routing failed; defaulting to contact note", extra={"error": str(exc), "message_id": email.message_id})
+      return self._fallback_decision()
+
+  async def aclassify(self, email: GmailMessage, *, user_id: str | None = None) -> RoutingDecision:
+    shortcut = self.shortcut(email, user_id)
+    if shortcut:
+      return shortcut
+    return self._remember(email, user_id, await self._aroute_with_llm(email, user_id))
+
+  async def _aroute_with_llm(
+    self, email: GmailMessage, user_id: str | None, *, model: str | None = None, cascade: bool = True
+  ) -> RoutingDecision:
+    """One routing call; through the model cascade unless a model is given or ``cascade`` is off."""
+
+    async def route(model: str | None) -> RoutingDecision:
+      raw = await async_gemini_client.classify_email_route(email, user_id=user_id, **_model_kwargs(model))
+      return self._parse_route(email, raw)
+
+    try:
+      if cascade and model is None:
+        return await model_cascade.arun("routing", route, self._escalation)
+      return await route(model)
+    except Exception as exc:
+      logger.warning("AI routing failed; defaulting to contact note", extra={"error": str(exc), "message_id": email.message_id})
+      return self._fallback_decision()
+
+  def _parse_route(self, email: GmailMessage, raw: str) -> RoutingDecision:
+    try:
+      return self._decision_from_payload(lenient_loads(raw))
     except Exception as exc:
       logger.warning("AI routing failed; defaulting to contact note", extra={"error": str(exc), "message_id": email.message_id})
-      return RoutingDecision(primary_object="contacts", confidence=0.0, reasoning="fallback")
+      return self._fallback_decision()
+
+  def _escalation(self, result: Any) -> Optional[str]:
+    """Why a cheap-model answer (a decision, or a (decision, raw extraction) pair) needs the full model."""
+    decision, raw_extraction = result if isinstance(result, tuple) else (result, None)
+    if decision.source == "fallback":
+      return "unusable"
+    if decision.confidence < self.confidence_threshold:
+      return "low_confidence"
+    if raw_extraction is not None:
+      try:
+        ExtractionPayload.model_validate(lenient_loads(raw_extraction))
+      except Exception:
+        return "invalid_extraction"
+    return None
+
+  async def aclassify_batch(
+    self,
+    emails: List[GmailMessage],
+    *,
+    user_id: str | None = None,
+    batch_size: int = PACKED_BATCH_SIZE,
+  ) -> List[RoutingDecision]:
+    """
+    Route many emails with packed requests of up to ``batch_size`` emails each. Entries the model
+    drops, duplicates or mislabels are re-sent in smaller packs, and finally one at a time.
+    Decisions are returned in input order.
+    """
+    decided: Dict[str, RoutingDecision] = {}
+    remaining = []
+    for email, shortcut in zip(emails, self.shortcuts(emails, user_id)):
+      if shortcut:
+        decided[email.message_id] = shortcut
+      else:
+        remaining.append(email)
+
+    if model_cascade.enabled:
+      decided.update(await self._classify_packs_cascaded(remaining, user_id, batch_size))
+    else:
+      decided.update(await self._classify_packs(remaining, user_id, batch_size))
+    for email in remaining:
+      if email.message_id in decided:
+        self._remember(email, user_id, decided[email.message_id])
+    return [decided.get(email.message_id) or self._fallback_decision() for email in emails]
+
+  async def _classify_packs(
+    self, emails: List[GmailMessage], user_id: str | None, batch_size: int, model: str | None = None
+  ) -> Dict[str, RoutingDecision]:
+    decided: Dict[str, RoutingDecision] = {}
+    chunks = [emails[i : i + batch_size] for i in range(0, len(emails), batch_size)]
+    for chunk_decisions in await asyncio.gather(*(self._classify_pack(chunk, user_id, model) for chunk in chunks)):
+      decided.update(chunk_decisions)
+    return decided
+
+  async def _classify_packs_cascaded(
+    self, emails: List[GmailMessage], user_id: str | None, batch_size: int
+  ) -> Dict[str, RoutingDecision]:
+    """Route every pack on the cheap model, then re-pack only the weak answers for the full model."""
+    start = time.perf_counter()
+    decided = await self._classify_packs(emails, user_id, batch_size, model_cascade.model)
+    cheap_ms = (time.perf_counter() - start) * 1000
+    weak = [email for email in emails if self._escalation(decided.get(email.message_id) or self._fallback_decision())]
+    share = cheap_ms / len(emails) if emails else 0.0
+    model_cascade.record("routing_batch", None, share * (len(emails) - len(weak)), count=len(emails) - len(weak))
+    if not weak:
+      return decided
+
+    reasons: Dict[str, int] = {}
+    for email in weak:
+      reason = self._escalation(decided.get(email.message_id) or self._fallback_decision())
+      reasons[reason] = reasons.get(reason, 0) + 1
+    start = time.perf_counter()
+    decided.update(await self._classify_packs(weak, user_id, batch_size))
+    full_share = (time.perf_counter() - start) * 1000 / len(weak)
+    for reason, count in reasons.items():
+      model_cascade.record("routing_batch", reason, share * count, full_share * count, count=count)
+    return decided
+
+  async def _classify_pack(
+    self, emails: List[GmailMessage], user_id: str | None, model: str | None = None
+  ) -> Dict[str, RoutingDecision]:
+    if len(emails) == 1:
+      return {emails[0].message_id: await self._aroute_with_llm(emails[0], user_id, model=model, cascade=False)}
+
+    packed = {f"E{idx}": email for idx, email in enumerate(emails, start=1)}
+    try:
+      raw = await async_gemini_client.classify_email_routes(packed, user_id=user_id, **_model_kwargs(model))
+      decisions = self._parse_packed(raw, packed)
+    except CircuitOpenError:
+      # Splitting and retrying would only fail fast again, one request at a time.
+      return {email.message_id: self._fallback_decision() for email in emails}
+    except Exception as exc:
+      logger.warning("Packed AI routing failed", extra={"error": str(exc), "batch": len(emails)})
+      decisions = {}
+
+    missing = [email for email in emails if email.message_id not in decisions]
+    if missing:
+      logger.info("Packed AI routing incomplete; retrying", extra={"batch": len(emails), "missing": len(missing)})
+      if len(missing) == len(emails):
+        # Nothing usable came back; split rather than resending the same pack.
+        half = len(missing) // 2
+        parts = [missing[:half], missing[half:]]
+      else:
+        parts = [missing]
+      for part_decisions in await asyncio.gather(*(self._classify_pack(part, user_id, model) for part in parts)):
+        decisions.update(part_decisions)
+    return decisions
+
+  def _parse_packed(self, raw: str, packed: Dict[str, GmailMessage]) -> Dict[str, RoutingDecision]:
+    parsed = lenient_loads(raw)
+    if isinstance(parsed, dict):
+      parsed = next((value for value in parsed.values() if isinstance(value, list)), [])
+    if not isinstance(parsed, list):
+      return {}
+
+    entries: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in parsed:
+      if isinstance(entry, dict) and str(entry.get("id") or "").strip() in packed:
+        entries.setdefault(str(entry["id"]).strip(), []).append(entry)
+
+    decisions: Dict[str, RoutingDecision] = {}
+    for email_id, matches in entries.items():
+      # An id that shows up more than once means the model mixed emails up; trust neither.
+      if len(matches) != 1:
+        continue
+      try:
+        decisions[packed[email_id].message_id] = self._decision_from_payload(matches[0])
+      except Exception:
+        continue
+    return decisions
+
+  async def aclassify_and_extract(
+    self,
+    email: GmailMessage,
+    *,
+    user_id: str | None = None,
+    shortcuts_checked: bool = False,
+    on_routing: Optional[Callable[[Dict[str, Any]], None]] = None,
+    use_cache: bool = True,
+  ) -> Tuple[RoutingDecision, str]:
+    """
+    Route and extract with a single Gemini call on the pooled, rate-limited client. Returns the
+    routing decision and the raw extraction JSON, which is left to the validator (and its repair
+    loop) to turn into a ValidatedExtraction. A malformed routing half falls back to the default
+    decision. Near-duplicates of already-routed mail reuse that decision and only run extraction.
+    Very long mail is condensed first (see LongTextReducer); shortcuts still see the original.
+    Callers that already ran ``shortcuts`` for a batch pass ``shortcuts_checked`` to skip them here.
+    ``on_routing`` receives primary_object, target_crm and confidence as soon as they are known
+    (mid-stream for LLM calls), so CRM lookups can start before extraction finishes.
+    ``use_cache=False`` asks Gemini again instead of replaying a cached answer.
+    """
+    shortcut = None if shortcuts_checked else self.shortcut(email, user_id)
+    if shortcut and on_routing:
+      on_routing(self.early_fields(shortcut))
+    if shortcut:
+      return shortcut, await self.aextract(email, shortcut, user_id=user_id, use_cache=use_cache)
+    extra: Dict[str, Any] = {"on_routing": on_routing} if on_routing else {}
+    extra.update(_cache_kwargs(use_cache))
+    condensed = await long_text_reducer.areduce(email, user_id=user_id)
+
+    async def combined(model: str | None) -> Tuple[RoutingDecision, str]:
+      raw = await async_gemini_client.analyze_and_route(condensed, user_id=user_id, **extra, **_model_kwargs(model))
+      return self._split_combined(email, raw)
+
+    try:
+      routing, raw_extraction = await model_cascade.arun("combined", combined, self._escalation)
+    except CircuitOpenError:
+      return self._unavailable(email)
+    return self._remember(email, user_id, routing), self._with_local_fields(email, raw_extraction)
+
+  async def aextract(
+    self, email: GmailMessage, routing: RoutingDecision, *, user_id: str | None = None, use_cache: bool = True
+  ) -> str:
+    """Raw extraction JSON for an already-routed email (rule-routed mail needs no LLM call)."""
+    if routing.source.startswith("rule:"):
+      return self.rule_extraction(email, routing)
+    try:
+      condensed = await long_text_reducer.areduce(email, user_id=user_id)
+      raw = await async_gemini_client.analyze_email(condensed, user_id=user_id, **_cache_kwargs(use_cache))
+      return self._with_local_fields(email, raw)
+    except CircuitOpenError:
+      return self.rule_extraction(email, routing)
+
+  @staticmethod
+  def _with_local_fields(email: GmailMessage, raw_extraction: str) -> str:
+    """The prompts told the model which fields were found locally; add them back to its answer."""
+    return local_extractor.merge(raw_extraction, local_extractor.extract(email))
+
+  def _unavailable(self, email: GmailMessage) -> Tuple[RoutingDecision, str]:
+    """Gemini is failing fast (breaker open): fall back without waiting on it."""
+    logger.warning("Gemini circuit open; using fallback routing", extra={"message_id": email.message_id})
+    fallback = self._fallback_decision()
+    return fallback, self.rule_extraction(email, fallback)
+
+  @staticmethod
+  def early_fields(decision: RoutingDecision) -> Dict[str, Any]:
+    return {
+      "primary_object": decision.primary_object,
+      "target_crm": list(decision.target_crm),
+      "confidence": decision.confidence,
+    }
+
+  def _split_combined(self, email: GmailMessage, raw: str) -> Tuple[RoutingDecision, str]:
+    try:
+      parsed = lenient_loads(raw)
+    except json.JSONDecodeError as exc:
+      logger.warning("Combined AI response is not JSON", extra={"error": str(exc), "message_id": email.message_id})
+      return self._fallback_decision(), raw
+    if not isinstance(parsed, dict):
+      return self._fallback_decision(), raw
+
+    routing_payload = parsed.get("routing")
+    extraction_payload = parsed.get("extraction")
+    try:
+      routing = self._decision_from_payload(routing_payload) if isinstance(routing_payload, dict) else self._fallback_decision()
+    except Exception as exc:
+      logger.warning("AI routing failed; defaulting to contact note", extra={"error": str(exc), "message_id": email.message_id})
+      routing = self._fallback_decision()
+    raw_extraction = json.dumps(extraction_payload) if isinstance(extraction_payload, dict) else raw
+    return routing, raw_extraction
+
+  def shortcut(self, email: GmailMessage, user_id: str | None) -> Optional[RoutingDecision]:
+    """A decision that needs no routing call, or None when the LLM has to decide."""
+    return self.shortcuts([email], user_id)[0]
+
+  def shortcuts(self, emails: List[GmailMessage], user_id: str | None) -> List[Optional[RoutingDecision]]:
+    """
+    Decisions that need no routing call, in input order: pre-routing rules first, then
+    near-duplicates of routed mail, then confident predictions of the workspace's learned
+    router, scored for the whole batch at once.
+    """
+    decisions = [self.pre_route(email) or self.reuse_duplicate(email, user_id) for email in emails]
+    undecided = [idx for idx, decision in enumerate(decisions) if decision is None]
+    predictions = learned_router.predict(user_id, [emails[idx] for idx in undecided])
+    for idx, prediction in zip(undecided, predictions):
+      if prediction:
+        decisions[idx] = self._decision_from_prediction(prediction)
+    return decisions
+
+  def reuse_duplicate(self, email: GmailMessage, user_id: str | None) -> Optional[RoutingDecision]:
+    duplicate = near_duplicate_index.lookup(user_id, email)
+    if not duplicate:
+      return None
+    logger.info(
+      "Reusing routing of near-duplicate email",
+      extra={"message_id": email.message_id, "duplicate_of": duplicate.message_id},
+    )
+    return RoutingDecision(**{**duplicate.routing, "source": f"dedupe:{duplicate.message_id}"})
+
+  def _remember(self, email: GmailMessage, user_id: str | None, decision: RoutingDecision) -> RoutingDecision:
+    # Only confident model decisions are worth copying onto look-alike mail.
+    if decision.source == "llm" and decision.confidence >= self.confidence_threshold:
+      near_duplicate_index.record(user_id, email, asdict(decision))
+    return decision
+
+  def pre_route(self, email: GmailMessage) -> Optional[RoutingDecision]:
+    """Return a rule-based decision for obvious mail, or None when the LLM is needed."""
+    rule = pre_router.match(email)
+    if not rule:
+      return None
+    return RoutingDecision(
+      primary_object=rule.primary_object,
+      confidence=rule.confidence,
+      reasoning=rule.reasoning,
+      intent=rule.intent,
+      urgency=rule.urgency,
+      create_note=rule.create_note,
+      target_crm=list(rule.target_crm),
+      source=f"rule:{rule.name}",
+    )
+
+  @staticmethod
+  def rule_extraction(email: GmailMessage, decision: RoutingDecision) -> str:
+    """Minimal extraction JSON for mail routed without the LLM; nothing downstream needs more."""
+    summary = email.subject or email.snippet or "(no subject)"
+    return json.dumps(
+      {
+        "people": [],
+        "company": None,
+        "intent": decision.intent,
+        "summary": summary,
+        "evidence": email.snippet or summary,
+      }
+    )
+
+  @staticmethod
+  def _decision_from_payload(parsed: Dict[str, Any]) -> RoutingDecision:
+    primary = str(parsed.get("primary_object") or "none").lower()
+    secondary = [str(o).lower() for o in parsed.get("secondary_objects") or [] if o]
+    target_crm = [str(c).lower() for c in parsed.get("target_crm") or ["hubspot"] if c]
+    confidence = float(parsed.get("confidence") or 0.0)
+    reasoning = parsed.get("reasoning") or ""
+    intent = (parsed.get("intent") or "other").lower()
+    urgency = (parsed.get("urgency") or "medium").lower()
+    suggested_props = parsed.get("suggested_properties") or {}
+    if isinstance(suggested_props, dict):
+      # Schema-constrained responses spell out every optional object as null; keep only real ones.
+      suggested_props = {key: value for key, value in suggested_props.items() if value is not None}
+    return RoutingDecision(
+      primary_object=primary,
+      secondary_objects=secondary,
+      confidence=confidence,
+      reasoning=reasoning,
+      intent=intent,
+      urgency=urgency,
+      suggested_properties=suggested_props,
+      create_note=True,
+      target_crm=target_crm,
+    )
+
+  @staticmethod
+  def _decision_from_prediction(prediction: Prediction) -> RoutingDecision:
+    template = prediction.decision
+    return RoutingDecision(
+      primary_object=template["primary_object"],
+      secondary_objects=list(template.get("secondary_objects") or []),
+      confidence=prediction.confidence,
+      reasoning=f"Learned router: nearest past decisions agree (similarity {prediction.similarity})",
+      intent=template.get("intent") or "other",
+      urgency=template.get("urgency") or "medium",
+      create_note=bool(template.get("create_note", True)),
+      target_crm=list(template.get("target_crm") or ["hubspot"]),
+      source="learned",
+    )
+
+  @staticmethod
+  def _fallback_decision() -> RoutingDecision:
+    return RoutingDecision(primary_object="contacts", confidence=0.0, reasoning="fallback", source="fallback")
+
+
+def _model_kwargs(model: str | None) -> Dict[str, Any]:
+  # Only pass a model when one is chosen, so the default call keeps the client's plain signature.
+  return {"model": model} if model else {}
+
+
+def _cache_kwargs(use_cache: bool) -> Dict[str, Any]:
+  # Likewise only pass use_cache when bypassing the response cache.
+  return {} if use_cache else {"use_cache": False}
 
 
 ai_router = AIRouter()
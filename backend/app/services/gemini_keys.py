@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from ..config import settings
+
+COOLDOWN_STATUS = {429, 500, 502, 503, 504}
+AUTH_FAILURE_STATUS = {401, 403}
+BASE_COOLDOWN_SECONDS = 5.0
+MAX_COOLDOWN_SECONDS = 300.0
+AUTH_COOLDOWN_SECONDS = 600.0
+
+
+@dataclass
+class KeyHealth:
+  index: int
+  in_flight: int = 0
+  successes: int = 0
+  failures: int = 0
+  consecutive_failures: int = 0
+  total_latency_ms: float = 0.0
+  cooldown_until: float = 0.0
+  last_status: Optional[int] = None
+
+
+def parse_retry_after(value: Optional[str], *, now: Optional[float] = None) -> Optional[float]:
+  """Parse a Retry-After header (delta seconds or HTTP date) into a delay in seconds."""
+  if not value:
+    return None
+  value = value.strip()
+  try:
+    return max(0.0, float(value))
+  except ValueError:
+    pass
+  try:
+    retry_at = parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  if retry_at.tzinfo is None:
+    retry_at = retry_at.replace(tzinfo=timezone.utc)
+  current = now if now is not None else datetime.now(timezone.utc).timestamp()
+  return max(0.0, retry_at.timestamp() - current)
+
+
+class GeminiKeyPool:
+  """
+  Spreads Gemini calls across API keys (least in-flight first, round-robin on ties) and
+  parks keys in a cooldown after rate limits, server errors or auth failures. Keys are only
+  ever reported by index.
+  """
+
+  def __init__(self, keys: List[str], *, clock: Callable[[], float] = time.monotonic):
+    self._keys = list(keys)
+    self._health = [KeyHealth(index=idx) for idx in range(len(self._keys))]
+    self._clock = clock
+    self._cursor = 0
+    self._lock = threading.Lock()
+
+  def __len__(self) -> int:
+    return len(self._keys)
+
+  def key(self, index: int) -> str:
+    return self._keys[index]
+
+  def ordered(self) -> List[int]:
+    """Key indices in the order a call should try them: healthy keys first, cooling keys last."""
+    with self._lock:
+      count = len(self._keys)
+      if not count:
+        return []
+      now = self._clock()
+      cursor = self._cursor
+      self._cursor = (self._cursor + 1) % count
+      healthy = [h for h in self._health if h.cooldown_until <= now]
+      cooling = [h for h in self._health if h.cooldown_until > now]
+      healthy.sort(key=lambda h: (h.in_flight, (h.index - cursor) % count))
+      cooling.sort(key=lambda h: h.cooldown_until)
+      return [h.index for h in healthy + cooling]
+
+  @contextmanager
+  def lease(self, index: int) -> Iterator[None]:
+    with self._lock:
+      self._health[index].in_flight += 1
+    try:
+      yield
+    finally:
+      with self._lock:
+        self._health[index].in_flight -= 1
+
+  def record_success(self, index: int, latency_ms: float) -> None:
+    with self._lock:
+      health = self._health[index]
+      health.successes += 1
+      health.consecutive_failures = 0
+      health.total_latency_ms += latency_ms
+      health.cooldown_until = 0.0
+      health.last_status = 200
+
+  def record_failure(
+    self,
+    index: int,
+    *,
+    status: Optional[int] = None,
+    retry_after: Optional[str] = None,
+    latency_ms: Optional[float] = None,
+  ) -> None:
+    """Record a failed attempt. Transport errors (no status) and throttling/5xx trigger a cooldown."""
+    with self._lock:
+      health = self._health[index]
+      health.failures += 1
+      health.consecutive_failures += 1
+      health.last_status = status
+      if latency_ms is not None:
+        health.total_latency_ms += latency_ms
+
+      if status in AUTH_FAILURE_STATUS:
+        cooldown = AUTH_COOLDOWN_SECONDS
+      elif status is None or status in COOLDOWN_STATUS:
+        cooldown = parse_retry_after(retry_after)
+        if cooldown is None:
+          cooldown = BASE_COOLDOWN_SECONDS * (2 ** (health.consecutive_failures - 1))
+        cooldown = min(cooldown, MAX_COOLDOWN_SECONDS)
+      else:
+        return
+      health.cooldown_until = max(health.cooldown_until, self._clock() + cooldown)
+
+  def stats(self) -> List[Dict[str, Any]]:
+    with self._lock:
+      now = self._clock()
+      report = []
+      for health in self._health:
+        attempts = health.successes + health.failures
+        report.append(
+          {
+            "key_index": health.index,
+            "in_flight": health.in_flight,
+            "successes": health.successes,
+            "failures": health.failures,
+            "success_rate": round(health.successes / attempts, 4) if attempts else None,
+            "avg_latency_ms": round(health.total_latency_ms / attempts, 2) if attempts else None,
+            "cooling_down": health.cooldown_until > now,
+            "cooldown_remaining_s": round(max(0.0, health.cooldown_until - now), 2),
+            "last_status": health.last_status,
+          }
+        )
+      return report
+
+
+gemini_key_pool = GeminiKeyPool(settings.gemini_api_keys)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import base64
 import logging
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
 from email.utils import parsedate_to_datetime
 from typing import Any, Dict, Iterable, List, Optional
@@ -14,6 +14,7 @@ from googleapiclient.errors import HttpError
 
 from ..config import settings
 from ..storage.supabase_token_store import gmail_token_store
+from ..storage.message_snapshots import message_snapshots
 from ..storage.message_store import message_store
 from ..storage.state_store import state_store
 from .extract_text import extract_attachment_text
@@ -39,6 +40,7 @@ class GmailMessage:
   snippet: Optional[str]
   body_text: str
   attachments: List[AttachmentText]
+  headers: Dict[str, str] = field(default_factory=dict)
 
   @property
   def consolidated_text(self) -> str:
@@ -49,15 +51,38 @@ class GmailMessage:
     return "\n\n".join(block.strip() for block in blocks if block.strip())
 
 
+def message_to_snapshot(message: GmailMessage) -> Dict[str, Any]:
+  data = asdict(message)
+  data["sent_at"] = message.sent_at.isoformat() if message.sent_at else None
+  return data
+
+
+def message_from_snapshot(data: Dict[str, Any]) -> GmailMessage:
+  sent_at = data.get("sent_at")
+  return GmailMessage(
+    **{
+      **data,
+      "sent_at": datetime.fromisoformat(sent_at) if sent_at else None,
+      "attachments": [AttachmentText(**attachment) for attachment in data.get("attachments") or []],
+    }
+  )
+
+
 class GmailIngestor:
   def __init__(self):
     self.credentials: Dict[str, Credentials] = {}
 
-  def fetch_message(self, user_id: str, message_id: str) -> GmailMessage:
+  def fetch_message(self, user_id: str, message_id: str, *, refresh: bool = False) -> GmailMessage:
+    """The parsed message, from its ingest-time snapshot when there is one unless ``refresh``."""
+    if not refresh:
+      snapshot = message_snapshots.get(user_id, message_id)
+      if snapshot:
+        return message_from_snapshot(snapshot)
     service = self._service(user_id)
     full = self._fetch_message_detail(service, message_id)
     if not full:
       raise RuntimeError("Message not found")
+    message_snapshots.put(user_id, full.message_id, message_to_snapshot(full))
     return full
 
   def poll(
@@ -72,9 +97,7 @@ class GmailIngestor:
       return []
 
     state = state_store.get_state(user_id)
-    baseline_at = state.get("baseline_at")
-    if not baseline_at:
-      raise RuntimeError("Baseline timestamp missing for Gmail. Please reconnect Gmail to reset the baseline.")
+    baseline_at = self._baseline_at(state)
     if not state.get("baseline_ready"):
       state_store.mark_baseline_ready(user_id)
       logger.info("Baseline established; skipping initial poll", extra={"user_id": user_id, "baseline_at": baseline_at})
@@ -127,6 +150,7 @@ class GmailIngestor:
       last_id = collected[-1].message_id
       state_store.update_state(user_id, last_uid=last_id, processed_ids=list(processed_ids))
       message_store.record_poll(user_id, collected)
+      message_snapshots.put_many(user_id, {message.message_id: message_to_snapshot(message) for message in collected})
       logger.info(
         "Gmail poll complete",
         extra={
@@ -140,6 +164,19 @@ class GmailIngestor:
 
     return collected
 
+  def ensure_ready(self, user_id: str) -> None:
+    """Raise the RuntimeError poll() would for a user without a Gmail connection or baseline."""
+    self._baseline_at(state_store.get_state(user_id))
+    if user_id not in self.credentials and not gmail_token_store.load(user_id):
+      raise RuntimeError("Gmail is not connected for this user.")
+
+  @staticmethod
+  def _baseline_at(state: Dict[str, Any]) -> str:
+    baseline_at = state.get("baseline_at")
+    if not baseline_at:
+      raise RuntimeError("Baseline timestamp missing for Gmail. Please reconnect Gmail to reset the baseline.")
+    return baseline_at
+
   def _service(self, user_id: str):
     if user_id not in self.credentials:
       self.credentials[user_id] = self._load_credentials(user_id)
@@ -195,7 +232,15 @@ class GmailIngestor:
     except HttpError as exc:  # pragma: no cover - network
       logger.error("Failed to fetch Gmail message", extra={"message_id": message_id, "error": str(exc)})
       return None
+    return self.parse_message(raw, list(self._extract_attachments(service, raw)))
+
+  def has_attachments(self, raw: dict) -> bool:
+    """Whether a format=full message carries attachment parts that must be downloaded separately."""
+    parts = raw.get("payload", {}).get("parts", []) or []
+    return any("attachmentId" in part.get("body", {}) for part in self._walk_parts(parts))
 
+  def parse_message(self, raw: dict, attachments: List[AttachmentText]) -> GmailMessage:
+    """A GmailMessage from a format=full API response and its already extracted attachments."""
     payload = raw.get("payload", {})
     headers = {item["name"]: item["value"] for item in payload.get("headers", [])}
 
@@ -207,7 +252,6 @@ class GmailIngestor:
       except (TypeError, ValueError):
         sent_at_dt = None
 
-    attachments = list(self._extract_attachments(service, raw))
     body_text = self._extract_body(payload) or ""
 
     return GmailMessage(
@@ -220,6 +264,7 @@ class GmailIngestor:
       snippet=raw.get("snippet"),
       body_text=body_text,
       attachments=attachments,
+      headers=headers,
     )
 
   def _extract_body(self, payload: dict) -> Optional[str]:
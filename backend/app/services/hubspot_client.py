@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import logging
 import re
+import threading
 import time
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
 import httpx
 from fastapi import HTTPException
@@ -15,10 +16,39 @@ from .hubspot_oauth import get_hubspot_token, build_auth_url
 
 logger = logging.getLogger(__name__)
 
+# Contact lookups warmed by prefetch() are only trusted briefly; the plan executes right after.
+PREFETCH_TTL_SECONDS = 60
+_MISSING = object()
+
 
 class HubSpotClient:
   def __init__(self):
-    pass
+    self._prefetch_lock = threading.Lock()
+    self._prefetched_contacts: Dict[tuple[str, str], tuple[float, Optional[Dict[str, Any]]]] = {}
+
+  def prefetch(self, user_id: str, email: str | None) -> None:
+    """
+    Warm what executing a plan for ``email`` will need (token refresh, contact search) while
+    the rest of the analysis is still in flight. Failures are logged and left to the real call.
+    """
+    try:
+      token = get_hubspot_token(user_id)["access_token"]
+      if email:
+        contact = self._search_contact(token, email)
+        with self._prefetch_lock:
+          self._prefetched_contacts[(token, email.lower())] = (time.monotonic() + PREFETCH_TTL_SECONDS, contact)
+    except Exception as exc:
+      logger.info("HubSpot prefetch failed", extra={"user_id": user_id, "error": str(exc)})
+
+  def _take_prefetched_contact(self, token: str, email: str) -> Any:
+    with self._prefetch_lock:
+      entry = self._prefetched_contacts.pop((token, email.lower()), None)
+      now = time.monotonic()
+      for key in [key for key, (expires, _) in self._prefetched_contacts.items() if expires <= now]:
+        del self._prefetched_contacts[key]
+    if entry is None or entry[0] <= now:
+      return _MISSING
+    return entry[1]
 
   def execute_plan(self, user_id: str, plan: CrmUpsertPlan) -> Dict[str, Any]:
     access_token = get_hubspot_token(user_id)["access_token"]
@@ -53,7 +83,11 @@ class HubSpotClient:
     return results[0] if results else None
 
   def _upsert_contact(self, token: str, contact_plan) -> str:
-    existing = self._search_contact(token, contact_plan.email) if contact_plan.email else None
+    existing = None
+    if contact_plan.email:
+      existing = self._take_prefetched_contact(token, contact_plan.email)
+      if existing is _MISSING:
+        existing = self._search_contact(token, contact_plan.email)
 
     payload = {
       "properties": {
@@ -63,6 +97,10 @@ class HubSpotClient:
     }
     if contact_plan.email:
       payload["properties"]["email"] = contact_plan.email
+    if contact_plan.job_title:
+      payload["properties"]["jobtitle"] = contact_plan.job_title
+    if contact_plan.phone:
+      payload["properties"]["phone"] = contact_plan.phone
 
     if existing:
       contact_id = existing["id"]
@@ -542,21 +580,37 @@ class HubSpotClient:
       )
     return response
 
-  def execute_enhanced_plan(self, user_id: str, plan) -> Dict[str, Any]:
+  def execute_enhanced_plan(
+    self,
+    user_id: str,
+    plan,
+    *,
+    resume: Optional[Dict[str, Any]] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+  ) -> Dict[str, Any]:
+    """
+    Write the plan's objects. ``resume`` holds ids created by an earlier, interrupted attempt;
+    those objects are not created again. ``on_progress`` gets the ids after each object.
+    """
     token = get_hubspot_token(user_id)["access_token"]
-    result: Dict[str, Any] = {}
+    result: Dict[str, Any] = dict(resume or {})
 
-    if plan.contact:
-      result["contact_id"] = self._upsert_contact(token, plan.contact)
+    def created_id(key: str, value: Any) -> None:
+      result[key] = value
+      if on_progress and value:
+        on_progress(dict(result))
 
-    if plan.company:
+    if plan.contact and not result.get("contact_id"):
+      created_id("contact_id", self._upsert_contact(token, plan.contact))
+
+    if plan.company and not result.get("company_id"):
       company_payload = {"properties": {"name": plan.company.name}}
       if plan.company.domain:
         company_payload["properties"]["domain"] = plan.company.domain
       created = self._request("post", "/crm/v3/objects/companies", token, json=company_payload)
-      result["company_id"] = created.get("id")
+      created_id("company_id", created.get("id"))
 
-    if getattr(plan, "deal", None):
+    if getattr(plan, "deal", None) and not result.get("deal_id"):
       deal_payload = {
         "properties": {
           "dealname": plan.deal.dealname,
@@ -569,9 +623,9 @@ class HubSpotClient:
       if plan.deal.closedate:
         deal_payload["properties"]["closedate"] = plan.deal.closedate
       created = self._request("post", "/crm/v3/objects/deals", token, json=deal_payload)
-      result["deal_id"] = created.get("id")
+      created_id("deal_id", created.get("id"))
 
-    if getattr(plan, "ticket", None):
+    if getattr(plan, "ticket", None) and not result.get("ticket_id"):
       ticket_payload = {
         "properties": {
           "subject": plan.ticket.subject,
@@ -582,9 +636,9 @@ class HubSpotClient:
         }
       }
       created = self._request("post", "/crm/v3/objects/tickets", token, json=ticket_payload)
-      result["ticket_id"] = created.get("id")
+      created_id("ticket_id", created.get("id"))
 
-    if getattr(plan, "order", None):
+    if getattr(plan, "order", None) and not result.get("order_id"):
       order_payload = {"properties": {}}
       if plan.order.reference:
         order_payload["properties"]["order_number"] = plan.order.reference
@@ -593,12 +647,14 @@ class HubSpotClient:
       if plan.order.status:
         order_payload["properties"]["status"] = plan.order.status
       created = self._request("post", "/crm/v3/objects/orders", token, json=order_payload)
-      result["order_id"] = created.get("id")
+      created_id("order_id", created.get("id"))
 
     if getattr(plan, "note", None):
       # Create note and associate to any created objects (contact first, then others)
-      note_id = self._create_note(token, result.get("contact_id"), plan.note)
-      result["note_id"] = note_id
+      note_id = result.get("note_id")
+      if not note_id:
+        note_id = self._create_note(token, result.get("contact_id"), plan.note)
+        created_id("note_id", note_id)
       assoc_targets = [
         ("companies", result.get("company_id"), "note_to_company"),
         ("deals", result.get("deal_id"), "note_to_deal"),
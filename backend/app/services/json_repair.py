@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import json
+import re
+from email.utils import parseaddr
+from typing import Any, Dict, List
+
+FENCE = re.compile(r"^\s*```[a-zA-Z0-9_-]*\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL)
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+LIST_FIELDS = ("people", "dates", "next_steps")
+TEXT_FIELDS = ("intent", "amount")
+REQUIRED_TEXT_FIELDS = ("summary", "evidence")
+
+
+def lenient_loads(raw: str) -> Any:
+  """
+  Parse model output that is almost JSON: code fences, prose around the object, trailing
+  commas, single-quoted strings and Python literals are fixed locally. Raises
+  json.JSONDecodeError if the text still cannot be parsed.
+  """
+  text = (raw or "").strip()
+  try:
+    return json.loads(text)
+  except json.JSONDecodeError:
+    pass
+
+  fenced = FENCE.match(text)
+  if fenced:
+    text = fenced.group(1).strip()
+  text = _outermost_json(text)
+  text = TRAILING_COMMA.sub(r"\1", text)
+  try:
+    return json.loads(text)
+  except json.JSONDecodeError:
+    pass
+
+  normalized = TRAILING_COMMA.sub(r"\1", _normalize_quotes_and_literals(text))
+  return json.loads(normalized)
+
+
+def coerce_extraction(payload: Any) -> Any:
+  """Coerce near-miss extraction payloads (nulls, scalars, numbers) into the expected shapes."""
+  if not isinstance(payload, dict):
+    return payload
+  fixed: Dict[str, Any] = dict(payload)
+
+  for key in LIST_FIELDS:
+    value = fixed.get(key)
+    if value is None or value == "":
+      fixed[key] = []
+    elif not isinstance(value, list):
+      fixed[key] = [value]
+  fixed["people"] = [person for person in (_coerce_person(p) for p in fixed.get("people", [])) if person]
+  for key in ("dates", "next_steps"):
+    fixed[key] = [str(item) for item in fixed.get(key, []) if item not in (None, "")]
+
+  company = fixed.get("company")
+  if isinstance(company, str):
+    fixed["company"] = {"name": company} if company.strip() else None
+  elif isinstance(company, dict):
+    name = company.get("name")
+    fixed["company"] = {**company, "name": str(name)} if name not in (None, "") else None
+  elif company is not None:
+    fixed["company"] = None
+
+  for key in TEXT_FIELDS:
+    value = fixed.get(key)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+      fixed[key] = str(value)
+    elif value == "":
+      fixed[key] = None
+  for key in REQUIRED_TEXT_FIELDS:
+    if key in fixed and fixed[key] is None:
+      fixed[key] = ""
+    elif key in fixed and not isinstance(fixed[key], str):
+      fixed[key] = str(fixed[key])
+  return fixed
+
+
+def _coerce_person(value: Any) -> Dict[str, Any] | None:
+  if isinstance(value, str):
+    name, address = parseaddr(value)
+    if not (name or address):
+      return None
+    return {"name": name or address, "email": address or None}
+  if isinstance(value, dict):
+    name = value.get("name") or value.get("email")
+    if not name:
+      return None
+    email = value.get("email") or None
+    return {**value, "name": str(name), "email": str(email) if email else None}
+  return None
+
+
+def _outermost_json(text: str) -> str:
+  starts = [idx for idx in (text.find("{"), text.find("[")) if idx != -1]
+  if not starts:
+    return text
+  start = min(starts)
+  end = text.rfind("}" if text[start] == "{" else "]")
+  return text[start : end + 1] if end > start else text[start:]
+
+
+def _normalize_quotes_and_literals(text: str) -> str:
+  """Rewrite single-quoted strings as JSON strings and Python literals as JSON literals."""
+  out: List[str] = []
+  idx = 0
+  length = len(text)
+  while idx < length:
+    char = text[idx]
+    if char in "\"'":
+      quote = char
+      idx += 1
+      chunk: List[str] = []
+      while idx < length and text[idx] != quote:
+        if text[idx] == "\\" and idx + 1 < length:
+          chunk.append(text[idx : idx + 2])
+          idx += 2
+          continue
+        chunk.append(text[idx])
+        idx += 1
+      idx += 1
+      body = "".join(chunk)
+      if quote == "'":
+        body = body.replace("\\'", "'").replace('"', '\\"')
+      out.append(f'"{body}"')
+      continue
+    if char.isalpha():
+      end = idx
+      while end < length and (text[end].isalnum() or text[end] == "_"):
+        end += 1
+      word = text[idx:end]
+      out.append(PY_LITERALS.get(word, word))
+      idx = end
+      continue
+    out.append(char)
+    idx += 1
+  return "".join(out)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Tuple, Union
+
+PathKey = Union[str, int]
+Path = Tuple[PathKey, ...]
+
+WHITESPACE = " \t\r\n"
+
+
+@dataclass
+class _Frame:
+  kind: str  # "{" or "["
+  key: Optional[PathKey] = None
+  expecting_key: bool = False
+
+
+@dataclass
+class _Capture:
+  path: Path
+  start: int
+  depth: int
+
+
+class IncrementalJsonParser:
+  """
+  Scans JSON text as it arrives and decodes the values at watched paths as soon as each one
+  is complete, without waiting for the rest of the document. Paths are tuples of object keys
+  and array indexes, e.g. ``("routing", "primary_object")``. The scanner assumes well-formed
+  input; anything it cannot follow is simply never reported.
+  """
+
+  def __init__(self, watch: Iterable[Path]):
+    self.watch = {tuple(path) for path in watch}
+    self.values: dict[Path, Any] = {}
+    self._text = ""
+    self._pos = 0
+    self._stack: List[_Frame] = []
+    self._captures: List[_Capture] = []
+    self._string_start: Optional[int] = None
+    self._string_is_key = False
+    self._escape = False
+    self._scalar_start: Optional[int] = None
+
+  @property
+  def text(self) -> str:
+    return self._text
+
+  def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+    """Consume ``chunk`` and return the watched values completed by it, in document order."""
+    self._text += chunk
+    completed: List[Tuple[Path, Any]] = []
+    text = self._text
+    while self._pos < len(text):
+      idx = self._pos
+      char = text[idx]
+      self._pos += 1
+
+      if self._string_start is not None:
+        if self._escape:
+          self._escape = False
+        elif char == "\\":
+          self._escape = True
+        elif char == '"':
+          start, self._string_start = self._string_start, None
+          if self._string_is_key:
+            self._stack[-1].key = json.loads(text[start : idx + 1])
+            self._stack[-1].expecting_key = False
+          else:
+            self._value_end(idx + 1, completed)
+        continue
+
+      if self._scalar_start is not None:
+        if char not in WHITESPACE and char not in ",]}":
+          continue
+        self._value_end(idx, completed)
+        self._scalar_start = None
+
+      if char in WHITESPACE or char == ":":
+        continue
+      if char == '"':
+        self._string_start = idx
+        self._string_is_key = bool(self._stack) and self._stack[-1].kind == "{" and self._stack[-1].expecting_key
+        if not self._string_is_key:
+          self._value_start(idx)
+      elif char in "{[":
+        self._value_start(idx)
+        self._stack.append(_Frame(kind=char, key=0 if char == "[" else None, expecting_key=char == "{"))
+      elif char in "}]":
+        if self._stack:
+          self._stack.pop()
+        self._value_end(idx + 1, completed)
+      elif char == ",":
+        if self._stack and self._stack[-1].kind == "[":
+          self._stack[-1].key = int(self._stack[-1].key or 0) + 1
+        elif self._stack:
+          self._stack[-1].expecting_key = True
+      else:
+        self._value_start(idx)
+        self._scalar_start = idx
+    return completed
+
+  def finish(self) -> List[Tuple[Path, Any]]:
+    """Flush a trailing top-level scalar once the stream has ended."""
+    completed: List[Tuple[Path, Any]] = []
+    if self._scalar_start is not None:
+      self._value_end(len(self._text), completed)
+      self._scalar_start = None
+    return completed
+
+  def _path(self) -> Path:
+    return tuple(frame.key for frame in self._stack)  # type: ignore[misc]
+
+  def _value_start(self, idx: int) -> None:
+    path = self._path()
+    if path in self.watch and path not in self.values:
+      self._captures.append(_Capture(path=path, start=idx, depth=len(self._stack)))
+
+  def _value_end(self, end: int, completed: List[Tuple[Path, Any]]) -> None:
+    while self._captures and self._captures[-1].depth == len(self._stack):
+      capture = self._captures.pop()
+      try:
+        value = json.loads(self._text[capture.start : end])
+      except json.JSONDecodeError:
+        continue
+      self.values[capture.path] = value
+      completed.append((capture.path, value))
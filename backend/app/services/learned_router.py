@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+import json
+import logging
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from email.utils import parseaddr
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+from ..storage.message_store import preview_text
+from .gmail_ingest import GmailMessage
+from .prompt_budget import split_quoted_history
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = Path(__file__).resolve().parents[2] / "routing_models"
+N_FEATURES = 1 << 16
+NEIGHBORS = 7
+# Below this cosine similarity the nearest past email says little about the new one.
+MIN_SIMILARITY = 0.2
+# Queries are scored a few at a time to bound the dense (queries x stored values) product.
+QUERY_CHUNK = 8
+WORD = re.compile(r"[a-z][a-z0-9']{1,30}")
+# Set in a gmail_messages row's ai_routing_decision once a user accepted that routing.
+CONFIRMED_KEY = "confirmed_by_user"
+
+
+@dataclass
+class TrainingExample:
+  subject: str
+  sender: str
+  body: str
+  label: str
+  decision: Dict[str, Any]
+  message_id: str = ""
+
+
+@dataclass
+class Prediction:
+  label: str
+  confidence: float
+  similarity: float
+  decision: Dict[str, Any]
+
+
+def example_from_row(row: Dict[str, Any]) -> Optional[TrainingExample]:
+  """Build a training example from a gmail_messages row, or None if it carries no usable decision."""
+  decision = row.get("ai_routing_decision")
+  if isinstance(decision, str):
+    try:
+      decision = json.loads(decision)
+    except ValueError:
+      return None
+  if not isinstance(decision, dict) or not decision.get("primary_object"):
+    return None
+  # Only decisions a user confirmed are labels; anything else would teach the router its own guesses.
+  if not decision.get(CONFIRMED_KEY):
+    return None
+  # Rule, fallback, near-duplicate and learned decisions were never made by the model.
+  source = str(decision.get("source") or "llm")
+  if source.startswith(("rule:", "dedupe:")) or source in ("fallback", "learned"):
+    return None
+  return TrainingExample(
+    subject=row.get("subject") or "",
+    sender=row.get("sender") or "",
+    # Serving tokenizes preview_text(body_text), the same text this column holds.
+    body=row.get("preview") or "",
+    label=label_for(decision),
+    decision=decision,
+    message_id=row.get("message_id") or "",
+  )
+
+
+def label_for(decision: Dict[str, Any]) -> str:
+  crms = ",".join(sorted(str(crm).lower() for crm in decision.get("target_crm") or ["hubspot"]))
+  return f"{str(decision.get('primary_object')).lower()}|{crms}"
+
+
+def tokens_for(subject: str, sender: str, body: str) -> List[str]:
+  _, address = parseaddr(sender or "")
+  address = address.lower()
+  tokens = [f"s:{word}" for word in WORD.findall((subject or "").lower())]
+  if "@" in address:
+    tokens += [f"a:{address}", f"d:{address.rsplit('@', 1)[1]}"]
+  latest, _ = split_quoted_history(body or "")
+  tokens += [f"b:{word}" for word in WORD.findall(latest.lower())]
+  return tokens
+
+
+class HashedTfidf:
+  """Signed feature hashing with sublinear TF and an IDF fitted on the training set."""
+
+  def __init__(self, n_features: int = N_FEATURES, idf: Optional[np.ndarray] = None):
+    self.n_features = n_features
+    self.idf = idf
+
+  def hashed(self, tokens: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint32, count=len(tokens))
+    columns, inverse = np.unique(hashes % self.n_features, return_inverse=True)
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+    values = np.zeros(len(columns), dtype=np.float32)
+    np.add.at(values, inverse, signs)
+    keep = values != 0
+    columns, values = columns[keep], values[keep]
+    return columns.astype(np.int64), np.sign(values) * (1.0 + np.log(np.abs(values)))
+
+  def fit(self, documents: Sequence[Sequence[str]]) -> "HashedTfidf":
+    df = np.zeros(self.n_features, dtype=np.float32)
+    for tokens in documents:
+      columns, _ = self.hashed(tokens)
+      df[columns] += 1
+    self.idf = (np.log((1.0 + len(documents)) / (1.0 + df)) + 1.0).astype(np.float32)
+    return self
+
+  def transform(self, documents: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return L2-normalized rows in CSR form (indptr, indices, data)."""
+    indptr = [0]
+    indices: List[np.ndarray] = []
+    data: List[np.ndarray] = []
+    for tokens in documents:
+      columns, values = self.hashed(tokens)
+      values = values * self.idf[columns]
+      norm = float(np.linalg.norm(values))
+      if norm:
+        values = values / norm
+      indices.append(columns)
+      data.append(values.astype(np.float32))
+      indptr.append(indptr[-1] + len(columns))
+    return (
+      np.asarray(indptr, dtype=np.int64),
+      np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+      np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+    )
+
+
+class KnnRoutingModel:
+  """
+  Cosine k-nearest-neighbor router over hashed TF-IDF vectors. Training rows are kept in CSR
+  form, so a workspace model stays small and a whole batch is scored with a few array ops.
+  """
+
+  def __init__(
+    self,
+    vectorizer: HashedTfidf,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    data: np.ndarray,
+    labels: np.ndarray,
+    label_names: List[str],
+    templates: Dict[str, Dict[str, Any]],
+    *,
+    neighbors: int = NEIGHBORS,
+  ):
+    self.vectorizer = vectorizer
+    self.indptr = indptr
+    self.indices = indices
+    self.data = data
+    self.labels = labels
+    self.label_names = label_names
+    self.templates = templates
+    self.neighbors = neighbors
+
+  @property
+  def size(self) -> int:
+    return len(self.labels)
+
+  @classmethod
+  def train(cls, examples: Sequence[TrainingExample], *, n_features: int = N_FEATURES) -> "KnnRoutingModel":
+    documents = [tokens_for(ex.subject, ex.sender, ex.body) for ex in examples]
+    kept = [(doc, ex) for doc, ex in zip(documents, examples) if doc]
+    if not kept:
+      raise ValueError("No training examples with usable text")
+    documents = [doc for doc, _ in kept]
+    examples = [ex for _, ex in kept]
+
+    vectorizer = HashedTfidf(n_features).fit(documents)
+    indptr, indices, data = vectorizer.transform(documents)
+    label_names = sorted({ex.label for ex in examples})
+    label_index = {name: idx for idx, name in enumerate(label_names)}
+    labels = np.asarray([label_index[ex.label] for ex in examples], dtype=np.int32)
+    return cls(vectorizer, indptr, indices, data, labels, label_names, _templates(examples))
+
+  def predict(self, emails: Sequence[GmailMessage]) -> List[Prediction]:
+    documents = [tokens_for(email.subject, email.sender, preview_text(email.body_text)) for email in emails]
+    return self.predict_tokens(documents)
+
+  def predict_tokens(self, documents: Sequence[Sequence[str]]) -> List[Prediction]:
+    predictions: List[Prediction] = []
+    for start in range(0, len(documents), QUERY_CHUNK):
+      predictions.extend(self._predict_chunk(documents[start : start + QUERY_CHUNK]))
+    return predictions
+
+  def _predict_chunk(self, documents: Sequence[Sequence[str]]) -> List[Prediction]:
+    q_indptr, q_indices, q_data = self.vectorizer.transform(documents)
+    queries = np.zeros((len(documents), self.vectorizer.n_features), dtype=np.float32)
+    rows = np.repeat(np.arange(len(documents)), np.diff(q_indptr))
+    queries[rows, q_indices] = q_data
+
+    # Cosine similarity against every training row: gather the query weights at each stored
+    # column, multiply by the stored values and sum each training row's span.
+    products = np.zeros((len(documents), len(self.data) + 1), dtype=np.float64)
+    np.cumsum(queries[:, self.indices] * self.data, axis=1, out=products[:, 1:])
+    similarities = products[:, self.indptr[1:]] - products[:, self.indptr[:-1]]
+
+    k = min(self.neighbors, self.size)
+    nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    nearest_sims = np.take_along_axis(similarities, nearest, axis=1).clip(min=0.0)
+    votes = np.zeros((len(documents), len(self.label_names)), dtype=np.float32)
+    np.add.at(votes, (np.repeat(np.arange(len(documents)), k), self.labels[nearest].ravel()), nearest_sims.ravel())
+
+    totals = votes.sum(axis=1)
+    winners = votes.argmax(axis=1)
+    best_sims = nearest_sims.max(axis=1)
+    predictions = []
+    for row, winner in enumerate(winners):
+      label = self.label_names[winner]
+      confidence = float(votes[row, winner] / totals[row]) if totals[row] > 0 else 0.0
+      if best_sims[row] < MIN_SIMILARITY:
+        confidence = 0.0
+      predictions.append(
+        Prediction(label=label, confidence=round(confidence, 4), similarity=round(float(best_sims[row]), 4), decision=self.templates[label])
+      )
+    return predictions
+
+  def save(self, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as handle:
+      np.savez_compressed(
+        handle,
+        idf=self.vectorizer.idf,
+        indptr=self.indptr,
+        indices=self.indices,
+        data=self.data,
+        labels=self.labels,
+        meta=np.asarray(json.dumps({"label_names": self.label_names, "templates": self.templates, "n_features": self.vectorizer.n_features})),
+      )
+
+  @classmethod
+  def load(cls, path: Path) -> "KnnRoutingModel":
+    with np.load(path, allow_pickle=False) as archive:
+      meta = json.loads(str(archive["meta"]))
+      vectorizer = HashedTfidf(meta["n_features"], idf=archive["idf"])
+      return cls(
+        vectorizer,
+        archive["indptr"],
+        archive["indices"],
+        archive["data"],
+        archive["labels"],
+        meta["label_names"],
+        meta["templates"],
+      )
+
+
+def _templates(examples: Sequence[TrainingExample]) -> Dict[str, Dict[str, Any]]:
+  """Per label, the most common intent/urgency/secondary objects seen with it."""
+  grouped: Dict[str, List[Dict[str, Any]]] = {}
+  for ex in examples:
+    grouped.setdefault(ex.label, []).append(ex.decision)
+  templates = {}
+  for label, decisions in grouped.items():
+    primary, crms = label.split("|", 1)
+    templates[label] = {
+      "primary_object": primary,
+      "target_crm": crms.split(",") if crms else ["hubspot"],
+      "secondary_objects": list(_most_common([tuple(d.get("secondary_objects") or []) for d in decisions], ())),
+      "intent": _most_common([d.get("intent") or "other" for d in decisions], "other"),
+      "urgency": _most_common([d.get("urgency") or "medium" for d in decisions], "medium"),
+      "create_note": bool(_most_common([d.get("create_note", True) for d in decisions], True)),
+    }
+  return templates
+
+
+def _most_common(values: List[Any], default: Any) -> Any:
+  return Counter(values).most_common(1)[0][0] if values else default
+
+
+def evaluate(model: KnnRoutingModel, examples: Sequence[TrainingExample], *, min_confidence: float) -> Dict[str, Any]:
+  """Holdout report: overall accuracy, and coverage/accuracy of the predictions confident enough to skip the LLM."""
+  if not examples:
+    return {"holdout": 0, "accuracy": None, "coverage": None, "covered_accuracy": None}
+  predictions = model.predict_tokens([tokens_for(ex.subject, ex.sender, ex.body) for ex in examples])
+  correct = np.asarray([pred.label == ex.label for pred, ex in zip(predictions, examples)])
+  covered = np.asarray([pred.confidence >= min_confidence for pred in predictions])
+  return {
+    "holdout": len(examples),
+    "accuracy": round(float(correct.mean()), 4),
+    "coverage": round(float(covered.mean()), 4),
+    "covered_accuracy": round(float(correct[covered].mean()), 4) if covered.any() else None,
+    "min_confidence": min_confidence,
+  }
+
+
+def split_holdout(examples: Sequence[TrainingExample], fraction: float) -> Tuple[List[TrainingExample], List[TrainingExample]]:
+  """Deterministic split keyed on message_id, so repeated runs evaluate on the same emails."""
+  cutoff = int(math.floor(fraction * 1000))
+  train, holdout = [], []
+  for ex in examples:
+    bucket = zlib.crc32((ex.message_id or ex.subject).encode("utf-8")) % 1000
+    (holdout if bucket < cutoff else train).append(ex)
+  return train, holdout
+
+
+class LearnedRouter:
+  """Loads per-workspace models from disk (reloading when retrained) and scores batches of email."""
+
+  def __init__(self, model_dir: Path = DEFAULT_MODEL_DIR, *, min_confidence: float = 0.85, enabled: bool = True):
+    self.model_dir = model_dir
+    self.min_confidence = min_confidence
+    self.enabled = enabled
+    self._lock = threading.Lock()
+    self._models: Dict[str, Tuple[float, KnnRoutingModel]] = {}
+    self._stats = {"scored": 0, "confident": 0, "no_model": 0}
+
+  def model_path(self, user_id: str) -> Path:
+    return self.model_dir / f"{re.sub(r'[^A-Za-z0-9_-]', '_', user_id)}.npz"
+
+  def model_for(self, user_id: str | None) -> Optional[KnnRoutingModel]:
+    if not self.enabled or not user_id:
+      return None
+    path = self.model_path(user_id)
+    try:
+      mtime = path.stat().st_mtime
+    except OSError:
+      return None
+    with self._lock:
+      cached = self._models.get(user_id)
+      if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+      model = KnnRoutingModel.load(path)
+    except Exception as exc:
+      logger.warning("Failed to load routing model", extra={"user_id": user_id, "error": str(exc)})
+      return None
+    with self._lock:
+      self._models[user_id] = (mtime, model)
+    return model
+
+  def predict(self, user_id: str | None, emails: Sequence[GmailMessage]) -> List[Optional[Prediction]]:
+    """Confident predictions for ``emails`` (None where the LLM should decide)."""
+    if not emails:
+      return []
+    model = self.model_for(user_id)
+    if model is None:
+      with self._lock:
+        self._stats["no_model"] += len(emails)
+      return [None] * len(emails)
+    predictions = model.predict(emails)
+    confident = [pred if pred.confidence >= self.min_confidence else None for pred in predictions]
+    with self._lock:
+      self._stats["scored"] += len(emails)
+      self._stats["confident"] += sum(1 for pred in confident if pred)
+    return confident
+
+  def save(self, user_id: str, model: KnnRoutingModel) -> Path:
+    path = self.model_path(user_id)
+    model.save(path)
+    return path
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      scored = self._stats["scored"]
+      return {
+        **self._stats,
+        "enabled": self.enabled,
+        "min_confidence": self.min_confidence,
+        "loaded_models": len(self._models),
+        "coverage": round(self._stats["confident"] / scored, 4) if scored else 0.0,
+      }
+
+
+learned_router = LearnedRouter(
+  Path(settings.learned_router_model_dir) if settings.learned_router_model_dir else DEFAULT_MODEL_DIR,
+  min_confidence=settings.learned_router_min_confidence,
+  enabled=settings.learned_router_enabled,
+)
@@ -1,100 +1,55 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
 import time
-from typing import Optional
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import httpx
 
 from ..config import settings
+from ..prompt_versions import PROMPT_VERSIONS
+from ..storage.llm_cache import llm_cache, make_cache_key
+from .gemini_keys import gemini_key_pool
 from .gmail_ingest import GmailMessage
+from .json_repair import lenient_loads
+from .json_stream import IncrementalJsonParser
+from .llm_context_cache import ContextHandle, Slot, context_cache
+from .llm_limiter import FairConcurrencyLimiter
+from .llm_resilience import (
+  MIN_HEDGE_DELAY_SECONDS,
+  MIN_HEDGE_SAMPLES,
+  GeminiUnavailableError,
+  breaker_registry,
+  hedged,
+)
+from .llm_schemas import RESPONSE_SCHEMAS
+from .llm_telemetry import LlmCall, llm_telemetry
+from .llm_transport import build_transport
+from .local_extractor import local_extractor
+from .prompt_budget import estimate_tokens, prompt_budgeter, split_quoted_history, truncate_to_tokens
 
 logger = logging.getLogger(__name__)
 
+# Repairs answer a specific validation failure; a cached one would make every retry return the same text.
+UNCACHED_PURPOSES = frozenset({"repair"})
+GENERATION_CONFIG = {"temperature": 0.2, "responseMimeType": "application/json"}
+REQUEST_TIMEOUT_SECONDS = 30
+RETRYABLE_STATUS = {401, 403, 429, 500, 502, 503, 504}
+# Statuses with which generateContent rejects a cachedContent reference that is no longer valid.
+CONTEXT_REJECTED_STATUS = {400, 404}
+# Routing fields surfaced to callers while a streamed response is still arriving.
+EARLY_ROUTING_FIELDS = ("primary_object", "target_crm", "confidence")
+EARLY_ROUTING_PREFIX = {"combined": ("routing",), "routing": ()}
 
-class GeminiClient:
-  def __init__(self):
-    self.api_keys = settings.gemini_api_keys
-    if not self.api_keys:
-      raise RuntimeError("GEMINI_API_KEYS is not configured.")
-    self.endpoint = str(settings.gemini_endpoint).rstrip("/")
-    self.model = settings.gemini_model
+RoutingCallback = Callable[[Dict[str, Any]], None]
 
-  def _compose_url(self) -> str:
-    if self.endpoint.endswith(self.model):
-      return self.endpoint
-    return f"{self.endpoint}/{self.model}:generateContent"
-
-  def analyze_email(self, email: GmailMessage) -> str:
-    prompt = self._build_prompt(email)
-    return self._invoke(prompt, email.message_id, "analysis")
-
-  def classify_email_route(self, email: GmailMessage) -> str:
-    prompt = self._build_routing_prompt(email)
-    return self._invoke(prompt, email.message_id, "routing")
-
-  def repair(self, email: GmailMessage, error_message: str) -> str:
-    prompt = (
-      "Your previous JSON response was invalid.\n"
-      f"Reason: {error_message}\n"
-      "Return only corrected JSON matching the required schema.\n"
-      f"Email context:\n{email.consolidated_text}"
-    )
-    return self._invoke(prompt, email.message_id, "repair")
-
-  def _invoke(self, prompt: str, message_id: str, purpose: str) -> str:
-    url = self._compose_url()
-    payload = {
-      "contents": [{"role": "user", "parts": [{"text": prompt}]}],
-      "generationConfig": {"temperature": 0.2, "responseMimeType": "application/json"},
-    }
-
-    for idx, api_key in enumerate(self.api_keys, start=1):
-      start = time.perf_counter()
-      try:
-        with httpx.Client(timeout=30) as client:
-          response = client.post(url, params={"key": api_key}, json=payload)
-      except httpx.HTTPError as exc:
-        logger.warning(
-          "Gemini request failed",
-          extra={"message_id": message_id, "purpose": purpose, "attempt": idx, "error": str(exc)},
-        )
-        continue
-
-      latency = round((time.perf_counter() - start) * 1000, 2)
-      if response.status_code == 200:
-        data = response.json()
-        try:
-          return data["candidates"][0]["content"]["parts"][0]["text"]
-        except (KeyError, IndexError, TypeError) as exc:
-          logger.warning(
-            "Gemini returned unexpected payload",
-            extra={"message_id": message_id, "purpose": purpose, "error": str(exc)},
-          )
-          continue
-
-      if response.status_code in {401, 403, 429, 500, 502, 503, 504}:
-        logger.warning(
-          "Gemini call failed, rotating key",
-          extra={"message_id": message_id, "purpose": purpose, "status": response.status_code, "attempt": idx},
-        )
-        continue
-
-      raise RuntimeError(f"Gemini error ({response.status_code}): {response.text}")
-
-    raise RuntimeError("All Gemini API keys exhausted.")
-
-  def _build_prompt(self, email: GmailMessage) -> str:
-    metadata = [
-      f"Subject: {email.subject or 'N/A'}",
-      f"From: {email.sender or 'N/A'}",
-      f"To: {', '.join(email.recipients) or 'N/A'}",
-      f"Sent at: {email.sent_at.isoformat() if email.sent_at else 'N/A'}",
-    ]
-    instructions = """
+EXTRACTION_INSTRUCTIONS = """
 Extract structured CRM data from the email body and attachments.
 Return JSON with keys:
-- people: array of { "name": string, "email": string }
+- people: array of { "name": string, "email": string, "job_title": string, "phone": string }
 - company: { "name": string, "domain": string }
 - intent: string
 - amount: string
@@ -104,16 +59,15 @@ Return JSON with keys:
 - evidence: string (quote or reference)
 If a field is unknown, use an empty string or empty array.
 """
-    return "\n".join(filter(None, [*metadata, "", instructions, "", email.consolidated_text]))
 
-  def _build_routing_prompt(self, email: GmailMessage) -> str:
-    metadata = [
-      f"Subject: {email.subject or 'N/A'}",
-      f"From: {email.sender or 'N/A'}",
-      f"To: {', '.join(email.recipients) or 'N/A'}",
-      f"Sent at: {email.sent_at.isoformat() if email.sent_at else 'N/A'}",
-    ]
-    instructions = """
+KNOWN_FIELDS_INSTRUCTIONS = """
+KNOWN FIELDS (already taken from the headers and signature; they are merged into your answer):
+{known}
+Do not repeat them. List only people other than those above, and leave company, amount or dates
+empty when they are listed above, unless the email clearly contradicts the listed value.
+"""
+
+ROUTING_INSTRUCTIONS = """
 Classify this email for CRM routing. Support both HubSpot and Salesforce terminology. Return JSON only:
 {
   "target_crm": ["hubspot", "salesforce"],  // one or both - which CRM(s) should receive this
@@ -179,7 +133,733 @@ EXAMPLES:
   
 NEVER return "none" unless the email is spam or completely irrelevant to business.
 """
-    return "\n".join(filter(None, [*metadata, "", instructions, "", email.consolidated_text]))
+
+PACKED_ROUTING_INSTRUCTIONS = (
+  """
+Several emails follow, each introduced by a line "### EMAIL <id>". Classify EACH email independently.
+Return a JSON array with exactly one object per email. Each object must contain "id", copied exactly
+from its "### EMAIL" line, plus the routing fields described below. Do not merge, skip or reorder emails.
+"""
+  + ROUTING_INSTRUCTIONS
+)
+PACKED_EMAIL_TOKENS = 300
+
+CHUNK_NOTES_INSTRUCTIONS = """
+The text below is one excerpt of a long email or attachment; other excerpts are handled separately.
+List the facts from THIS excerpt that matter for CRM records: people (names, emails, roles),
+companies, amounts and prices, quantities, dates and deadlines, commitments, requests and next steps.
+Quote figures and names exactly. Skip boilerplate, legal filler and formatting.
+Return JSON: { "facts": [string, ...] } (an empty array if the excerpt has nothing relevant).
+"""
+
+COMBINED_INSTRUCTIONS = (
+  """
+Route and extract this email in a single pass. Return one JSON object with exactly two keys:
+{
+  "routing": { ...object described under ROUTING... },
+  "extraction": { ...object described under EXTRACTION... }
+}
+
+ROUTING:
+"""
+  + ROUTING_INSTRUCTIONS
+  + """
+EXTRACTION:
+"""
+  + EXTRACTION_INSTRUCTIONS
+)
+
+# Static instruction blocks served from provider-side cached content instead of being re-sent.
+CONTEXT_BLOCKS = {
+  "analysis": EXTRACTION_INSTRUCTIONS,
+  "routing": ROUTING_INSTRUCTIONS,
+  "routing_batch": PACKED_ROUTING_INSTRUCTIONS,
+  "combined": COMBINED_INSTRUCTIONS,
+}
+
+
+class _EarlyRouting:
+  """Feeds streamed text through an incremental parser and reports the routing fields once."""
+
+  def __init__(self, purpose: str, callback: RoutingCallback, message_id: str):
+    self.prefix = EARLY_ROUTING_PREFIX.get(purpose, ())
+    self.callback = callback
+    self.message_id = message_id
+    self.fired = False
+    self.reset()
+
+  def reset(self) -> None:
+    watch = [self.prefix + (name,) for name in EARLY_ROUTING_FIELDS]
+    self.parser = IncrementalJsonParser([*watch, self.prefix])
+
+  def feed(self, chunk: str) -> None:
+    if self.fired:
+      return
+    completed = {path for path, _ in self.parser.feed(chunk)}
+    fields = self._fields()
+    if len(fields) == len(EARLY_ROUTING_FIELDS) or self.prefix in completed:
+      self._fire(fields)
+
+  def finish(self) -> None:
+    if self.fired:
+      return
+    self.parser.finish()
+    fields = self._fields()
+    if fields:
+      self._fire(fields)
+
+  def _fields(self) -> Dict[str, Any]:
+    values = self.parser.values
+    return {name: values[self.prefix + (name,)] for name in EARLY_ROUTING_FIELDS if self.prefix + (name,) in values}
+
+  def _fire(self, fields: Dict[str, Any]) -> None:
+    self.fired = True
+    try:
+      self.callback(fields)
+    except Exception as exc:
+      logger.warning("Early routing callback failed", extra={"message_id": self.message_id, "error": str(exc)})
+
+
+class _GeminiBase:
+  """Prompt assembly, payload shaping and response handling shared by the sync and async clients."""
+
+  def __init__(self):
+    self.api_keys = settings.gemini_api_keys
+    if not self.api_keys:
+      raise RuntimeError("GEMINI_API_KEYS is not configured.")
+    self.endpoint = str(settings.gemini_endpoint).rstrip("/")
+    self.model = settings.gemini_model
+    self.key_pool = gemini_key_pool
+
+  def model_for(self, purpose: str) -> str:
+    """Model configured for ``purpose`` (LLM_PURPOSE_MODELS), else GEMINI_MODEL."""
+    return settings.llm_purpose_models.get(purpose, self.model)
+
+  def _compose_url(self, model: str | None = None) -> str:
+    model = model or self.model
+    if self.endpoint.endswith(model):
+      return self.endpoint
+    return f"{self.endpoint}/{model}:generateContent"
+
+  def _compose_stream_url(self, model: str | None = None) -> str:
+    model = model or self.model
+    base = self.endpoint if self.endpoint.endswith(model) else f"{self.endpoint}/{model}"
+    return f"{base}:streamGenerateContent"
+
+  @staticmethod
+  def _stream_event(line: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Text and usageMetadata (sent with the last chunk) of one server-sent event line."""
+    if not line.startswith("data:"):
+      return "", None
+    try:
+      data = json.loads(line[len("data:"):].strip())
+    except ValueError:
+      return "", None
+    usage = data.get("usageMetadata") if isinstance(data, dict) else None
+    try:
+      parts = data["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+      return "", usage
+    return "".join(part.get("text") or "" for part in parts if isinstance(part, dict)), usage
+
+  @contextmanager
+  def _breaker_guard(self, model: str | None = None) -> Iterator[None]:
+    """
+    Fail fast with CircuitOpenError while the breaker for this model/endpoint is open. Only
+    GeminiUnavailableError (every key failed) counts against it; other errors are the caller's.
+    """
+    breaker = breaker_registry.get(f"{model or self.model}@{self.endpoint}")
+    if breaker is None:
+      yield
+      return
+    breaker.before_call()
+    try:
+      yield
+    except GeminiUnavailableError:
+      breaker.record_failure()
+      raise
+    except BaseException:
+      breaker.release_probe()
+      raise
+    breaker.record_success()
+
+  def _new_call(self, purpose: str, message_id: str, user_id: str | None, model: str | None = None) -> LlmCall:
+    return LlmCall(purpose=purpose, model=model or self.model, user_id=user_id, message_id=message_id)
+
+  @staticmethod
+  def _estimate_usage(call: LlmCall, prompt: str, text: str) -> None:
+    if not call.prompt_tokens and not call.response_tokens:
+      call.prompt_tokens = estimate_tokens(prompt)
+      call.response_tokens = estimate_tokens(text)
+      call.estimated_tokens = True
+
+  def _payload(self, prompt: str, purpose: str, context: Optional[ContextHandle] = None) -> Dict[str, Any]:
+    """Request body; with a context handle the instruction block is referenced instead of inlined."""
+    if context is not None:
+      prompt = prompt.replace(CONTEXT_BLOCKS[purpose], "", 1)
+    payload = {
+      "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+      "generationConfig": self._generation_config(purpose),
+    }
+    if context is not None:
+      payload["cachedContent"] = context.name
+    return payload
+
+  def _context_slot(self, prompt: str, purpose: str, key_index: int, model: str) -> Optional[Slot]:
+    block = CONTEXT_BLOCKS.get(purpose)
+    # Handle names are per-run, so requests that reference one could not be recorded or replayed.
+    if not context_cache.enabled or settings.llm_transport_mode != "live" or not block or block not in prompt:
+      return None
+    return (key_index, model, purpose, PROMPT_VERSIONS.get(purpose, purpose))
+
+  def _context_call(
+    self, slot: Slot, action: str, handle: Optional[ContextHandle]
+  ) -> Tuple[str, str, Dict[str, str], Dict[str, Any]]:
+    """(method, url, params, body) creating a handle for the slot's block or extending its TTL."""
+    root = self.endpoint.rsplit("/models", 1)[0]
+    ttl = f"{context_cache.ttl_seconds}s"
+    params = {"key": self.key_pool.key(slot[0])}
+    if action == "refresh" and handle is not None:
+      return "PATCH", f"{root}/{handle.name}", {**params, "updateMask": "ttl"}, {"ttl": ttl}
+    body = {
+      "model": f"models/{slot[1]}",
+      "displayName": f"{slot[2]}-{slot[3]}",
+      "contents": [{"role": "user", "parts": [{"text": CONTEXT_BLOCKS[slot[2]]}]}],
+      "ttl": ttl,
+    }
+    return "POST", f"{root}/cachedContents", params, body
+
+  def _context_settled(
+    self, slot: Slot, action: str, handle: Optional[ContextHandle], response: Optional[httpx.Response], error: str = ""
+  ) -> Optional[ContextHandle]:
+    if response is not None and response.status_code == 200:
+      try:
+        name = response.json().get("name") or (handle.name if handle else None)
+      except (ValueError, AttributeError):
+        name = None
+      if name:
+        return context_cache.store(slot, name, refreshed=action == "refresh")
+      error = "response carried no cachedContent name"
+    elif response is not None:
+      error = f"status {response.status_code}"
+    context_cache.fail(slot, error)
+    # A failed refresh leaves the old handle usable until it expires.
+    return handle
+
+  def _context_rejected(self, response: httpx.Response, slot: Optional[Slot], context: Optional[ContextHandle]) -> bool:
+    if context is None or slot is None or response.status_code not in CONTEXT_REJECTED_STATUS:
+      return False
+    logger.warning("Cached context rejected, resending inline", extra={"purpose": slot[2], "status": response.status_code})
+    context_cache.invalidate(slot)
+    return True
+
+  @staticmethod
+  def _generation_config(purpose: str) -> Dict[str, Any]:
+    """Base config plus a server-enforced responseSchema when the purpose has one."""
+    schema = RESPONSE_SCHEMAS.get(purpose)
+    return {**GENERATION_CONFIG, "responseSchema": schema} if schema else GENERATION_CONFIG
+
+  def _cache_key(self, prompt: str, purpose: str, model: str | None = None) -> str:
+    version = PROMPT_VERSIONS.get(purpose, purpose)
+    return make_cache_key(model or self.model, self._generation_config(purpose), version, prompt)
+
+  def _cached(self, cache_key: str, message_id: str, purpose: str) -> Optional[str]:
+    if purpose in UNCACHED_PURPOSES:
+      return None
+    cached = llm_cache.get(cache_key, purpose)
+    if cached is not None:
+      logger.debug("Gemini cache hit", extra={"message_id": message_id, "purpose": purpose})
+    return cached
+
+  @staticmethod
+  def _store(cache_key: str, message_id: str, purpose: str, text: str) -> None:
+    """Cache ``text`` once it parses the way every caller parses it; a broken answer is never replayed."""
+    if purpose in UNCACHED_PURPOSES:
+      return
+    try:
+      lenient_loads(text)
+    except json.JSONDecodeError:
+      logger.warning("Not caching unparseable Gemini response", extra={"message_id": message_id, "purpose": purpose})
+      return
+    llm_cache.set(cache_key, purpose, text)
+
+  def _settle(
+    self,
+    key_index: int,
+    start: float,
+    response: httpx.Response,
+    message_id: str,
+    purpose: str,
+    attempt: int,
+    call: Optional[LlmCall] = None,
+  ) -> Optional[str]:
+    """Handle a response and feed the outcome back into the key pool."""
+    latency = round((time.perf_counter() - start) * 1000, 2)
+    try:
+      text = self._handle_response(response, message_id, purpose, attempt, call)
+    except RuntimeError:
+      self.key_pool.record_failure(key_index, status=response.status_code, latency_ms=latency)
+      raise
+    if text is None:
+      self.key_pool.record_failure(
+        key_index,
+        status=response.status_code,
+        retry_after=response.headers.get("Retry-After"),
+        latency_ms=latency,
+      )
+    else:
+      self.key_pool.record_success(key_index, latency)
+    return text
+
+  def _record_transport_error(
+    self,
+    key_index: int,
+    start: float,
+    exc: Exception,
+    message_id: str,
+    purpose: str,
+    attempt: int,
+  ) -> None:
+    latency = round((time.perf_counter() - start) * 1000, 2)
+    self.key_pool.record_failure(key_index, latency_ms=latency)
+    logger.warning(
+      "Gemini request failed",
+      extra={"message_id": message_id, "purpose": purpose, "attempt": attempt, "key_index": key_index, "error": str(exc)},
+    )
+
+  def _handle_response(
+    self,
+    response: httpx.Response,
+    message_id: str,
+    purpose: str,
+    attempt: int,
+    call: Optional[LlmCall] = None,
+  ) -> Optional[str]:
+    """Return the candidate text, None when the next key should be tried, or raise on a fatal error."""
+    if response.status_code == 200:
+      data = response.json()
+      if call is not None:
+        call.absorb_usage(data.get("usageMetadata"))
+      try:
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+      except (KeyError, IndexError, TypeError) as exc:
+        logger.warning(
+          "Gemini returned unexpected payload",
+          extra={"message_id": message_id, "purpose": purpose, "error": str(exc)},
+        )
+        return None
+
+    if response.status_code in RETRYABLE_STATUS:
+      logger.warning(
+        "Gemini call failed, rotating key",
+        extra={"message_id": message_id, "purpose": purpose, "status": response.status_code, "attempt": attempt},
+      )
+      return None
+
+    raise RuntimeError(f"Gemini error ({response.status_code}): {response.text}")
+
+  def _build_repair_prompt(self, email: GmailMessage, error_message: str) -> str:
+    preamble = (
+      "Your previous JSON response was invalid.\n"
+      f"Reason: {error_message}\n"
+      "Return only corrected JSON matching the required schema.\n"
+      "Email context:\n"
+    )
+    return preamble + self._budgeted_context(email, estimate_tokens(preamble))
+
+  def _build_prompt(self, email: GmailMessage) -> str:
+    return self._assemble(email, EXTRACTION_INSTRUCTIONS, known=True)
+
+  def _build_routing_prompt(self, email: GmailMessage) -> str:
+    return self._assemble(email, ROUTING_INSTRUCTIONS)
+
+  def _build_combined_prompt(self, email: GmailMessage) -> str:
+    return self._assemble(email, COMBINED_INSTRUCTIONS, known=True)
+
+  def _build_chunk_prompt(self, email: GmailMessage, chunk: str, index: int, total: int) -> str:
+    return "\n".join([*self._metadata(email), "", CHUNK_NOTES_INSTRUCTIONS, f"EXCERPT {index} OF {total}:", chunk])
+
+  def _build_packed_routing_prompt(self, emails: Dict[str, GmailMessage]) -> str:
+    """One routing prompt for several emails keyed by short ids; bodies are cut to the latest message."""
+    blocks = [PACKED_ROUTING_INSTRUCTIONS]
+    for email_id, email in emails.items():
+      latest, _ = split_quoted_history(email.body_text or "")
+      attachment_names = ", ".join(att.filename for att in email.attachments if att.filename)
+      lines = [f"### EMAIL {email_id}", *self._metadata(email)]
+      if attachment_names:
+        lines.append(f"Attachments: {attachment_names}")
+      lines.extend(["", truncate_to_tokens(latest, PACKED_EMAIL_TOKENS)])
+      blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+  @staticmethod
+  def _metadata(email: GmailMessage) -> List[str]:
+    return [
+      f"Subject: {email.subject or 'N/A'}",
+      f"From: {email.sender or 'N/A'}",
+      f"To: {', '.join(email.recipients) or 'N/A'}",
+      f"Sent at: {email.sent_at.isoformat() if email.sent_at else 'N/A'}",
+    ]
+
+  def _assemble(self, email: GmailMessage, instructions: str, *, known: bool = False) -> str:
+    """
+    Headers, instructions and the budgeted email content. With ``known`` the fields the local
+    extractor filled are listed after the instructions (which stay intact for context caching).
+    """
+    metadata = self._metadata(email)
+    known_fields = local_extractor.extract(email).known() if known else {}
+    if known_fields:
+      instructions += KNOWN_FIELDS_INSTRUCTIONS.format(known=json.dumps(known_fields, ensure_ascii=False))
+    reserved = estimate_tokens("\n".join([*metadata, "", instructions, ""]))
+    context = self._budgeted_context(email, reserved)
+    return "\n".join(filter(None, [*metadata, "", instructions, "", context]))
+
+  def _budgeted_context(self, email: GmailMessage, reserved_tokens: int) -> str:
+    context, report = prompt_budgeter.build_context(email, reserved_tokens=reserved_tokens)
+    if report.trimmed:
+      logger.info(
+        "Prompt trimmed to token budget",
+        extra={
+          "message_id": email.message_id,
+          "budget": report.budget,
+          "total_tokens": report.total_tokens,
+          "trimmed": report.trimmed_sections(),
+        },
+      )
+    return context
+
+
+class GeminiClient(_GeminiBase):
+  def __init__(self):
+    super().__init__()
+    self._http: Optional[httpx.Client] = None
+
+  def analyze_email(self, email: GmailMessage, *, user_id: str | None = None, use_cache: bool = True) -> str:
+    prompt = self._build_prompt(email)
+    return self._invoke(prompt, email.message_id, "analysis", user_id=user_id, use_cache=use_cache)
+
+  def classify_email_route(
+    self, email: GmailMessage, *, user_id: str | None = None, model: str | None = None, use_cache: bool = True
+  ) -> str:
+    prompt = self._build_routing_prompt(email)
+    return self._invoke(prompt, email.message_id, "routing", user_id=user_id, model=model, use_cache=use_cache)
+
+  def _invoke(
+    self,
+    prompt: str,
+    message_id: str,
+    purpose: str,
+    *,
+    use_cache: bool = True,
+    user_id: str | None = None,
+    model: str | None = None,
+  ) -> str:
+    """``use_cache=False`` skips the cached answer (callers asked to recompute) but still caches the new one."""
+    model = model or self.model_for(purpose)
+    with llm_telemetry.track(self._new_call(purpose, message_id, user_id, model)) as call:
+      cache_key = self._cache_key(prompt, purpose, model)
+      if use_cache:
+        cached = self._cached(cache_key, message_id, purpose)
+        if cached is not None:
+          call.outcome = "cache_hit"
+          return cached
+
+      with self._breaker_guard(model):
+        text = self._request(prompt, message_id, purpose, call)
+      self._estimate_usage(call, prompt, text)
+      self._store(cache_key, message_id, purpose, text)
+      return text
+
+  def _request(self, prompt: str, message_id: str, purpose: str, call: Optional[LlmCall] = None) -> str:
+    call = call or self._new_call(purpose, message_id, None)
+    url = self._compose_url(call.model)
+
+    for idx, key_index in enumerate(self.key_pool.ordered(), start=1):
+      call.attempts, call.key_index = idx, key_index
+      slot = self._context_slot(prompt, purpose, key_index, call.model)
+      context = self._context_handle(slot)
+      start = time.perf_counter()
+      with self.key_pool.lease(key_index):
+        try:
+          params = {"key": self.key_pool.key(key_index)}
+          response = self._client().post(url, params=params, json=self._payload(prompt, purpose, context))
+          if self._context_rejected(response, slot, context):
+            response = self._client().post(url, params=params, json=self._payload(prompt, purpose))
+        except httpx.HTTPError as exc:
+          self._record_transport_error(key_index, start, exc, message_id, purpose, idx)
+          continue
+
+      text = self._settle(key_index, start, response, message_id, purpose, idx, call)
+      if text is not None:
+        return text
+
+    raise GeminiUnavailableError("All Gemini API keys exhausted.")
+
+  def _context_handle(self, slot: Optional[Slot]) -> Optional[ContextHandle]:
+    """Live cached-content handle for the slot, creating or refreshing it first when due."""
+    if slot is None:
+      return None
+    handle, action = context_cache.acquire(slot)
+    if action:
+      method, url, params, body = self._context_call(slot, action, handle)
+      try:
+        response = self._client().request(method, url, params=params, json=body)
+        handle = self._context_settled(slot, action, handle, response)
+      except httpx.HTTPError as exc:
+        handle = self._context_settled(slot, action, handle, None, str(exc))
+    context_cache.count(handle is not None)
+    return handle
+
+  def _client(self) -> httpx.Client:
+    if self._http is None:
+      self._http = httpx.Client(timeout=REQUEST_TIMEOUT_SECONDS, transport=build_transport(asynchronous=False))
+    return self._http
+
+
+class AsyncGeminiClient(_GeminiBase):
+  """
+  Non-blocking Gemini client. Requests share one pooled HTTP/2 connection per event loop and
+  pass through a process-wide limiter that queues callers fairly per user.
+  """
+
+  def __init__(self, *, max_in_flight: int):
+    super().__init__()
+    self.limiter = FairConcurrencyLimiter(max_in_flight)
+    self._http: Optional[httpx.AsyncClient] = None
+    self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+
+  async def analyze_email(self, email: GmailMessage, *, user_id: str | None = None, use_cache: bool = True) -> str:
+    prompt = self._build_prompt(email)
+    return await self._invoke(prompt, email.message_id, "analysis", user_id=user_id, use_cache=use_cache)
+
+  async def classify_email_route(
+    self, email: GmailMessage, *, user_id: str | None = None, model: str | None = None, use_cache: bool = True
+  ) -> str:
+    prompt = self._build_routing_prompt(email)
+    return await self._invoke(prompt, email.message_id, "routing", user_id=user_id, model=model, use_cache=use_cache)
+
+  async def analyze_and_route(
+    self,
+    email: GmailMessage,
+    *,
+    user_id: str | None = None,
+    on_routing: Optional[RoutingCallback] = None,
+    model: str | None = None,
+    use_cache: bool = True,
+  ) -> str:
+    """
+    Combined routing + extraction. With ``on_routing`` the response is streamed and the callback
+    receives primary_object, target_crm and confidence as soon as they are decoded.
+    """
+    prompt = self._build_combined_prompt(email)
+    return await self._invoke(
+      prompt, email.message_id, "combined", user_id=user_id, on_routing=on_routing, model=model, use_cache=use_cache
+    )
+
+  async def classify_email_routes(
+    self, emails: Dict[str, GmailMessage], *, user_id: str | None = None, model: str | None = None
+  ) -> str:
+    prompt = self._build_packed_routing_prompt(emails)
+    batch_ref = ",".join(email.message_id for email in emails.values())
+    return await self._invoke(prompt, batch_ref, "routing_batch", user_id=user_id, model=model)
+
+  async def repair(self, email: GmailMessage, error_message: str, *, user_id: str | None = None) -> str:
+    prompt = self._build_repair_prompt(email, error_message)
+    return await self._invoke(prompt, email.message_id, "repair", user_id=user_id)
+
+  async def summarize_chunk(
+    self, email: GmailMessage, chunk: str, index: int, total: int, *, user_id: str | None = None
+  ) -> str:
+    prompt = self._build_chunk_prompt(email, chunk, index, total)
+    return await self._invoke(prompt, f"{email.message_id}#{index}", "chunk_notes", user_id=user_id)
+
+  async def _invoke(
+    self,
+    prompt: str,
+    message_id: str,
+    purpose: str,
+    *,
+    use_cache: bool = True,
+    user_id: str | None = None,
+    on_routing: Optional[RoutingCallback] = None,
+    model: str | None = None,
+  ) -> str:
+    model = model or self.model_for(purpose)
+    early = _EarlyRouting(purpose, on_routing, message_id) if on_routing else None
+    with llm_telemetry.track(self._new_call(purpose, message_id, user_id, model)) as call:
+      cache_key = self._cache_key(prompt, purpose, model)
+      if use_cache:
+        cached = self._cached(cache_key, message_id, purpose)
+        if cached is not None:
+          call.outcome = "cache_hit"
+          if early:
+            early.feed(cached)
+            early.finish()
+          return cached
+
+      # The breaker is checked before queueing for a slot so an outage fails fast.
+      with self._breaker_guard(model):
+        async with self.limiter.slot(user_id):
+          if early and settings.llm_streaming_enabled:
+            call.streamed = True
+            text = await self._stream_request(prompt, message_id, purpose, early, call)
+          else:
+            text = await self._hedged_request(prompt, message_id, purpose, call)
+      if early and not call.streamed:
+        early.feed(text)
+        early.finish()
+      self._estimate_usage(call, prompt, text)
+      self._store(cache_key, message_id, purpose, text)
+      return text
+
+  async def _hedged_request(self, prompt: str, message_id: str, purpose: str, call: LlmCall) -> str:
+    """
+    _request with a duplicate fired once the first copy outlives the purpose's observed p95.
+    Both copies share the caller's limiter slot; the slower one is cancelled.
+    """
+
+    async def attempt() -> Tuple[str, LlmCall]:
+      scratch = self._new_call(purpose, message_id, call.user_id, call.model)
+      return await self._request(prompt, message_id, purpose, scratch), scratch
+
+    (text, winner), call.hedged = await hedged(attempt, self._hedge_delay(purpose))
+    call.absorb_attempt(winner)
+    if call.hedged:
+      logger.info("Hedged Gemini request", extra={"message_id": message_id, "purpose": purpose})
+    return text
+
+  @staticmethod
+  def _hedge_delay(purpose: str) -> Optional[float]:
+    if not settings.llm_hedging_enabled:
+      return None
+    p95 = llm_telemetry.latency_percentile(purpose, 95, min_samples=MIN_HEDGE_SAMPLES)
+    if p95 is None:
+      return None
+    return max(MIN_HEDGE_DELAY_SECONDS, p95 / 1000)
+
+  async def _request(self, prompt: str, message_id: str, purpose: str, call: Optional[LlmCall] = None) -> str:
+    call = call or self._new_call(purpose, message_id, None)
+    url = self._compose_url(call.model)
+    client = self._client()
+
+    for idx, key_index in enumerate(self.key_pool.ordered(), start=1):
+      call.attempts, call.key_index = idx, key_index
+      slot = self._context_slot(prompt, purpose, key_index, call.model)
+      context = await self._context_handle(slot)
+      start = time.perf_counter()
+      with self.key_pool.lease(key_index):
+        try:
+          params = {"key": self.key_pool.key(key_index)}
+          response = await client.post(url, params=params, json=self._payload(prompt, purpose, context))
+          if self._context_rejected(response, slot, context):
+            response = await client.post(url, params=params, json=self._payload(prompt, purpose))
+        except httpx.HTTPError as exc:
+          self._record_transport_error(key_index, start, exc, message_id, purpose, idx)
+          continue
+
+      text = self._settle(key_index, start, response, message_id, purpose, idx, call)
+      if text is not None:
+        return text
+
+    raise GeminiUnavailableError("All Gemini API keys exhausted.")
+
+  async def _stream_request(
+    self,
+    prompt: str,
+    message_id: str,
+    purpose: str,
+    early: _EarlyRouting,
+    call: Optional[LlmCall] = None,
+  ) -> str:
+    call = call or self._new_call(purpose, message_id, None)
+    url = self._compose_stream_url(call.model)
+
+    for idx, key_index in enumerate(self.key_pool.ordered(), start=1):
+      call.attempts, call.key_index = idx, key_index
+      slot = self._context_slot(prompt, purpose, key_index, call.model)
+      context = await self._context_handle(slot)
+      start = time.perf_counter()
+      early.reset()
+      chunks: List[str] = []
+      with self.key_pool.lease(key_index):
+        try:
+          params = {"key": self.key_pool.key(key_index), "alt": "sse"}
+          response = await self._stream_once(url, params, self._payload(prompt, purpose, context), chunks, early, call)
+          if self._context_rejected(response, slot, context):
+            response = await self._stream_once(url, params, self._payload(prompt, purpose), chunks, early, call)
+        except httpx.HTTPError as exc:
+          self._record_transport_error(key_index, start, exc, message_id, purpose, idx)
+          continue
+
+      if response.status_code != 200:
+        self._settle(key_index, start, response, message_id, purpose, idx, call)
+        continue
+      latency = round((time.perf_counter() - start) * 1000, 2)
+      if not chunks:
+        logger.warning("Gemini stream carried no text", extra={"message_id": message_id, "purpose": purpose})
+        self.key_pool.record_failure(key_index, status=response.status_code, latency_ms=latency)
+        continue
+      self.key_pool.record_success(key_index, latency)
+      early.finish()
+      return "".join(chunks)
+
+    raise GeminiUnavailableError("All Gemini API keys exhausted.")
+
+  async def _stream_once(
+    self,
+    url: str,
+    params: Dict[str, str],
+    payload: Dict[str, Any],
+    chunks: List[str],
+    early: _EarlyRouting,
+    call: LlmCall,
+  ) -> httpx.Response:
+    """One streamed attempt; text is collected into ``chunks`` only from a 200 response."""
+    async with self._client().stream("POST", url, params=params, json=payload) as response:
+      if response.status_code == 200:
+        async for line in response.aiter_lines():
+          chunk, usage = self._stream_event(line)
+          call.absorb_usage(usage)
+          if chunk:
+            chunks.append(chunk)
+            early.feed(chunk)
+      else:
+        await response.aread()
+    return response
+
+  async def _context_handle(self, slot: Optional[Slot]) -> Optional[ContextHandle]:
+    if slot is None:
+      return None
+    handle, action = context_cache.acquire(slot)
+    if action:
+      method, url, params, body = self._context_call(slot, action, handle)
+      try:
+        response = await self._client().request(method, url, params=params, json=body)
+        handle = self._context_settled(slot, action, handle, response)
+      except httpx.HTTPError as exc:
+        handle = self._context_settled(slot, action, handle, None, str(exc))
+    context_cache.count(handle is not None)
+    return handle
+
+  def _client(self) -> httpx.AsyncClient:
+    # httpx async clients are bound to the loop they first ran on; rebuild if the loop changed.
+    loop = asyncio.get_running_loop()
+    if self._http is None or self._http_loop is not loop:
+      limits = httpx.Limits(
+        max_connections=self.limiter.max_in_flight,
+        max_keepalive_connections=self.limiter.max_in_flight,
+      )
+      transport = build_transport(asynchronous=True, http2=True, limits=limits)
+      self._http = httpx.AsyncClient(http2=True, timeout=REQUEST_TIMEOUT_SECONDS, limits=limits, transport=transport)
+      self._http_loop = loop
+    return self._http
+
+  async def aclose(self) -> None:
+    if self._http is not None:
+      await self._http.aclose()
+      self._http = None
+      self._http_loop = None
 
 
 gemini_client = GeminiClient()
+async_gemini_client = AsyncGeminiClient(max_in_flight=settings.gemini_max_in_flight)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# A handle is refreshed once less than this share of its TTL (and at least a minute) is left.
+REFRESH_FRACTION = 0.1
+MIN_REFRESH_MARGIN_SECONDS = 60.0
+# After the provider refuses to cache a block (too small, unsupported model...) send it inline
+# for this long before asking again.
+UNAVAILABLE_RETRY_SECONDS = 3600.0
+
+# (key index, model, purpose, prompt version). Cached content belongs to the API key's project,
+# so every key needs its own handle.
+Slot = Tuple[int, str, str, str]
+
+
+@dataclass
+class ContextHandle:
+  name: str
+  expires_at: float
+
+
+class ContextCacheRegistry:
+  """
+  Bookkeeping for provider-side cached-content handles holding the static instruction blocks.
+  The clients perform the HTTP calls; this decides when a handle must be created or refreshed and
+  makes sure only one caller does it, while everyone else keeps sending the block inline.
+  """
+
+  def __init__(self, *, enabled: bool = True, ttl_seconds: int = 3600, clock=time.monotonic):
+    self.enabled = enabled
+    self.ttl_seconds = ttl_seconds
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._handles: Dict[Slot, ContextHandle] = {}
+    self._pending: set[Slot] = set()
+    self._unavailable_until: Dict[Slot, float] = {}
+    self._stats = {"created": 0, "refreshed": 0, "failed": 0, "invalidated": 0, "used": 0, "inline": 0}
+
+  @property
+  def refresh_margin(self) -> float:
+    return max(MIN_REFRESH_MARGIN_SECONDS, self.ttl_seconds * REFRESH_FRACTION)
+
+  def acquire(self, slot: Slot) -> Tuple[Optional[ContextHandle], Optional[str]]:
+    """
+    The live handle for ``slot`` (if any) and the action the caller has been chosen to perform
+    first: "create", "refresh" or None.
+    """
+    now = self._clock()
+    with self._lock:
+      handle = self._handles.get(slot)
+      if handle and handle.expires_at <= now:
+        del self._handles[slot]
+        handle = None
+      action = None
+      if slot not in self._pending and self._unavailable_until.get(slot, 0.0) <= now:
+        if handle is None:
+          action = "create"
+        elif handle.expires_at - now < self.refresh_margin:
+          action = "refresh"
+      if action:
+        self._pending.add(slot)
+      return handle, action
+
+  def store(self, slot: Slot, name: str, *, refreshed: bool = False) -> ContextHandle:
+    handle = ContextHandle(name=name, expires_at=self._clock() + self.ttl_seconds)
+    with self._lock:
+      self._handles[slot] = handle
+      self._pending.discard(slot)
+      self._unavailable_until.pop(slot, None)
+      self._stats["refreshed" if refreshed else "created"] += 1
+    return handle
+
+  def fail(self, slot: Slot, reason: str) -> None:
+    with self._lock:
+      self._pending.discard(slot)
+      self._unavailable_until[slot] = self._clock() + UNAVAILABLE_RETRY_SECONDS
+      self._stats["failed"] += 1
+    logger.warning("Context caching unavailable", extra={"purpose": slot[2], "key_index": slot[0], "error": reason})
+
+  def invalidate(self, slot: Slot) -> None:
+    """The provider rejected the handle (deleted or expired early); the next call recreates it."""
+    with self._lock:
+      self._handles.pop(slot, None)
+      self._stats["invalidated"] += 1
+
+  def count(self, used: bool) -> None:
+    with self._lock:
+      self._stats["used" if used else "inline"] += 1
+
+  def stats(self) -> Dict[str, Any]:
+    now = self._clock()
+    with self._lock:
+      return {
+        "enabled": self.enabled,
+        "ttl_seconds": self.ttl_seconds,
+        "live_handles": sum(1 for handle in self._handles.values() if handle.expires_at > now),
+        "unavailable_slots": sum(1 for until in self._unavailable_until.values() if until > now),
+        **self._stats,
+      }
+
+
+context_cache = ContextCacheRegistry(
+  enabled=settings.llm_context_cache_enabled,
+  ttl_seconds=settings.llm_context_cache_ttl_seconds,
+)
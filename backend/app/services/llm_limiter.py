@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+
+class FairConcurrencyLimiter:
+  """
+  Caps the number of in-flight operations and hands out freed slots round-robin across
+  tenants (users), so one large pipeline run cannot starve another user's requests.
+  """
+
+  def __init__(self, max_in_flight: int):
+    if max_in_flight < 1:
+      raise ValueError("max_in_flight must be at least 1")
+    self.max_in_flight = max_in_flight
+    self._in_flight = 0
+    self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+  @property
+  def in_flight(self) -> int:
+    return self._in_flight
+
+  @property
+  def queued(self) -> Dict[str, int]:
+    return {tenant: sum(1 for fut in queue if not fut.done()) for tenant, queue in self._waiters.items()}
+
+  @asynccontextmanager
+  async def slot(self, tenant: str | None = None) -> AsyncIterator[None]:
+    await self.acquire(tenant)
+    try:
+      yield
+    finally:
+      self.release()
+
+  async def acquire(self, tenant: str | None = None) -> None:
+    if self._in_flight < self.max_in_flight and not self._waiters:
+      self._in_flight += 1
+      return
+
+    future = asyncio.get_running_loop().create_future()
+    self._waiters.setdefault(tenant or "_anonymous", deque()).append(future)
+    try:
+      await future
+    except asyncio.CancelledError:
+      # The slot may have been granted just before cancellation landed; hand it back.
+      if future.done() and not future.cancelled():
+        self.release()
+      raise
+
+  def release(self) -> None:
+    self._in_flight -= 1
+    self._wake_next()
+
+  def _wake_next(self) -> None:
+    while self._in_flight < self.max_in_flight and self._waiters:
+      tenant, queue = next(iter(self._waiters.items()))
+      future = queue.popleft()
+      # Rotate the tenant to the back so the next free slot goes to someone else.
+      del self._waiters[tenant]
+      if queue:
+        self._waiters[tenant] = queue
+      if future.done():
+        continue
+      self._in_flight += 1
+      future.set_result(None)
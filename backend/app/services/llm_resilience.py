@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Hedge only once the purpose has enough samples for its p95 to mean something.
+MIN_HEDGE_SAMPLES = 20
+MIN_HEDGE_DELAY_SECONDS = 0.25
+
+
+class GeminiUnavailableError(RuntimeError):
+  """Every key failed with a retryable status or a transport error."""
+
+
+class CircuitOpenError(GeminiUnavailableError):
+  """The breaker for this model/endpoint is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+  """
+  Consecutive-failure breaker. After ``failure_threshold`` failures in a row it opens for
+  ``reset_timeout`` seconds, then lets a single probe through (half-open): success closes it,
+  failure opens it again.
+  """
+
+  def __init__(self, name: str, *, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+    self.name = name
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._state = "closed"
+    self._failures = 0
+    self._opened_at = 0.0
+    self._probe_in_flight = False
+    self._stats = {"opened": 0, "rejected": 0}
+
+  @property
+  def state(self) -> str:
+    with self._lock:
+      return self._current_state()
+
+  def before_call(self) -> None:
+    """Raise CircuitOpenError instead of letting a call through an open breaker."""
+    with self._lock:
+      state = self._current_state()
+      if state == "closed":
+        return
+      if state == "half_open" and not self._probe_in_flight:
+        self._probe_in_flight = True
+        return
+      self._stats["rejected"] += 1
+    raise CircuitOpenError(f"Circuit open for {self.name}")
+
+  def record_success(self) -> None:
+    with self._lock:
+      if self._state != "closed":
+        logger.info("Circuit closed", extra={"breaker": self.name})
+      self._state = "closed"
+      self._failures = 0
+      self._probe_in_flight = False
+
+  def record_failure(self) -> None:
+    with self._lock:
+      self._failures += 1
+      probe_failed = self._probe_in_flight
+      self._probe_in_flight = False
+      if probe_failed or (self._state == "closed" and self._failures >= self.failure_threshold):
+        self._state = "open"
+        self._opened_at = self._clock()
+        self._stats["opened"] += 1
+        logger.warning("Circuit opened", extra={"breaker": self.name, "failures": self._failures})
+
+  def release_probe(self) -> None:
+    """A probe ended without a verdict (e.g. a non-retryable error); let another one through."""
+    with self._lock:
+      self._probe_in_flight = False
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      return {"state": self._current_state(), "consecutive_failures": self._failures, **self._stats}
+
+  def _current_state(self) -> str:
+    if self._state == "open" and self._clock() - self._opened_at >= self.reset_timeout:
+      self._state = "half_open"
+    return self._state
+
+
+class BreakerRegistry:
+  def __init__(self, *, failure_threshold: int, reset_timeout: float, enabled: bool = True):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.enabled = enabled
+    self._lock = threading.Lock()
+    self._breakers: Dict[str, CircuitBreaker] = {}
+
+  def get(self, name: str) -> Optional[CircuitBreaker]:
+    if not self.enabled:
+      return None
+    with self._lock:
+      breaker = self._breakers.get(name)
+      if breaker is None:
+        breaker = self._breakers[name] = CircuitBreaker(
+          name, failure_threshold=self.failure_threshold, reset_timeout=self.reset_timeout
+        )
+      return breaker
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      breakers = list(self._breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+async def hedged(attempt: Callable[[], Awaitable[T]], delay: Optional[float]) -> tuple[T, bool]:
+  """
+  Run ``attempt``; if it has not finished after ``delay`` seconds start a duplicate and take
+  whichever succeeds first, cancelling the other. Returns (result, whether a hedge was fired).
+  A failure of one copy is only raised once the other copy has failed too.
+  """
+  first = asyncio.ensure_future(attempt())
+  if delay is None:
+    return await first, False
+
+  tasks = {first}
+  try:
+    done, _ = await asyncio.wait(tasks, timeout=delay)
+    if done:
+      return first.result(), False
+
+    tasks.add(asyncio.ensure_future(attempt()))
+    error: Optional[BaseException] = None
+    pending = set(tasks)
+    while pending:
+      done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+      for task in done:
+        if task.exception() is None:
+          return task.result(), True
+        error = task.exception()
+    raise error  # type: ignore[misc]
+  finally:
+    for task in tasks:
+      if not task.done():
+        task.cancel()
+
+
+breaker_registry = BreakerRegistry(
+  failure_threshold=settings.llm_breaker_failure_threshold,
+  reset_timeout=settings.llm_breaker_reset_seconds,
+  enabled=settings.llm_breaker_enabled,
+)
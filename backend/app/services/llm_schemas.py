@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Literal, Optional, Type
+
+from pydantic import BaseModel, Field
+
+CrmName = Literal["hubspot", "salesforce"]
+CrmObject = Literal[
+  "contacts",
+  "leads",
+  "accounts",
+  "opportunities",
+  "cases",
+  "companies",
+  "deals",
+  "tickets",
+  "campaigns",
+  "orders",
+  "notes",
+  "none",
+]
+
+
+class Person(BaseModel):
+  name: str
+  email: Optional[str] = None
+  job_title: Optional[str] = None
+  phone: Optional[str] = None
+
+
+class Company(BaseModel):
+  name: str
+  domain: Optional[str] = None
+
+
+class ExtractionPayload(BaseModel):
+  """Shape the model returns for CRM extraction; ValidatedExtraction adds the bookkeeping fields."""
+
+  people: List[Person] = Field(default_factory=list)
+  company: Optional[Company] = None
+  intent: Optional[str] = None
+  amount: Optional[str] = None
+  dates: List[str] = Field(default_factory=list)
+  next_steps: List[str] = Field(default_factory=list)
+  summary: str
+  evidence: str
+
+
+class DealProperties(BaseModel):
+  dealname: Optional[str] = None
+  amount: Optional[str] = None
+
+
+class OpportunityProperties(BaseModel):
+  name: Optional[str] = None
+  amount: Optional[str] = None
+
+
+class TicketProperties(BaseModel):
+  subject: Optional[str] = None
+  content: Optional[str] = None
+
+
+class CaseProperties(BaseModel):
+  subject: Optional[str] = None
+  priority: Optional[str] = None
+
+
+class LeadProperties(BaseModel):
+  company: Optional[str] = None
+  status: Optional[str] = None
+
+
+class CampaignProperties(BaseModel):
+  name: Optional[str] = None
+  type: Optional[str] = None
+
+
+class OrderProperties(BaseModel):
+  reference: Optional[str] = None
+
+
+class SuggestedProperties(BaseModel):
+  deal: Optional[DealProperties] = None
+  opportunity: Optional[OpportunityProperties] = None
+  ticket: Optional[TicketProperties] = None
+  case: Optional[CaseProperties] = None
+  lead: Optional[LeadProperties] = None
+  campaign: Optional[CampaignProperties] = None
+  order: Optional[OrderProperties] = None
+
+
+class RoutingPayload(BaseModel):
+  """Shape the model returns for routing; AIRouter turns it into a RoutingDecision."""
+
+  target_crm: List[CrmName]
+  primary_object: CrmObject
+  secondary_objects: List[CrmObject]
+  confidence: float
+  reasoning: str
+  intent: Literal["sales", "support", "billing", "spam", "personal", "other"]
+  urgency: Literal["high", "medium", "low"]
+  suggested_properties: SuggestedProperties
+
+
+class PackedRoutingEntry(RoutingPayload):
+  id: str
+
+
+class CombinedPayload(BaseModel):
+  routing: RoutingPayload
+  extraction: ExtractionPayload
+
+
+class ChunkNotes(BaseModel):
+  """Facts pulled from one excerpt of a long email during map-reduce."""
+
+  facts: List[str] = Field(default_factory=list)
+
+
+class SheetsEntity(BaseModel):
+  type: Literal["company", "person", "product", "job_role", "date", "other"]
+  value: str
+
+
+class SheetsEnrichment(BaseModel):
+  classification: Literal["Lead", "Case", "Contact", "Opportunity", "None"]
+  confidence: float
+  intent: str
+  urgency: Literal["Low", "Medium", "High", "Critical"]
+  sentiment: Literal["Positive", "Neutral", "Negative"]
+  sender_label: str
+  entities: List[SheetsEntity]
+  reasoning: str
+
+
+_TYPE_NAMES = {"string": "STRING", "number": "NUMBER", "integer": "INTEGER", "boolean": "BOOLEAN"}
+
+
+def gemini_schema(model: Type[BaseModel], *, as_array: bool = False) -> Dict[str, Any]:
+  """Translate a pydantic model into Gemini's responseSchema (OpenAPI subset, refs inlined)."""
+  raw = model.model_json_schema()
+  schema = _convert(raw, raw.get("$defs", {}))
+  return {"type": "ARRAY", "items": schema} if as_array else schema
+
+
+def _convert(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+  if "$ref" in node:
+    return _convert(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+
+  if "anyOf" in node:
+    options = [option for option in node["anyOf"] if option.get("type") != "null"]
+    nullable = len(options) != len(node["anyOf"])
+    converted = _convert(options[0], defs) if len(options) == 1 else {"anyOf": [_convert(o, defs) for o in options]}
+    return {**converted, "nullable": True} if nullable else converted
+
+  if "enum" in node:
+    return {"type": "STRING", "enum": [str(value) for value in node["enum"]]}
+  if "const" in node:
+    return {"type": "STRING", "enum": [str(node["const"])]}
+
+  node_type = node.get("type")
+  if node_type == "object":
+    properties = node.get("properties") or {}
+    converted = {
+      "type": "OBJECT",
+      "properties": {name: _convert(prop, defs) for name, prop in properties.items()},
+      "propertyOrdering": list(properties),
+    }
+    if node.get("required"):
+      converted["required"] = list(node["required"])
+    return converted
+  if node_type == "array":
+    return {"type": "ARRAY", "items": _convert(node.get("items") or {"type": "string"}, defs)}
+  return {"type": _TYPE_NAMES.get(node_type, "STRING")}
+
+
+RESPONSE_SCHEMAS: Dict[str, Dict[str, Any]] = {
+  "analysis": gemini_schema(ExtractionPayload),
+  "repair": gemini_schema(ExtractionPayload),
+  "routing": gemini_schema(RoutingPayload),
+  "routing_batch": gemini_schema(PackedRoutingEntry, as_array=True),
+  "combined": gemini_schema(CombinedPayload),
+  "sheets_enrichment": gemini_schema(SheetsEnrichment),
+  "chunk_notes": gemini_schema(ChunkNotes),
+}
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 5000
+AGGREGATION_INTERVAL_SECONDS = 10.0
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class LlmCall:
+  """One logical LLM call (across key rotations). Key indexes are recorded, never keys."""
+
+  purpose: str
+  model: str
+  user_id: Optional[str] = None
+  message_id: str = ""
+  key_index: Optional[int] = None
+  attempts: int = 0
+  outcome: str = "ok"  # ok | cache_hit | error
+  streamed: bool = False
+  latency_ms: float = 0.0
+  prompt_tokens: int = 0
+  response_tokens: int = 0
+  cached_tokens: int = 0
+  # True when the response carried no usageMetadata and the counts are estimates.
+  estimated_tokens: bool = False
+  hedged: bool = False
+  error: Optional[str] = None
+  started_at: float = field(default_factory=time.time)
+
+  def absorb_usage(self, usage: Any) -> bool:
+    if not isinstance(usage, dict) or not usage:
+      return False
+    self.prompt_tokens = int(usage.get("promptTokenCount") or 0)
+    self.response_tokens = int(usage.get("candidatesTokenCount") or 0)
+    self.cached_tokens = int(usage.get("cachedContentTokenCount") or 0)
+    self.estimated_tokens = False
+    return True
+
+  def absorb_attempt(self, other: "LlmCall") -> None:
+    """Take key, attempt and token details from the copy of a hedged call that won."""
+    self.key_index = other.key_index
+    self.attempts = other.attempts
+    self.prompt_tokens = other.prompt_tokens
+    self.response_tokens = other.response_tokens
+    self.cached_tokens = other.cached_tokens
+    self.estimated_tokens = other.estimated_tokens
+
+
+class LlmTelemetry:
+  """
+  Ring buffer of recent LLM calls plus lifetime totals per (purpose, user). Latency percentiles
+  come from the buffered window; aggregates are recomputed at most every ``interval`` seconds.
+  """
+
+  def __init__(
+    self,
+    *,
+    capacity: int = DEFAULT_CAPACITY,
+    input_price_per_mtok: float = 0.0,
+    output_price_per_mtok: float = 0.0,
+    cached_input_price_per_mtok: float = 0.0,
+    interval: float = AGGREGATION_INTERVAL_SECONDS,
+    clock=time.monotonic,
+  ):
+    self.capacity = capacity
+    self.input_price_per_mtok = input_price_per_mtok
+    self.output_price_per_mtok = output_price_per_mtok
+    self.cached_input_price_per_mtok = cached_input_price_per_mtok
+    self.interval = interval
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._calls: Deque[LlmCall] = deque(maxlen=capacity)
+    self._totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+    self._snapshots: Dict[Tuple[str, Optional[str]], Tuple[float, Dict[str, Any]]] = {}
+
+  @contextmanager
+  def track(self, call: LlmCall) -> Iterator[LlmCall]:
+    """Time the block and record ``call`` when it exits; exceptions mark the call as an error."""
+    start = time.perf_counter()
+    try:
+      yield call
+    except Exception as exc:
+      call.outcome = "error"
+      call.error = str(exc)[:200]
+      raise
+    finally:
+      call.latency_ms = round((time.perf_counter() - start) * 1000, 2)
+      self.record(call)
+
+  def record(self, call: LlmCall) -> None:
+    with self._lock:
+      self._calls.append(call)
+      totals = self._totals.setdefault((call.purpose, call.user_id or "-"), _empty_totals())
+      totals["calls"] += 1
+      totals[call.outcome] = totals.get(call.outcome, 0) + 1
+      totals["prompt_tokens"] += call.prompt_tokens
+      totals["response_tokens"] += call.response_tokens
+      totals["cached_tokens"] += call.cached_tokens
+      totals["cost_usd"] += self.cost(call)
+    logger.info(
+      "LLM call",
+      extra={
+        "purpose": call.purpose,
+        "model": call.model,
+        "message_id": call.message_id,
+        "key_index": call.key_index,
+        "attempts": call.attempts,
+        "outcome": call.outcome,
+        "latency_ms": call.latency_ms,
+        "prompt_tokens": call.prompt_tokens,
+        "response_tokens": call.response_tokens,
+        "cached_tokens": call.cached_tokens,
+      },
+    )
+
+  def cost(self, call: LlmCall) -> float:
+    if call.outcome == "cache_hit":
+      return 0.0
+    # promptTokenCount includes the tokens served from cached content, which bill at the cached rate.
+    cached = min(call.cached_tokens, call.prompt_tokens)
+    return (
+      (call.prompt_tokens - cached) * self.input_price_per_mtok
+      + cached * self.cached_input_price_per_mtok
+      + call.response_tokens * self.output_price_per_mtok
+    ) / 1_000_000
+
+  def latency_percentile(self, purpose: str, percentile: int = 95, *, min_samples: int = 1) -> Optional[float]:
+    """Windowed latency percentile (ms) for ``purpose`` from the periodic aggregate, if sampled enough."""
+    group = self.summary("purpose")["groups"].get(purpose)
+    if not group or group["latency_samples"] < min_samples:
+      return None
+    return group["latency_ms"].get(f"p{percentile}")
+
+  def recent(self, limit: int = 50, *, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Newest calls first; only ``user_id``'s calls when it is given."""
+    with self._lock:
+      calls = [call for call in self._calls if user_id is None or call.user_id == user_id][-limit:]
+    return [asdict(call) for call in reversed(calls)]
+
+  def summary(self, group_by: str = "purpose", *, user_id: Optional[str] = None, fresh: bool = False) -> Dict[str, Any]:
+    """Aggregates over every call, or only ``user_id``'s calls when it is given."""
+    if group_by not in ("purpose", "user"):
+      raise ValueError("group_by must be 'purpose' or 'user'")
+    now = self._clock()
+    with self._lock:
+      snapshot = self._snapshots.get((group_by, user_id))
+      if snapshot and not fresh and now - snapshot[0] < self.interval:
+        return snapshot[1]
+      calls = [call for call in self._calls if user_id is None or call.user_id == user_id]
+      totals = {key: dict(value) for key, value in self._totals.items() if user_id is None or key[1] == user_id}
+
+    result = {
+      "group_by": group_by,
+      "window_calls": len(calls),
+      "capacity": self.capacity,
+      "groups": self._aggregate(calls, totals, group_by),
+    }
+    with self._lock:
+      self._snapshots[(group_by, user_id)] = (now, result)
+    return result
+
+  def _aggregate(
+    self, calls: List[LlmCall], totals: Dict[Tuple[str, str], Dict[str, float]], group_by: str
+  ) -> Dict[str, Any]:
+    def group_of(purpose: str, user_id: Optional[str]) -> str:
+      return purpose if group_by == "purpose" else (user_id or "-")
+
+    window: Dict[str, List[LlmCall]] = {}
+    for call in calls:
+      window.setdefault(group_of(call.purpose, call.user_id), []).append(call)
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for (purpose, user_id), values in totals.items():
+      group = groups.setdefault(group_of(purpose, user_id), _empty_totals())
+      for name, value in values.items():
+        group[name] = group.get(name, 0) + value
+
+    for name, group in groups.items():
+      recent = window.get(name, [])
+      # Cache hits and failures (including fail-fast ones) would skew the distribution.
+      latencies = np.asarray([call.latency_ms for call in recent if call.outcome == "ok"], dtype=float)
+      group["cost_usd"] = round(group["cost_usd"], 6)
+      group["latency_samples"] = int(latencies.size)
+      group["hedged"] = sum(1 for call in recent if call.hedged)
+      group["latency_ms"] = (
+        {f"p{p}": round(float(value), 2) for p, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES))}
+        if latencies.size
+        else {f"p{p}": None for p in PERCENTILES}
+      )
+      group["mean_attempts"] = round(float(np.mean([call.attempts for call in recent])), 3) if recent else None
+    return groups
+
+
+def _empty_totals() -> Dict[str, float]:
+  return {
+    "calls": 0,
+    "ok": 0,
+    "cache_hit": 0,
+    "error": 0,
+    "prompt_tokens": 0,
+    "response_tokens": 0,
+    "cached_tokens": 0,
+    "cost_usd": 0.0,
+  }
+
+
+llm_telemetry = LlmTelemetry(
+  capacity=settings.llm_telemetry_capacity,
+  input_price_per_mtok=settings.llm_price_input_per_mtok,
+  output_price_per_mtok=settings.llm_price_output_per_mtok,
+  cached_input_price_per_mtok=settings.llm_price_cached_input_per_mtok,
+)
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURE_DIR = Path(__file__).resolve().parents[2] / "llm_fixtures"
+TRANSPORT_MODES = ("live", "record", "replay", "synthetic")
+STREAM_CHUNK_CHARS = 64
+_PACKED_EMAIL_ID = re.compile(r"^### EMAIL (\S+)", re.MULTILINE)
+
+Usage = Optional[Dict[str, Any]]
+
+
+def fixture_key(request: httpx.Request) -> str:
+  """
+  Stable id for a Gemini request: model plus canonical JSON body. The API key (a query param)
+  and the method (generateContent vs streamGenerateContent) are left out, so a fixture recorded
+  with streaming on replays with it off and vice versa.
+  """
+  model = request.url.path.rsplit("/", 1)[-1].split(":", 1)[0]
+  try:
+    body = json.dumps(json.loads(request.content or b"{}"), sort_keys=True, separators=(",", ":"))
+  except ValueError:
+    body = request.content.decode("utf-8", "replace")
+  return hashlib.sha256(f"{model}\n{body}".encode("utf-8")).hexdigest()[:32]
+
+
+def is_stream(request: httpx.Request) -> bool:
+  return request.url.path.endswith(":streamGenerateContent")
+
+
+def prompt_text(request: httpx.Request) -> str:
+  try:
+    payload = json.loads(request.content or b"{}")
+    return "".join(part.get("text") or "" for part in payload["contents"][0]["parts"])
+  except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+    return ""
+
+
+def response_schema(request: httpx.Request) -> Optional[Dict[str, Any]]:
+  try:
+    return json.loads(request.content or b"{}")["generationConfig"].get("responseSchema")
+  except (ValueError, KeyError, TypeError, AttributeError):
+    return None
+
+
+def decode_body(body: bytes, *, stream: bool) -> Tuple[str, Usage]:
+  """Candidate text and usageMetadata of a generateContent JSON body or an SSE stream body."""
+  events: List[Any] = []
+  if stream:
+    for line in body.decode("utf-8", "replace").splitlines():
+      if line.startswith("data:"):
+        try:
+          events.append(json.loads(line[len("data:"):].strip()))
+        except ValueError:
+          continue
+  else:
+    events.append(json.loads(body or b"{}"))
+
+  texts: List[str] = []
+  usage: Usage = None
+  for event in events:
+    if not isinstance(event, dict):
+      continue
+    usage = event.get("usageMetadata") or usage
+    try:
+      parts = event["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+      continue
+    texts.extend(part.get("text") or "" for part in parts if isinstance(part, dict))
+  return "".join(texts), usage
+
+
+def _candidate(text: str, usage: Usage = None) -> Dict[str, Any]:
+  payload: Dict[str, Any] = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+  if usage:
+    payload["usageMetadata"] = usage
+  return payload
+
+
+def _sse_events(text: str, usage: Usage) -> List[bytes]:
+  pieces = [text[start : start + STREAM_CHUNK_CHARS] for start in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+  return [
+    f"data: {json.dumps(_candidate(piece, usage if idx == len(pieces) - 1 else None))}\r\n\r\n".encode("utf-8")
+    for idx, piece in enumerate(pieces)
+  ]
+
+
+class _PacedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+  """SSE body whose events are spaced ``delay`` seconds apart, like a model generating tokens."""
+
+  def __init__(self, events: List[bytes], delay: float):
+    self.events = events
+    self.delay = delay
+
+  def __iter__(self) -> Iterator[bytes]:
+    for idx, event in enumerate(self.events):
+      if idx and self.delay:
+        time.sleep(self.delay)
+      yield event
+
+  async def __aiter__(self) -> AsyncIterator[bytes]:
+    for idx, event in enumerate(self.events):
+      if idx and self.delay:
+        await asyncio.sleep(self.delay)
+      yield event
+
+
+class _OfflineTransport(httpx.BaseTransport, httpx.AsyncBaseTransport, ABC):
+  """
+  Answers Gemini requests without the network. Subclasses decide the (text, usage) for a request;
+  this renders it as a generateContent body or an SSE stream. ``latency_ms`` is the simulated
+  time to the full response: all of it before a plain response, spread across events when streaming.
+  """
+
+  def __init__(self, *, latency_ms: float = 0.0):
+    self.latency = max(0.0, latency_ms) / 1000
+
+  @abstractmethod
+  def answer(self, request: httpx.Request) -> Optional[Tuple[str, Usage]]:
+    """The response text and usage metadata for ``request``, or None to answer 404."""
+
+  def handle_request(self, request: httpx.Request) -> httpx.Response:
+    response, wait = self._build(request)
+    if wait:
+      time.sleep(wait)
+    return response
+
+  async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+    response, wait = self._build(request)
+    if wait:
+      await asyncio.sleep(wait)
+    return response
+
+  def _build(self, request: httpx.Request) -> Tuple[httpx.Response, float]:
+    answer = self.answer(request)
+    if answer is None:
+      message = f"No LLM fixture for request {fixture_key(request)}"
+      return httpx.Response(404, json={"error": {"code": 404, "message": message}}, request=request), 0.0
+    text, usage = answer
+    if not is_stream(request):
+      return httpx.Response(200, json=_candidate(text, usage), request=request), self.latency
+    events = _sse_events(text, usage)
+    delay = self.latency / len(events)
+    response = httpx.Response(
+      200, headers={"Content-Type": "text/event-stream"}, stream=_PacedStream(events, delay), request=request
+    )
+    return response, delay
+
+
+class ReplayTransport(_OfflineTransport):
+  """Serves responses captured by RecordingTransport; unknown requests get a 404 (a fatal error)."""
+
+  def __init__(self, fixture_dir: Path, *, latency_ms: float = 0.0):
+    super().__init__(latency_ms=latency_ms)
+    self.fixture_dir = fixture_dir
+    self.stats = {"hits": 0, "misses": 0}
+
+  def answer(self, request: httpx.Request) -> Optional[Tuple[str, Usage]]:
+    path = self.fixture_dir / f"{fixture_key(request)}.json"
+    try:
+      fixture = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+      self.stats["misses"] += 1
+      logger.warning("LLM fixture missing", extra={"fixture": path.name})
+      return None
+    self.stats["hits"] += 1
+    return fixture["text"], fixture.get("usage")
+
+
+class SyntheticTransport(_OfflineTransport):
+  """
+  Fabricates a response that satisfies the request's responseSchema, seeded by the request so the
+  same prompt always gets the same answer. Packed routing prompts get one entry per email id.
+  """
+
+  def __init__(self, *, latency_ms: float = 0.0, seed: int = 0):
+    super().__init__(latency_ms=latency_ms)
+    self.seed = seed
+
+  def answer(self, request: httpx.Request) -> Optional[Tuple[str, Usage]]:
+    rng = random.Random(f"{self.seed}:{fixture_key(request)}")
+    prompt = prompt_text(request)
+    schema = response_schema(request)
+    if schema is None:
+      value: Any = {}
+    elif schema.get("type") == "ARRAY" and "id" in (schema.get("items") or {}).get("properties", {}):
+      value = [{**synthesize(schema["items"], rng), "id": email_id} for email_id in _PACKED_EMAIL_ID.findall(prompt)]
+    else:
+      value = synthesize(schema, rng)
+    text = json.dumps(value)
+    usage = {"promptTokenCount": max(1, len(prompt) // 4), "candidatesTokenCount": max(1, len(text) // 4)}
+    return text, usage
+
+
+def synthesize(schema: Dict[str, Any], rng: random.Random, name: str = "") -> Any:
+  """A value matching a Gemini responseSchema node; nullable fields are still filled in."""
+  if "anyOf" in schema:
+    return synthesize(rng.choice(schema["anyOf"]), rng, name)
+  if "enum" in schema:
+    return rng.choice(schema["enum"])
+  kind = schema.get("type")
+  if kind == "OBJECT":
+    properties = schema.get("properties") or {}
+    return {key: synthesize(prop, rng, key) for key, prop in properties.items()}
+  if kind == "ARRAY":
+    return [synthesize(schema.get("items") or {"type": "STRING"}, rng, name) for _ in range(rng.randint(1, 2))]
+  if kind == "NUMBER":
+    # Confidence-like numbers land above the usual thresholds so the run exercises the happy path.
+    return round(rng.uniform(0.8, 0.99), 2)
+  if kind == "INTEGER":
+    return rng.randint(0, 100)
+  if kind == "BOOLEAN":
+    return rng.random() < 0.5
+  return f"{name or 'value'}-{rng.randint(0, 9999)}"
+
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+  """
+  Passes requests to the live transport and writes every successful response to
+  ``<fixture_dir>/<fixture_key>.json``. Streamed bodies are read in full before being handed
+  back, so early routing fires late while recording.
+  """
+
+  def __init__(self, inner: Any, fixture_dir: Path):
+    self.inner = inner
+    self.fixture_dir = fixture_dir
+
+  def handle_request(self, request: httpx.Request) -> httpx.Response:
+    response = self.inner.handle_request(request)
+    if response.status_code != 200:
+      return response
+    body = response.read()
+    response.close()
+    return self._save(request, response, body)
+
+  async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+    response = await self.inner.handle_async_request(request)
+    if response.status_code != 200:
+      return response
+    body = await response.aread()
+    await response.aclose()
+    return self._save(request, response, body)
+
+  def close(self) -> None:
+    self.inner.close()
+
+  async def aclose(self) -> None:
+    await self.inner.aclose()
+
+  def _save(self, request: httpx.Request, response: httpx.Response, body: bytes) -> httpx.Response:
+    try:
+      text, usage = decode_body(body, stream=is_stream(request))
+      fixture = {
+        "model": request.url.path.rsplit("/", 1)[-1].split(":", 1)[0],
+        "prompt_preview": prompt_text(request)[:200],
+        "text": text,
+        "usage": usage,
+        "recorded_at": time.time(),
+      }
+      self.fixture_dir.mkdir(parents=True, exist_ok=True)
+      (self.fixture_dir / f"{fixture_key(request)}.json").write_text(json.dumps(fixture, indent=2), encoding="utf-8")
+    except (OSError, ValueError) as exc:
+      logger.warning("Failed to record LLM fixture", extra={"error": str(exc)})
+    headers = {"Content-Type": response.headers.get("Content-Type", "application/json")}
+    return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+
+def build_transport(*, asynchronous: bool, http2: bool = False, limits: Optional[httpx.Limits] = None) -> Any:
+  """Transport for the configured LLM_TRANSPORT_MODE; None means httpx's default (live) transport."""
+  mode = settings.llm_transport_mode
+  if mode not in TRANSPORT_MODES:
+    raise ValueError(f"LLM_TRANSPORT_MODE must be one of {', '.join(TRANSPORT_MODES)}")
+  fixture_dir = Path(settings.llm_fixture_dir) if settings.llm_fixture_dir else DEFAULT_FIXTURE_DIR
+  latency_ms = settings.llm_transport_latency_ms
+  if mode == "replay":
+    return ReplayTransport(fixture_dir, latency_ms=latency_ms)
+  if mode == "synthetic":
+    return SyntheticTransport(latency_ms=latency_ms)
+  if mode == "record":
+    kwargs: Dict[str, Any] = {"limits": limits} if limits is not None else {}
+    inner = httpx.AsyncHTTPTransport(http2=http2, **kwargs) if asynchronous else httpx.HTTPTransport(**kwargs)
+    return RecordingTransport(inner, fixture_dir)
+  return None
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from email.utils import parseaddr
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from .gmail_ingest import GmailMessage
+from .json_repair import lenient_loads
+from .prompt_budget import split_quoted_history
+
+# Senders at these domains say nothing about their employer.
+FREE_MAIL_DOMAINS = frozenset(
+  {
+    "aol.com",
+    "fastmail.com",
+    "gmail.com",
+    "gmx.com",
+    "gmx.de",
+    "googlemail.com",
+    "hey.com",
+    "hotmail.co.uk",
+    "hotmail.com",
+    "icloud.com",
+    "live.com",
+    "mac.com",
+    "mail.com",
+    "me.com",
+    "msn.com",
+    "outlook.com",
+    "proton.me",
+    "protonmail.com",
+    "qq.com",
+    "web.de",
+    "yahoo.co.uk",
+    "yahoo.com",
+    "yandex.ru",
+    "zoho.com",
+  }
+)
+# Second-level suffixes under which the organisation is the third label (acme.co.uk).
+_SECOND_LEVEL = frozenset({"co.uk", "org.uk", "ac.uk", "com.au", "net.au", "co.nz", "co.jp", "com.br", "co.in", "co.za", "com.mx"})
+
+SIGNATURE_LINES = 8
+# "Fwd:", "FW:", "Fw:" (possibly after "Re:"): the sender passed someone else's mail along.
+_FORWARDED_SUBJECT = re.compile(r"^\s*(?:re:\s*)*(?:fwd?|fw)\s*:", re.IGNORECASE)
+MAX_DATES = 5
+_SIGN_OFF = re.compile(
+  r"^(?:--\s*|(?:best|kind|warm|many)?\s*(?:regards|wishes)\b.*|thanks?\b.*|thank you\b.*|cheers\b.*|sincerely\b.*|best\W*)$",
+  re.IGNORECASE,
+)
+_TITLE_WORDS = re.compile(
+  r"\b(?:CEO|CTO|CFO|COO|CMO|CIO|VP|SVP|EVP|Founder|Co-Founder|President|Director|Manager|Head of|Lead|Officer|"
+  r"Engineer|Partner|Consultant|Specialist|Coordinator|Analyst|Owner|Executive|Representative|Associate|Buyer|"
+  r"Administrator|Architect|Designer|Developer|Recruiter|Accountant|Controller|Principal)\b",
+  re.IGNORECASE,
+)
+_COMPANY_SUFFIX = re.compile(
+  r"\b(?:Inc|LLC|L\.L\.C|Ltd|Limited|GmbH|AG|Corp|Corporation|Co|PLC|S\.A|SAS|SARL|BV|B\.V|NV|Pty|KG|Oy|AB|SpA|S\.r\.l)\b\.?",
+  re.IGNORECASE,
+)
+_NAME_LINE = re.compile(r"^[A-Z][A-Za-z'.-]+(?: [A-Z][A-Za-z'.-]+){1,3}$")
+_PHONE = re.compile(r"(?<![\w+])(\+?\(?\d[\d\s().-]{6,}\d)(?!\w)")
+_URL_OR_MAIL = re.compile(r"@|https?://|www\.", re.IGNORECASE)
+_MONTH = r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+_DATE = re.compile(
+  rf"\b(?:\d{{4}}-\d{{2}}-\d{{2}}|{_MONTH}\.? \d{{1,2}}(?:st|nd|rd|th)?(?:,? \d{{4}})?|\d{{1,2}}(?:st|nd|rd|th)? {_MONTH}\.?(?: \d{{4}})?)\b"
+)
+_AMOUNT = re.compile(
+  r"(?:[$€£]\s?|\b(?:USD|EUR|GBP|CHF|CAD|AUD)\s?)\d{1,3}(?:[,.\s]\d{3})*(?:\.\d{1,2})?(?:\s?(?:k|m|bn|million|billion|thousand)\b)?"
+  r"|\b\d{1,3}(?:[,.\s]\d{3})*(?:\.\d{1,2})?\s?(?:USD|EUR|GBP|CHF|CAD|AUD|dollars|euros)\b",
+  re.IGNORECASE,
+)
+
+
+@dataclass
+class LocalExtraction:
+  people: List[Dict[str, Any]] = field(default_factory=list)
+  company: Optional[Dict[str, Any]] = None
+  amount: Optional[str] = None
+  dates: List[str] = field(default_factory=list)
+
+  def known(self) -> Dict[str, Any]:
+    """The fields that were filled, shaped like the extraction payload."""
+    fields = {"people": self.people, "company": self.company, "amount": self.amount, "dates": self.dates}
+    return {key: value for key, value in fields.items() if value}
+
+
+class LocalExtractor:
+  """
+  Deterministic extraction of the fields that rarely need a model: the sender (From header plus
+  signature block: title and phone), their company (non-free-mail domain, signature company line)
+  and regex-matched amounts and dates. Forwarded mail and mail from a colleague get no person or
+  company, since the sender is not the lead there. The extraction prompts list these as known so
+  the model only works on the rest; ``merge`` folds them back into the model's answer.
+  """
+
+  def __init__(self, *, enabled: bool = True):
+    self.enabled = enabled
+    self._lock = threading.Lock()
+    # "merged" counts extractions that had local fields; the rest count fields the model left to them.
+    self._stats: Dict[str, int] = {"merged": 0, "people": 0, "company": 0, "amount": 0, "dates": 0}
+
+  def extract(self, email: GmailMessage) -> LocalExtraction:
+    result = LocalExtraction()
+    if not self.enabled:
+      return result
+    display_name, address = parseaddr(email.sender or "")
+    address = address.lower() if "@" in address else ""
+    latest, _ = split_quoted_history(email.body_text or "")
+    text = f"{email.subject or ''}\n{latest}"
+    amount = _AMOUNT.search(text)
+    result.amount = amount.group(0).strip() if amount else None
+    result.dates = list(dict.fromkeys(match.group(0) for match in _DATE.finditer(text)))[:MAX_DATES]
+
+    domain = organisation_domain(address.rsplit("@", 1)[1]) if address else None
+    if relayed(email, domain):
+      return result
+    signature = signature_block(latest)
+    sig_name = next((line for line in signature if _is_name(line)), None)
+    name = display_name.strip().strip('"') or sig_name
+    if address or name:
+      person: Dict[str, Any] = {"name": name or address, "email": address or None}
+      title = next((_title(line) for line in signature if _TITLE_WORDS.search(line)), None)
+      phone = next((_phone(line) for line in signature if _phone(line)), None)
+      person.update({key: value for key, value in (("job_title", title), ("phone", phone)) if value})
+      result.people.append(person)
+
+    company_name = next((_company(line) for line in signature if _company(line)), None)
+    if domain and domain not in FREE_MAIL_DOMAINS:
+      stem = domain.split(".", 1)[0]
+      named = next((line for line in signature if line.replace(" ", "").lower() == stem), None)
+      result.company = {"name": company_name or named or stem.capitalize(), "domain": domain}
+    elif company_name:
+      result.company = {"name": company_name}
+    return result
+
+  def merge(self, raw: str, local: LocalExtraction) -> str:
+    """
+    Fold local fields into the model's extraction JSON: values the model returned win, gaps are
+    filled locally and the sender is listed first among the people. Unparseable output is
+    returned untouched for the validator to deal with.
+    """
+    known = local.known()
+    if not known:
+      return raw
+    try:
+      payload = lenient_loads(raw)
+    except ValueError:
+      return raw
+    if not isinstance(payload, dict):
+      return raw
+    merged = dict(payload)
+    filled = []
+    people = [dict(person) for person in known.get("people", [])]
+    for person in payload.get("people") or []:
+      if not isinstance(person, dict):
+        people.append(person)
+        continue
+      match = next((existing for existing in people if _same_person(existing, person)), None)
+      if match is None:
+        people.append(person)
+      else:
+        match.update({key: value for key, value in person.items() if value})
+    if people and not payload.get("people"):
+      filled.append("people")
+    merged["people"] = people
+    company = payload.get("company")
+    if not (isinstance(company, dict) and company.get("name")) and not (isinstance(company, str) and company.strip()):
+      merged["company"] = known.get("company")
+      filled.extend(["company"] if "company" in known else [])
+    elif isinstance(company, dict) and not company.get("domain") and known.get("company", {}).get("domain"):
+      merged["company"] = {**company, "domain": known["company"]["domain"]}
+    for key in ("amount", "dates"):
+      if not payload.get(key) and key in known:
+        merged[key] = known[key]
+        filled.append(key)
+    with self._lock:
+      self._stats["merged"] += 1
+      for key in filled:
+        self._stats[key] += 1
+    return json.dumps(merged)
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      return {"enabled": self.enabled, **self._stats}
+
+
+def signature_block(body: str) -> List[str]:
+  """Non-empty lines after the last sign-off ("Best regards", "Thanks", "--"...) of a message."""
+  lines = [line.strip() for line in (body or "").strip().splitlines()]
+  tail_start = max(0, len(lines) - SIGNATURE_LINES - 4)
+  for idx in range(len(lines) - 1, tail_start - 1, -1):
+    if _SIGN_OFF.match(lines[idx]):
+      return [line for line in lines[idx + 1 :] if line][:SIGNATURE_LINES]
+  return []
+
+
+def relayed(email: GmailMessage, sender_domain: Optional[str]) -> bool:
+  """
+  True for forwarded mail and for mail whose sender shares a (non-free-mail) domain with a
+  recipient, i.e. the user's own organisation: the lead is then someone the sender mentions.
+  """
+  if _FORWARDED_SUBJECT.match(email.subject or ""):
+    return True
+  if not sender_domain or sender_domain in FREE_MAIL_DOMAINS:
+    return False
+  for recipient in email.recipients or []:
+    _, address = parseaddr(recipient)
+    if "@" in address and organisation_domain(address.rsplit("@", 1)[1]) == sender_domain:
+      return True
+  return False
+
+
+def organisation_domain(host: str) -> str:
+  """acme.com for mail.eu.acme.com; acme.co.uk for sales.acme.co.uk."""
+  labels = host.lower().strip(".").split(".")
+  keep = 3 if ".".join(labels[-2:]) in _SECOND_LEVEL else 2
+  return ".".join(labels[-keep:])
+
+
+def _title(line: str) -> str:
+  # "Head of Sales | Acme Inc" or "VP Engineering, Acme": the title is the part naming a role.
+  parts = [part.strip() for part in re.split(r"\s[|·•]\s|,\s| at ", line) if part.strip()]
+  return next((part for part in parts if _TITLE_WORDS.search(part)), line)
+
+
+def _company(line: str) -> Optional[str]:
+  if _URL_OR_MAIL.search(line) or _phone(line):
+    return None
+  parts = [part.strip() for part in re.split(r"\s[|·•]\s|,\s| at ", line) if part.strip()]
+  for idx, part in enumerate(parts):
+    if _COMPANY_SUFFIX.search(part) and not _TITLE_WORDS.search(part):
+      # "Acme, Inc." splits the suffix off its name.
+      if idx and _COMPANY_SUFFIX.fullmatch(part):
+        return f"{parts[idx - 1]}, {part}"
+      return part
+  return None
+
+
+def _is_name(line: str) -> bool:
+  return bool(_NAME_LINE.match(line)) and not _TITLE_WORDS.search(line) and not _COMPANY_SUFFIX.search(line)
+
+
+def _phone(line: str) -> Optional[str]:
+  match = _PHONE.search(line)
+  if not match or sum(char.isdigit() for char in match.group(1)) < 9:
+    return None
+  return match.group(1).strip()
+
+
+def _same_person(left: Dict[str, Any], right: Dict[str, Any]) -> bool:
+  if left.get("email") and right.get("email"):
+    return str(left["email"]).lower() == str(right["email"]).lower()
+  return bool(left.get("name")) and str(left.get("name", "")).lower() == str(right.get("name", "")).lower()
+
+
+local_extractor = LocalExtractor(enabled=settings.llm_local_extraction_enabled)
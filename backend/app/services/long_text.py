@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from .gmail_ingest import GmailMessage
+from .json_repair import lenient_loads
+from .llm import async_gemini_client
+from .llm_schemas import ChunkNotes
+from .prompt_budget import CHARS_PER_TOKEN, estimate_tokens, split_quoted_history, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Chunks grow beyond the configured size rather than exceed this many map calls per email.
+MAX_CHUNKS = 32
+# The latest message is kept verbatim (up to this size) ahead of the condensed notes.
+LATEST_MESSAGE_TOKENS = 1500
+# A chunk whose notes did not arrive in time is represented by its opening lines instead.
+FALLBACK_EXCERPT_TOKENS = 150
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def split_chunks(text: str, chunk_tokens: int) -> List[str]:
+  """
+  Split ``text`` into chunks of about ``chunk_tokens``, breaking between paragraphs where possible
+  and hard-splitting paragraphs that are larger than a chunk on their own.
+  """
+  if estimate_tokens(text) > chunk_tokens * MAX_CHUNKS:
+    chunk_tokens = -(-estimate_tokens(text) // MAX_CHUNKS)
+  limit = chunk_tokens * CHARS_PER_TOKEN
+  pieces: List[str] = []
+  for paragraph in _PARAGRAPH_BREAK.split(text):
+    paragraph = paragraph.strip()
+    pieces.extend(paragraph[start : start + limit] for start in range(0, len(paragraph), limit))
+
+  chunks: List[str] = []
+  current = ""
+  for piece in pieces:
+    if current and len(current) + 2 + len(piece) > limit:
+      chunks.append(current)
+      current = ""
+    current = f"{current}\n\n{piece}" if current else piece
+  if current:
+    chunks.append(current)
+  return chunks
+
+
+class LongTextReducer:
+  """
+  Map-reduce for emails too long for one prompt. The consolidated text (body, quoted history and
+  attachments) is split into chunks; each chunk is condensed to facts by its own LLM call, at
+  most ``concurrency`` at a time; the extraction prompts then see the latest message plus those
+  facts instead of a truncated body. Chunk answers go through the LLM response cache, so a retry
+  of the same email only pays for the chunks that did not finish. Chunks still outstanding at
+  ``deadline_seconds`` are abandoned and stood in for by an excerpt, which bounds the time spent.
+  """
+
+  def __init__(
+    self,
+    *,
+    enabled: bool = True,
+    min_tokens: int = 12000,
+    chunk_tokens: int = 6000,
+    concurrency: int = 4,
+    deadline_seconds: float = 45.0,
+  ):
+    self.enabled = enabled
+    self.min_tokens = min_tokens
+    self.chunk_tokens = chunk_tokens
+    self.concurrency = max(1, concurrency)
+    self.deadline_seconds = deadline_seconds
+    self._lock = threading.Lock()
+    self._stats = {"emails": 0, "chunks": 0, "condensed": 0, "fallback": 0, "tokens_in": 0, "tokens_out": 0}
+    self._elapsed_ms = 0.0
+
+  def needs_reduction(self, email: GmailMessage) -> bool:
+    return self.enabled and estimate_tokens(email.consolidated_text) > self.min_tokens
+
+  async def areduce(self, email: GmailMessage, *, user_id: str | None = None) -> GmailMessage:
+    """``email`` itself when it is short enough, otherwise a copy carrying the condensed text."""
+    if not self.needs_reduction(email):
+      return email
+    start = time.perf_counter()
+    chunks = split_chunks(email.consolidated_text, self.chunk_tokens)
+    notes: List[Optional[str]] = [None] * len(chunks)
+    semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def condense(idx: int, chunk: str) -> None:
+      async with semaphore:
+        try:
+          raw: Any = await async_gemini_client.summarize_chunk(email, chunk, idx + 1, len(chunks), user_id=user_id)
+        except Exception as exc:
+          raw = exc
+      notes[idx] = self._facts(email, raw)
+
+    tasks = [asyncio.ensure_future(condense(idx, chunk)) for idx, chunk in enumerate(chunks)]
+    _, pending = await asyncio.wait(tasks, timeout=self.deadline_seconds)
+    for task in pending:
+      task.cancel()
+    if pending:
+      await asyncio.gather(*pending, return_exceptions=True)
+    return self._reduced(email, chunks, notes, start)
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      emails = self._stats["emails"]
+      return {
+        "enabled": self.enabled,
+        "min_tokens": self.min_tokens,
+        "chunk_tokens": self.chunk_tokens,
+        "concurrency": self.concurrency,
+        "deadline_seconds": self.deadline_seconds,
+        **self._stats,
+        "mean_ms": round(self._elapsed_ms / emails, 2) if emails else None,
+      }
+
+  @staticmethod
+  def _facts(email: GmailMessage, raw: Any) -> Optional[str]:
+    if isinstance(raw, BaseException):
+      logger.warning("Chunk summary failed", extra={"message_id": email.message_id, "error": str(raw)})
+      return None
+    try:
+      facts = [fact.strip() for fact in ChunkNotes.model_validate(lenient_loads(raw)).facts if fact.strip()]
+    except ValueError:
+      logger.warning("Chunk summary unparseable", extra={"message_id": email.message_id})
+      return None
+    return "\n".join(f"- {fact}" for fact in facts) or "- (nothing relevant)"
+
+  def _reduced(self, email: GmailMessage, chunks: List[str], notes: List[Optional[str]], start: float) -> GmailMessage:
+    latest, _ = split_quoted_history(email.body_text or "")
+    sections = [truncate_to_tokens(latest, LATEST_MESSAGE_TOKENS), "Condensed notes from the full email, quoted thread and attachments:"]
+    for idx, (chunk, note) in enumerate(zip(chunks, notes), start=1):
+      body = note if note is not None else f"(excerpt)\n{truncate_to_tokens(chunk, FALLBACK_EXCERPT_TOKENS)}"
+      sections.append(f"[Part {idx}/{len(chunks)}]\n{body}")
+    body_text = "\n\n".join(section for section in sections if section)
+
+    fallback = sum(1 for note in notes if note is None)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with self._lock:
+      self._stats["emails"] += 1
+      self._stats["chunks"] += len(chunks)
+      self._stats["condensed"] += len(chunks) - fallback
+      self._stats["fallback"] += fallback
+      self._stats["tokens_in"] += estimate_tokens(email.consolidated_text)
+      self._stats["tokens_out"] += estimate_tokens(body_text)
+      self._elapsed_ms += elapsed_ms
+    logger.info(
+      "Condensed long email",
+      extra={"message_id": email.message_id, "chunks": len(chunks), "fallback": fallback, "elapsed_ms": round(elapsed_ms, 2)},
+    )
+    # Attachment text is folded into the notes; keep the attachments' names for the prompts' sake.
+    attachments = [replace(attachment, text="") for attachment in email.attachments]
+    return replace(email, body_text=body_text, attachments=attachments)
+
+
+long_text_reducer = LongTextReducer(
+  enabled=settings.llm_map_reduce_enabled,
+  min_tokens=settings.llm_map_reduce_min_tokens,
+  chunk_tokens=settings.llm_map_reduce_chunk_tokens,
+  concurrency=settings.llm_map_reduce_concurrency,
+  deadline_seconds=settings.llm_map_reduce_deadline_seconds,
+)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..config import settings
+from .llm_resilience import GeminiUnavailableError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+# Judges a cheap-model result: a reason to escalate, or None when the answer stands.
+Judge = Callable[[Any], Optional[str]]
+
+
+class ModelCascade:
+  """
+  Runs a call on the cheap model first and repeats it on the purpose's own model (model=None)
+  when ``judge`` finds the answer wanting, or when the cheap model is unavailable. Tracks
+  escalation rates per purpose plus the latency of both tiers, from which the saving against
+  sending everything to the full model is estimated.
+  """
+
+  def __init__(self, *, enabled: bool = False, model: str = ""):
+    self.enabled = enabled
+    self.model = model
+    self._lock = threading.Lock()
+    self._stats: Dict[str, Dict[str, Any]] = {}
+
+  def run(self, purpose: str, call: Callable[[Optional[str]], T], judge: Judge) -> T:
+    if not self.enabled:
+      return call(None)
+    start = time.perf_counter()
+    try:
+      result = call(self.model)
+      reason = judge(result)
+    except GeminiUnavailableError:
+      reason = "cheap_unavailable"
+    cheap_ms = _elapsed_ms(start)
+    if reason is None:
+      self.record(purpose, None, cheap_ms)
+      return result
+    start = time.perf_counter()
+    try:
+      return call(None)
+    finally:
+      self.record(purpose, reason, cheap_ms, _elapsed_ms(start))
+
+  async def arun(self, purpose: str, call: Callable[[Optional[str]], Awaitable[T]], judge: Judge) -> T:
+    if not self.enabled:
+      return await call(None)
+    start = time.perf_counter()
+    try:
+      result = await call(self.model)
+      reason = judge(result)
+    except GeminiUnavailableError:
+      reason = "cheap_unavailable"
+    cheap_ms = _elapsed_ms(start)
+    if reason is None:
+      self.record(purpose, None, cheap_ms)
+      return result
+    start = time.perf_counter()
+    try:
+      return await call(None)
+    finally:
+      self.record(purpose, reason, cheap_ms, _elapsed_ms(start))
+
+  def record(
+    self,
+    purpose: str,
+    reason: Optional[str],
+    cheap_ms: float,
+    full_ms: Optional[float] = None,
+    *,
+    count: int = 1,
+  ) -> None:
+    """
+    Account for ``count`` answers (several for a packed call) that took ``cheap_ms`` on the cheap
+    model and, when escalated for ``reason``, ``full_ms`` more on the full model.
+    """
+    with self._lock:
+      stats = self._stats.setdefault(
+        purpose, {"calls": 0, "escalated": 0, "reasons": {}, "cheap_ms": 0.0, "full_ms": 0.0, "full_answers": 0}
+      )
+      stats["calls"] += count
+      stats["cheap_ms"] += cheap_ms
+      if reason is not None:
+        stats["escalated"] += count
+        stats["reasons"][reason] = stats["reasons"].get(reason, 0) + count
+      if full_ms is not None:
+        stats["full_ms"] += full_ms
+        stats["full_answers"] += count
+    if reason is not None:
+      logger.info("Escalated to full model", extra={"purpose": purpose, "reason": reason, "count": count})
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      snapshot = {purpose: {**stats, "reasons": dict(stats["reasons"])} for purpose, stats in self._stats.items()}
+    purposes = {}
+    for purpose, stats in snapshot.items():
+      calls, full_answers = stats["calls"], stats["full_answers"]
+      spent_ms = stats["cheap_ms"] + stats["full_ms"]
+      # Escalated mail is the harder mail, so this baseline is a rough (likely high) estimate.
+      baseline_ms = calls * stats["full_ms"] / full_answers if full_answers else None
+      purposes[purpose] = {
+        "calls": calls,
+        "escalated": stats["escalated"],
+        "escalation_rate": round(stats["escalated"] / calls, 4) if calls else 0.0,
+        "reasons": stats["reasons"],
+        "mean_cheap_ms": round(stats["cheap_ms"] / calls, 2) if calls else None,
+        "mean_full_ms": round(stats["full_ms"] / full_answers, 2) if full_answers else None,
+        "estimated_saved_ms": round(baseline_ms - spent_ms, 2) if baseline_ms is not None else None,
+      }
+    return {"enabled": self.enabled, "model": self.model, "purposes": purposes}
+
+
+def _elapsed_ms(start: float) -> float:
+  return (time.perf_counter() - start) * 1000
+
+
+model_cascade = ModelCascade(enabled=settings.llm_cascade_enabled, model=settings.llm_cascade_model)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import parseaddr
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from .gmail_ingest import GmailMessage
+from .prompt_budget import split_quoted_history
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+# Very short mail ("thanks!", "see attached") collides too easily to be worth fingerprinting.
+MIN_TOKENS = 12
+MAX_ENTRIES_PER_SCOPE = 500
+
+URL = re.compile(r"https?://\S+")
+EMAIL_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+WORD = re.compile(r"[a-z0]+")
+
+
+def normalize_text(subject: str | None, body: str | None) -> List[str]:
+  """Tokens of subject + latest body with volatile parts (links, addresses, numbers) collapsed."""
+  latest, _ = split_quoted_history(body or "")
+  text = f"{subject or ''}\n{latest}".lower()
+  text = URL.sub(" url ", text)
+  text = EMAIL_ADDRESS.sub(" addr ", text)
+  text = NUMBER.sub("0", text)
+  return WORD.findall(text)
+
+
+def simhash(tokens: List[str], bits: int = FINGERPRINT_BITS) -> int:
+  if not tokens:
+    return 0
+  shingles = [" ".join(tokens[i : i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))]
+  weights = [0] * bits
+  for shingle in shingles:
+    digest = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=bits // 8).digest(), "big")
+    for bit in range(bits):
+      weights[bit] += 1 if digest >> bit & 1 else -1
+  return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming(a: int, b: int) -> int:
+  return bin(a ^ b).count("1")
+
+
+@dataclass
+class DuplicateEntry:
+  fingerprint: int
+  message_id: str
+  routing: Dict[str, Any]
+
+
+class NearDuplicateIndex:
+  """
+  SimHash index scoped per (user, sender domain). Lookups use banding: with ``max_distance + 1``
+  bands, any fingerprint within ``max_distance`` bits agrees exactly on at least one band.
+  """
+
+  def __init__(self, *, max_distance: int = 3, enabled: bool = True, max_entries: int = MAX_ENTRIES_PER_SCOPE):
+    self.max_distance = max_distance
+    self.enabled = enabled
+    self.max_entries = max_entries
+    bands = max_distance + 1
+    width = FINGERPRINT_BITS // bands
+    self._bands: List[Tuple[int, int]] = [
+      (idx * width, FINGERPRINT_BITS - idx * width if idx == bands - 1 else width) for idx in range(bands)
+    ]
+    self._lock = threading.Lock()
+    self._entries: Dict[Tuple[str, str], "OrderedDict[str, DuplicateEntry]"] = {}
+    self._buckets: Dict[Tuple[str, str, int, int], List[str]] = {}
+    self._stats = {"lookups": 0, "hits": 0, "recorded": 0}
+
+  def fingerprint(self, email: GmailMessage) -> Optional[int]:
+    tokens = normalize_text(email.subject, email.body_text)
+    if len(tokens) < MIN_TOKENS:
+      return None
+    return simhash(tokens)
+
+  def lookup(self, user_id: str | None, email: GmailMessage) -> Optional[DuplicateEntry]:
+    scope = self._scope(user_id, email)
+    if not self.enabled or scope is None:
+      return None
+    fingerprint = self.fingerprint(email)
+    if fingerprint is None:
+      return None
+    with self._lock:
+      self._stats["lookups"] += 1
+      entries = self._entries.get(scope)
+      best: Optional[DuplicateEntry] = None
+      if entries:
+        candidates = {
+          message_id
+          for band, (start, width) in enumerate(self._bands)
+          for message_id in self._buckets.get((*scope, band, self._band_value(fingerprint, start, width)), [])
+        }
+        for message_id in candidates:
+          entry = entries.get(message_id)
+          if entry is None or message_id == email.message_id:
+            continue
+          distance = hamming(entry.fingerprint, fingerprint)
+          if distance <= self.max_distance and (best is None or distance < hamming(best.fingerprint, fingerprint)):
+            best = entry
+      if best:
+        self._stats["hits"] += 1
+      return best
+
+  def record(self, user_id: str | None, email: GmailMessage, routing: Dict[str, Any]) -> None:
+    scope = self._scope(user_id, email)
+    if not self.enabled or scope is None:
+      return
+    fingerprint = self.fingerprint(email)
+    if fingerprint is None:
+      return
+    with self._lock:
+      entries = self._entries.setdefault(scope, OrderedDict())
+      self._forget(scope, entries.pop(email.message_id, None))
+      entry = DuplicateEntry(fingerprint=fingerprint, message_id=email.message_id, routing=dict(routing))
+      entries[email.message_id] = entry
+      for band, (start, width) in enumerate(self._bands):
+        self._buckets.setdefault((*scope, band, self._band_value(fingerprint, start, width)), []).append(email.message_id)
+      while len(entries) > self.max_entries:
+        _, evicted = entries.popitem(last=False)
+        self._forget(scope, evicted)
+      self._stats["recorded"] += 1
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      lookups = self._stats["lookups"]
+      return {
+        **self._stats,
+        "enabled": self.enabled,
+        "max_distance": self.max_distance,
+        "scopes": len(self._entries),
+        "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+      }
+
+  def _forget(self, scope: Tuple[str, str], entry: Optional[DuplicateEntry]) -> None:
+    if entry is None:
+      return
+    for band, (start, width) in enumerate(self._bands):
+      key = (*scope, band, self._band_value(entry.fingerprint, start, width))
+      bucket = self._buckets.get(key)
+      if bucket and entry.message_id in bucket:
+        bucket.remove(entry.message_id)
+        if not bucket:
+          del self._buckets[key]
+
+  @staticmethod
+  def _band_value(fingerprint: int, start: int, width: int) -> int:
+    return (fingerprint >> start) & ((1 << width) - 1)
+
+  @staticmethod
+  def _scope(user_id: str | None, email: GmailMessage) -> Optional[Tuple[str, str]]:
+    _, address = parseaddr(email.sender or "")
+    domain = address.rsplit("@", 1)[1].lower() if "@" in address else ""
+    if not user_id or not domain:
+      return None
+    return user_id, domain
+
+
+near_duplicate_index = NearDuplicateIndex(
+  max_distance=settings.near_duplicate_max_distance,
+  enabled=settings.near_duplicate_enabled,
+)
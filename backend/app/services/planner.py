@@ -10,6 +10,8 @@ from .ai_router import RoutingDecision
 class ContactPlan(BaseModel):
   full_name: str
   email: str | None = None
+  job_title: str | None = None
+  phone: str | None = None
 
 
 class CompanyPlan(BaseModel):
@@ -66,7 +68,7 @@ def build_crm_plan(email: GmailMessage, extraction: ValidatedExtraction) -> CrmU
   contact_plan = None
   if extraction.people:
     primary = extraction.people[0]
-    contact_plan = ContactPlan(full_name=primary.name, email=primary.email)
+    contact_plan = ContactPlan(full_name=primary.name, email=primary.email, job_title=primary.job_title, phone=primary.phone)
 
   company_plan = None
   if extraction.company:
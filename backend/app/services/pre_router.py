@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from email.utils import parseaddr
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Tuple
+
+from ..config import settings
+from .gmail_ingest import GmailMessage
+
+logger = logging.getLogger(__name__)
+
+# Rules are evaluated in order and the first match wins. Within a rule any matcher may fire.
+# header_patterns maps a header name to a regex; an empty regex only requires the header to exist.
+DEFAULT_RULES: List[Dict[str, Any]] = [
+  {
+    "name": "auto_reply",
+    "primary_object": "none",
+    "reasoning": "Automatic reply (out-of-office or auto-responder)",
+    "header_patterns": {"Auto-Submitted": r"^(?!no\b)", "X-Autoreply": "", "X-Autorespond": ""},
+    "subject_patterns": [r"^\s*(auto(matic)?[\s-]?reply|out of (the )?office|autoreply)\b"],
+  },
+  {
+    "name": "delivery_notification",
+    "primary_object": "none",
+    "reasoning": "Bounce or delivery status notification",
+    "sender_patterns": [r"^(mailer-daemon|postmaster)@"],
+    "subject_patterns": [r"^\s*(undeliverable|delivery status notification|mail delivery failed)\b"],
+  },
+  {
+    "name": "calendar_invite",
+    "primary_object": "none",
+    "reasoning": "Calendar invitation or response",
+    "subject_patterns": [
+      r"^\s*(updated )?invitation:",
+      r"^\s*(accepted|declined|tentatively accepted|canceled event|cancelled event):",
+    ],
+    "attachment_mime_types": ["text/calendar", "application/ics"],
+  },
+  {
+    "name": "newsletter",
+    "primary_object": "campaigns",
+    "target_crm": ["salesforce"],
+    "intent": "other",
+    "urgency": "low",
+    "reasoning": "Bulk or list mail (newsletter, marketing blast)",
+    "header_patterns": {"List-Unsubscribe": "", "List-Id": "", "Precedence": r"^(bulk|list)$"},
+  },
+  {
+    "name": "no_reply_sender",
+    "primary_object": "none",
+    "reasoning": "Automated notification from a no-reply sender",
+    "sender_patterns": [r"^(no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?|alerts?)@"],
+  },
+]
+
+
+@dataclass(frozen=True)
+class PreRoutingRule:
+  name: str
+  primary_object: str
+  reasoning: str
+  target_crm: Tuple[str, ...] = ()
+  intent: str = "other"
+  urgency: str = "low"
+  confidence: float = 0.99
+  create_note: bool = False
+  header_patterns: Tuple[Tuple[str, Optional[Pattern[str]]], ...] = ()
+  sender_domains: FrozenSet[str] = frozenset()
+  sender_patterns: Tuple[Pattern[str], ...] = ()
+  subject_patterns: Tuple[Pattern[str], ...] = ()
+  attachment_mime_types: FrozenSet[str] = frozenset()
+
+  @classmethod
+  def compile(cls, spec: Dict[str, Any]) -> "PreRoutingRule":
+    flags = re.IGNORECASE
+    return cls(
+      name=spec["name"],
+      primary_object=spec["primary_object"],
+      reasoning=spec.get("reasoning") or f"Matched pre-routing rule {spec['name']}",
+      target_crm=tuple(spec.get("target_crm") or ()),
+      intent=spec.get("intent", "other"),
+      urgency=spec.get("urgency", "low"),
+      confidence=float(spec.get("confidence", 0.99)),
+      create_note=bool(spec.get("create_note", spec["primary_object"] != "none")),
+      header_patterns=tuple(
+        (header.lower(), re.compile(pattern, flags) if pattern else None)
+        for header, pattern in (spec.get("header_patterns") or {}).items()
+      ),
+      sender_domains=frozenset(domain.lower().lstrip("@") for domain in spec.get("sender_domains") or []),
+      sender_patterns=tuple(re.compile(pattern, flags) for pattern in spec.get("sender_patterns") or []),
+      subject_patterns=tuple(re.compile(pattern, flags) for pattern in spec.get("subject_patterns") or []),
+      attachment_mime_types=frozenset(mime.lower() for mime in spec.get("attachment_mime_types") or []),
+    )
+
+  def matches(self, headers: Dict[str, str], sender: str, domain: str, subject: str, mime_types: FrozenSet[str]) -> bool:
+    for header, pattern in self.header_patterns:
+      value = headers.get(header)
+      if value is not None and (pattern is None or pattern.search(value.strip())):
+        return True
+    if domain and self.sender_domains and _domain_matches(domain, self.sender_domains):
+      return True
+    if sender and any(pattern.search(sender) for pattern in self.sender_patterns):
+      return True
+    if subject and any(pattern.search(subject) for pattern in self.subject_patterns):
+      return True
+    return bool(self.attachment_mime_types & mime_types)
+
+
+def _domain_matches(domain: str, domains: FrozenSet[str]) -> bool:
+  parts = domain.split(".")
+  return any(".".join(parts[idx:]) in domains for idx in range(len(parts)))
+
+
+class PreRouter:
+  """Deterministic routing for mail that never needs an LLM (auto-replies, bulk mail, invites)."""
+
+  def __init__(self, rules: List[Dict[str, Any]], *, enabled: bool = True):
+    self.enabled = enabled
+    self.rules = [PreRoutingRule.compile(spec) for spec in rules]
+    self._lock = threading.Lock()
+    self._evaluated = 0
+    self._hits: Dict[str, int] = {rule.name: 0 for rule in self.rules}
+
+  def match(self, email: GmailMessage) -> Optional[PreRoutingRule]:
+    if not self.enabled:
+      return None
+    headers = {name.lower(): value for name, value in (email.headers or {}).items()}
+    _, address = parseaddr(email.sender or "")
+    address = address.lower()
+    domain = address.rsplit("@", 1)[1] if "@" in address else ""
+    subject = email.subject or ""
+    mime_types = frozenset((attachment.mime_type or "").lower() for attachment in email.attachments)
+
+    matched = next((rule for rule in self.rules if rule.matches(headers, address, domain, subject, mime_types)), None)
+    with self._lock:
+      self._evaluated += 1
+      if matched:
+        self._hits[matched.name] += 1
+    if matched:
+      logger.info("Pre-router matched", extra={"message_id": email.message_id, "rule": matched.name})
+    return matched
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      hits = sum(self._hits.values())
+      return {
+        "enabled": self.enabled,
+        "evaluated": self._evaluated,
+        "hits": hits,
+        "hit_rate": round(hits / self._evaluated, 4) if self._evaluated else 0.0,
+        "rules": {
+          name: {"hits": count, "hit_rate": round(count / self._evaluated, 4) if self._evaluated else 0.0}
+          for name, count in self._hits.items()
+        },
+      }
+
+
+def load_rules(path: str) -> List[Dict[str, Any]]:
+  if not path:
+    return DEFAULT_RULES
+  with Path(path).open("r", encoding="utf-8") as handle:
+    return json.load(handle)
+
+
+pre_router = PreRouter(load_rules(settings.pre_router_rules_path), enabled=settings.pre_router_enabled)
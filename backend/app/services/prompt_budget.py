@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from ..config import settings
+from .gmail_ingest import GmailMessage
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+MIN_SECTION_TOKENS = 16
+SEPARATOR_TOKENS = 1
+
+# Lines that start the quoted part of a reply or forward; everything from the first match on is history.
+QUOTE_MARKER = re.compile(
+  r"^(?:On .{1,200} wrote:\s*$|-{2,}\s*(?:Original Message|Forwarded message)\s*-{2,}|From:\s.+|>)",
+  re.IGNORECASE | re.MULTILINE,
+)
+
+
+def estimate_tokens(text: str | None) -> int:
+  """Cheap token estimate (~4 characters per token), good enough for budgeting."""
+  if not text:
+    return 0
+  return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split_quoted_history(body: str) -> Tuple[str, str]:
+  """Split an email body into the latest message and the quoted thread history below it."""
+  match = QUOTE_MARKER.search(body or "")
+  if not match or match.start() == 0:
+    return (body or "").strip(), ""
+  return body[: match.start()].strip(), body[match.start():].strip()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+  original = estimate_tokens(text)
+  if original <= max_tokens:
+    return text
+  marker = f"\n[... truncated {original - max_tokens} tokens]"
+  keep_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(marker))
+  return text[:keep_chars].rstrip() + marker
+
+
+@dataclass
+class SectionReport:
+  name: str
+  original_tokens: int
+  kept_tokens: int
+
+  @property
+  def truncated(self) -> bool:
+    return self.kept_tokens < self.original_tokens
+
+  @property
+  def dropped(self) -> bool:
+    return self.original_tokens > 0 and self.kept_tokens == 0
+
+
+@dataclass
+class BudgetReport:
+  budget: int
+  reserved_tokens: int
+  sections: List[SectionReport] = field(default_factory=list)
+
+  @property
+  def trimmed(self) -> bool:
+    return any(section.truncated for section in self.sections)
+
+  @property
+  def total_tokens(self) -> int:
+    return self.reserved_tokens + sum(section.kept_tokens for section in self.sections)
+
+  def trimmed_sections(self) -> List[Dict[str, object]]:
+    return [
+      {
+        "section": section.name,
+        "original_tokens": section.original_tokens,
+        "kept_tokens": section.kept_tokens,
+        "dropped": section.dropped,
+      }
+      for section in self.sections
+      if section.truncated
+    ]
+
+
+class PromptBudgeter:
+  """
+  Fits an email's content into a token budget. Headers and instructions are reserved by the
+  caller; the remaining budget goes to the latest body, then attachments, then quoted history.
+  """
+
+  def __init__(self, max_tokens: int):
+    self.max_tokens = max_tokens
+    self._lock = threading.Lock()
+    self._stats: Dict[str, int] = {"prompts": 0, "trimmed_prompts": 0, "tokens_dropped": 0}
+    self._dropped_by_section: Dict[str, int] = {}
+
+  def build_context(self, email: GmailMessage, *, reserved_tokens: int) -> Tuple[str, BudgetReport]:
+    available = max(0, self.max_tokens - reserved_tokens)
+    report = BudgetReport(budget=self.max_tokens, reserved_tokens=reserved_tokens)
+
+    full = email.consolidated_text
+    if estimate_tokens(full) <= available:
+      report.sections.append(SectionReport("content", estimate_tokens(full), estimate_tokens(full)))
+      self._record(report)
+      return full, report
+
+    latest, history = split_quoted_history(email.body_text or "")
+    attachments = [
+      (f"attachment:{attachment.filename}", f"Attachment: {attachment.filename}\n{attachment.text.strip()}")
+      for attachment in email.attachments
+      if attachment.text and attachment.text.strip()
+    ]
+
+    body_text, remaining = self._fit("body", latest, available, report)
+    attachment_texts, remaining = self._fit_shared(attachments, remaining, report)
+    if history:
+      history = f"Earlier in thread:\n{history}"
+    history_text, _ = self._fit("quoted_history", history, remaining, report)
+
+    blocks = [body_text, *attachment_texts, history_text]
+    self._record(report)
+    return "\n\n".join(block for block in blocks if block), report
+
+  def stats(self) -> Dict[str, object]:
+    with self._lock:
+      return {**self._stats, "max_tokens": self.max_tokens, "tokens_dropped_by_section": dict(self._dropped_by_section)}
+
+  def _fit(self, name: str, text: str, available: int, report: BudgetReport) -> Tuple[str, int]:
+    original = estimate_tokens(text)
+    if not original:
+      return "", available
+    # Each kept section also costs a block separator when the context is joined.
+    allowed = min(original, available - SEPARATOR_TOKENS)
+    if allowed < min(original, MIN_SECTION_TOKENS):
+      report.sections.append(SectionReport(name, original, 0))
+      return "", available
+    kept = truncate_to_tokens(text, allowed)
+    kept_tokens = min(estimate_tokens(kept), allowed)
+    report.sections.append(SectionReport(name, original, kept_tokens))
+    return kept, available - kept_tokens - SEPARATOR_TOKENS
+
+  def _fit_shared(self, sections: List[Tuple[str, str]], available: int, report: BudgetReport) -> Tuple[List[str], int]:
+    """Split the budget across sections so small ones are kept whole and large ones share the rest."""
+    texts: Dict[str, str] = {}
+    pending = sorted(sections, key=lambda item: estimate_tokens(item[1]))
+    while pending:
+      share = available // len(pending)
+      name, text = pending.pop(0)
+      kept, unused = self._fit(name, text, share, report)
+      texts[name] = kept
+      available -= share - unused
+    return [texts[name] for name, _ in sections if texts.get(name)], available
+
+  def _record(self, report: BudgetReport) -> None:
+    with self._lock:
+      self._stats["prompts"] += 1
+      if not report.trimmed:
+        return
+      self._stats["trimmed_prompts"] += 1
+      for section in report.sections:
+        dropped = section.original_tokens - section.kept_tokens
+        if dropped <= 0:
+          continue
+        kind = section.name.split(":", 1)[0]
+        self._stats["tokens_dropped"] += dropped
+        self._dropped_by_section[kind] = self._dropped_by_section.get(kind, 0) + dropped
+
+
+prompt_budgeter = PromptBudgeter(settings.llm_prompt_token_budget)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class _Stage:
+  name: str
+  run: StageFn
+  after: Tuple[str, ...]
+
+
+class StageGraph:
+  """
+  Per-message pipeline stages as a small dependency graph. Each stage is an async function of the
+  results so far and starts as soon as the stages it depends on have finished, so independent
+  LLM calls and lookups overlap and a message takes about as long as its slowest chain.
+  The first failing stage cancels the rest and its exception propagates.
+  """
+
+  def __init__(self):
+    self._stages: Dict[str, _Stage] = {}
+    self.timings: Dict[str, float] = {}
+
+  def add(self, name: str, run: StageFn, *, after: Tuple[str, ...] = ()) -> "StageGraph":
+    # Dependencies must be declared first, which also rules out cycles.
+    if name in self._stages:
+      raise ValueError(f"Stage {name!r} is already defined")
+    missing = [dep for dep in after if dep not in self._stages]
+    if missing:
+      raise ValueError(f"Stage {name!r} depends on undefined stages: {', '.join(missing)}")
+    self._stages[name] = _Stage(name, run, tuple(after))
+    return self
+
+  async def run(self) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def execute(stage: _Stage) -> None:
+      if stage.after:
+        await asyncio.gather(*(tasks[dep] for dep in stage.after))
+      start = time.perf_counter()
+      try:
+        results[stage.name] = await stage.run(results)
+      finally:
+        self.timings[stage.name] = round((time.perf_counter() - start) * 1000, 2)
+
+    for stage in self._stages.values():
+      tasks[stage.name] = asyncio.ensure_future(execute(stage))
+    try:
+      await asyncio.gather(*tasks.values())
+    except BaseException:
+      for task in tasks.values():
+        task.cancel()
+      await asyncio.gather(*tasks.values(), return_exceptions=True)
+      raise
+    return results
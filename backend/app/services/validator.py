@@ -2,26 +2,19 @@ from __future__ import annotations
 
 import json
 import logging
+import threading
 from typing import List, Optional
 
 from pydantic import BaseModel, Field, ValidationError
 
 from .gmail_ingest import GmailMessage
-from .llm import gemini_client
+from .json_repair import coerce_extraction, lenient_loads
+from .llm_schemas import Company, Person
+from .llm import async_gemini_client
 
 logger = logging.getLogger(__name__)
 
 
-class Person(BaseModel):
-  name: str
-  email: Optional[str] = None
-
-
-class Company(BaseModel):
-  name: str
-  domain: Optional[str] = None
-
-
 class ValidatedExtraction(BaseModel):
   message_id: str
   people: List[Person] = Field(default_factory=list)
@@ -38,27 +31,60 @@ class ValidatedExtraction(BaseModel):
 class ValidationService:
   def __init__(self, max_retries: int = 3):
     self.max_retries = max_retries
+    self._lock = threading.Lock()
+    self._repairs = {"local": 0, "remote": 0}
 
-  def validate(self, email: GmailMessage, raw_json: str) -> ValidatedExtraction:
+  async def avalidate(self, email: GmailMessage, raw_json: str, *, user_id: str | None = None) -> ValidatedExtraction:
     attempt = 0
     error_message = None
 
     while attempt < self.max_retries:
       attempt += 1
       try:
-        payload = json.loads(raw_json)
-        extraction = ValidatedExtraction.model_validate({**payload, "message_id": email.message_id})
-        logger.info("Validated extraction", extra={"message_id": email.message_id, "attempt": attempt})
-        return extraction
+        return self._parse(email, raw_json, attempt)
       except (json.JSONDecodeError, ValidationError) as exc:
-        error_message = str(exc)
-        logger.warning(
-          "Extraction validation failed",
-          extra={"message_id": email.message_id, "attempt": attempt, "error": error_message},
-        )
-        raw_json = gemini_client.repair(email, error_message)
+        error_message = self._log_failure(email, attempt, exc)
+        self._count_repair("remote")
+        raw_json = await async_gemini_client.repair(email, error_message, user_id=user_id)
 
     raise RuntimeError(f"Unable to validate extraction after {self.max_retries} attempts: {error_message}")
 
+  def repair_stats(self) -> dict:
+    with self._lock:
+      return dict(self._repairs)
+
+  def _parse(self, email: GmailMessage, raw_json: str, attempt: int) -> ValidatedExtraction:
+    """
+    Validate strictly first; on failure try a local lenient parse and coercion before giving up.
+    Only errors that survive the local pass reach the caller (and thus the LLM repair prompt).
+    """
+    try:
+      extraction = self._build(email, json.loads(raw_json))
+    except (json.JSONDecodeError, ValidationError, TypeError):
+      extraction = self._build(email, coerce_extraction(lenient_loads(raw_json)))
+      self._count_repair("local")
+      logger.info("Repaired extraction locally", extra={"message_id": email.message_id, "attempt": attempt})
+    logger.info("Validated extraction", extra={"message_id": email.message_id, "attempt": attempt})
+    return extraction
+
+  @staticmethod
+  def _build(email: GmailMessage, payload) -> ValidatedExtraction:
+    if not isinstance(payload, dict):
+      raise json.JSONDecodeError("Expected a JSON object", str(payload)[:80], 0)
+    return ValidatedExtraction.model_validate({**payload, "message_id": email.message_id})
+
+  def _count_repair(self, kind: str) -> None:
+    with self._lock:
+      self._repairs[kind] += 1
+
+  @staticmethod
+  def _log_failure(email: GmailMessage, attempt: int, exc: Exception) -> str:
+    error_message = str(exc)
+    logger.warning(
+      "Extraction validation failed",
+      extra={"message_id": email.message_id, "attempt": attempt, "error": error_message},
+    )
+    return error_message
+
 
 validator_service = ValidationService()
@@ -226,6 +226,10 @@ class ZohoCRMClient:
 
     if contact_plan.email:
       payload["Email"] = contact_plan.email
+    if contact_plan.job_title:
+      payload["Title"] = contact_plan.job_title
+    if contact_plan.phone:
+      payload["Phone"] = contact_plan.phone
 
     if company_plan and "Account_Name" not in payload and existing and existing.get("Account_Name"):
       payload["Account_Name"] = existing["Account_Name"]
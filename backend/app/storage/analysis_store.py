@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+from ..prompt_versions import ANALYSIS_VERSION
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "analysis_artifacts.sqlite3"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 256
+ARTIFACT_PARTS = ("routing", "extraction", "plan", "sheets_enrichment")
+
+ArtifactKey = Tuple[str, str, str]
+
+
+class AnalysisArtifactStore:
+  """
+  Analysis results per (user, message_id, prompt version): the routing decision, validated
+  extraction, CRM plan and the Sheets enrichment, each stored as JSON once computed. Gmail
+  messages never change, so /analyze, /accept, Salesforce routing and the Sheets sync read
+  these instead of calling the model again; only a miss or an explicit ``force`` recomputes.
+  """
+
+  def __init__(
+    self,
+    path: Path = DEFAULT_PATH,
+    *,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    ttl_seconds: int = DEFAULT_TTL_SECONDS,
+    enabled: bool = True,
+    version: str = ANALYSIS_VERSION,
+  ):
+    self.path = path
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self.enabled = enabled
+    self.version = version
+    self._memory: "OrderedDict[ArtifactKey, Tuple[Dict[str, Any], float]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self._conn: Optional[sqlite3.Connection] = None
+    self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0}
+
+  def get(self, user_id: str, message_id: str) -> Dict[str, Any]:
+    """Stored parts for the message; empty on a miss."""
+    if not self.enabled:
+      return {}
+    key = (user_id, message_id, self.version)
+    now = time.time()
+    with self._lock:
+      parts = self._load(key, now)
+      self._stats["hits" if parts else "misses"] += 1
+      return dict(parts)
+
+  def save(self, user_id: str, message_id: str, **parts: Any) -> None:
+    """Merge the given parts into the message's artifact; parts passed as None are left alone."""
+    if not self.enabled:
+      return
+    unknown = set(parts) - set(ARTIFACT_PARTS)
+    if unknown:
+      raise ValueError(f"Unknown artifact parts: {sorted(unknown)}")
+    key = (user_id, message_id, self.version)
+    now = time.time()
+    expires_at = now + self.ttl_seconds
+    with self._lock:
+      merged = {**self._load(key, now), **{name: value for name, value in parts.items() if value is not None}}
+      self._remember(key, merged, expires_at)
+      self._stats["writes"] += 1
+      try:
+        conn = self._connection()
+        conn.execute(
+          "INSERT OR REPLACE INTO analysis_artifacts (user_id, message_id, version, parts, updated_at, expires_at) "
+          "VALUES (?, ?, ?, ?, ?, ?)",
+          (user_id, message_id, self.version, json.dumps(merged), now, expires_at),
+        )
+        conn.execute("DELETE FROM analysis_artifacts WHERE expires_at <= ?", (now,))
+        conn.commit()
+      except sqlite3.Error:
+        # Best-effort; the in-memory tier still serves this process.
+        pass
+
+  def invalidate(self, user_id: str, message_id: str) -> None:
+    with self._lock:
+      for key in [key for key in self._memory if key[:2] == (user_id, message_id)]:
+        self._memory.pop(key, None)
+      try:
+        conn = self._connection()
+        conn.execute("DELETE FROM analysis_artifacts WHERE user_id = ? AND message_id = ?", (user_id, message_id))
+        conn.commit()
+      except sqlite3.Error:
+        pass
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      lookups = self._stats["hits"] + self._stats["misses"]
+      return {
+        "enabled": self.enabled,
+        "version": self.version,
+        **self._stats,
+        "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+      }
+
+  def _load(self, key: ArtifactKey, now: float) -> Dict[str, Any]:
+    entry = self._memory.get(key)
+    if entry and entry[1] > now:
+      self._memory.move_to_end(key)
+      return entry[0]
+    if entry:
+      self._memory.pop(key, None)
+    try:
+      row = self._connection().execute(
+        "SELECT parts, expires_at FROM analysis_artifacts WHERE user_id = ? AND message_id = ? AND version = ?", key
+      ).fetchone()
+    except sqlite3.Error:
+      row = None
+    if not row or row[1] <= now:
+      return {}
+    parts = json.loads(row[0])
+    self._remember(key, parts, row[1])
+    return parts
+
+  def _remember(self, key: ArtifactKey, parts: Dict[str, Any], expires_at: float) -> None:
+    self._memory[key] = (parts, expires_at)
+    self._memory.move_to_end(key)
+    while len(self._memory) > self.max_entries:
+      self._memory.popitem(last=False)
+
+  def _connection(self) -> sqlite3.Connection:
+    if self._conn is None:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      conn = sqlite3.connect(str(self.path), check_same_thread=False)
+      conn.execute(
+        "CREATE TABLE IF NOT EXISTS analysis_artifacts ("
+        "user_id TEXT NOT NULL, message_id TEXT NOT NULL, version TEXT NOT NULL, parts TEXT NOT NULL, "
+        "updated_at REAL NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (user_id, message_id, version))"
+      )
+      conn.commit()
+      self._conn = conn
+    return self._conn
+
+
+analysis_store = AnalysisArtifactStore(
+  Path(settings.analysis_store_path) if settings.analysis_store_path else DEFAULT_PATH,
+  ttl_seconds=settings.analysis_store_ttl_seconds,
+  enabled=settings.analysis_store_enabled,
+)
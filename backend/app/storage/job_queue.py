@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from ..services.supabase_client import get_supabase_client
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "pipeline_jobs.sqlite3"
+SUPABASE_TABLE = "pipeline_jobs"
+SUPABASE_CLAIM_FUNCTION = "claim_pipeline_job"
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+def _utcnow() -> str:
+  return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class Job:
+  id: str
+  user_id: str
+  kind: str
+  payload: Dict[str, Any] = field(default_factory=dict)
+  status: str = "queued"
+  progress: Dict[str, Any] = field(default_factory=dict)
+  result: Optional[Dict[str, Any]] = None
+  error: Optional[str] = None
+  attempts: int = 0
+  worker_id: Optional[str] = None
+  created_at: Optional[str] = None
+  updated_at: Optional[str] = None
+
+  def to_dict(self, *, include_result: bool = True) -> Dict[str, Any]:
+    data = asdict(self)
+    if not include_result:
+      data.pop("result")
+    return data
+
+  @classmethod
+  def from_row(cls, row: Dict[str, Any]) -> "Job":
+    def decoded(value: Any) -> Any:
+      return json.loads(value) if isinstance(value, str) else value
+
+    return cls(
+      id=str(row["id"]),
+      user_id=row["user_id"],
+      kind=row["kind"],
+      payload=decoded(row.get("payload")) or {},
+      status=row["status"],
+      progress=decoded(row.get("progress")) or {},
+      result=decoded(row.get("result")),
+      error=row.get("error"),
+      attempts=int(row.get("attempts") or 0),
+      worker_id=row.get("worker_id"),
+      created_at=row.get("created_at"),
+      updated_at=row.get("updated_at"),
+    )
+
+
+class JobQueue(ABC):
+  """
+  Durable queue of background jobs. Workers ``claim`` a queued job under a lease and keep it
+  alive with ``heartbeat`` (which also records progress); a job whose worker died is handed out
+  again once its lease runs out, until ``max_attempts`` claims have been used up.
+  """
+
+  def __init__(self, *, lease_seconds: int = 300, max_attempts: int = 3):
+    self.lease_seconds = lease_seconds
+    self.max_attempts = max_attempts
+
+  @abstractmethod
+  def enqueue(self, user_id: str, kind: str, payload: Dict[str, Any]) -> Job: ...
+
+  @abstractmethod
+  def claim(self, worker_id: str) -> Optional[Job]: ...
+
+  @abstractmethod
+  def heartbeat(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> bool:
+    """Record progress and extend the lease; False when the job is no longer this worker's."""
+
+  @abstractmethod
+  def complete(
+    self, job_id: str, worker_id: str, result: Dict[str, Any], *, progress: Optional[Dict[str, Any]] = None
+  ) -> bool:
+    """Store the result; False (and nothing stored) when the job is no longer this worker's."""
+
+  @abstractmethod
+  def fail(self, job_id: str, worker_id: str, error: str, *, progress: Optional[Dict[str, Any]] = None) -> bool:
+    """Store the error; False (and nothing stored) when the job is no longer this worker's."""
+
+  @abstractmethod
+  def get(self, job_id: str) -> Optional[Job]: ...
+
+  @abstractmethod
+  def list_jobs(self, user_id: str, *, limit: int = 20) -> List[Job]: ...
+
+
+class SqliteJobQueue(JobQueue):
+  """Local-development backend; several processes on one host can share the file."""
+
+  def __init__(self, path: Path = DEFAULT_PATH, **kwargs: Any):
+    super().__init__(**kwargs)
+    self.path = path
+    self._lock = threading.Lock()
+    self._conn: Optional[sqlite3.Connection] = None
+
+  def enqueue(self, user_id: str, kind: str, payload: Dict[str, Any]) -> Job:
+    now = _utcnow()
+    job = Job(id=uuid.uuid4().hex, user_id=user_id, kind=kind, payload=payload, created_at=now, updated_at=now)
+    with self._lock:
+      conn = self._connection()
+      conn.execute(
+        "INSERT INTO pipeline_jobs (id, user_id, kind, payload, status, progress, attempts, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, 'queued', '{}', 0, ?, ?)",
+        (job.id, user_id, kind, json.dumps(payload), now, now),
+      )
+    return job
+
+  def claim(self, worker_id: str) -> Optional[Job]:
+    now = time.time()
+    with self._lock:
+      conn = self._connection()
+      # BEGIN IMMEDIATE takes the write lock up front, so two processes cannot claim the same row.
+      conn.execute("BEGIN IMMEDIATE")
+      try:
+        conn.execute(
+          "UPDATE pipeline_jobs SET status = 'failed', error = 'Lease expired after the last attempt', updated_at = ? "
+          "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+          (_utcnow(), now, self.max_attempts),
+        )
+        row = conn.execute(
+          "SELECT * FROM pipeline_jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+          "ORDER BY created_at LIMIT 1",
+          (now,),
+        ).fetchone()
+        if row is None:
+          conn.execute("COMMIT")
+          return None
+        conn.execute(
+          "UPDATE pipeline_jobs SET status = 'running', worker_id = ?, lease_until = ?, attempts = attempts + 1, "
+          "updated_at = ? WHERE id = ?",
+          (worker_id, now + self.lease_seconds, _utcnow(), row["id"]),
+        )
+        claimed = conn.execute("SELECT * FROM pipeline_jobs WHERE id = ?", (row["id"],)).fetchone()
+        conn.execute("COMMIT")
+      except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return Job.from_row(dict(claimed))
+
+  def heartbeat(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> bool:
+    return self._finish_or_touch(
+      job_id, worker_id, "progress = ?, lease_until = ?", (json.dumps(progress), time.time() + self.lease_seconds)
+    )
+
+  def complete(self, job_id: str, worker_id: str, result: Dict[str, Any], *, progress: Optional[Dict[str, Any]] = None) -> bool:
+    return self._finish_or_touch(
+      job_id,
+      worker_id,
+      "status = 'succeeded', result = ?, progress = COALESCE(?, progress), lease_until = NULL",
+      (json.dumps(result), json.dumps(progress) if progress is not None else None),
+    )
+
+  def fail(self, job_id: str, worker_id: str, error: str, *, progress: Optional[Dict[str, Any]] = None) -> bool:
+    return self._finish_or_touch(
+      job_id,
+      worker_id,
+      "status = 'failed', error = ?, progress = COALESCE(?, progress), lease_until = NULL",
+      (error, json.dumps(progress) if progress is not None else None),
+    )
+
+  def get(self, job_id: str) -> Optional[Job]:
+    with self._lock:
+      row = self._connection().execute("SELECT * FROM pipeline_jobs WHERE id = ?", (job_id,)).fetchone()
+    return Job.from_row(dict(row)) if row else None
+
+  def list_jobs(self, user_id: str, *, limit: int = 20) -> List[Job]:
+    with self._lock:
+      rows = self._connection().execute(
+        "SELECT * FROM pipeline_jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+      ).fetchall()
+    return [Job.from_row(dict(row)) for row in rows]
+
+  def _finish_or_touch(self, job_id: str, worker_id: str, assignments: str, values: tuple) -> bool:
+    with self._lock:
+      cursor = self._connection().execute(
+        f"UPDATE pipeline_jobs SET {assignments}, updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+        (*values, _utcnow(), job_id, worker_id),
+      )
+    return cursor.rowcount == 1
+
+  def _connection(self) -> sqlite3.Connection:
+    if self._conn is None:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      # Autocommit; claim() opens its own transaction.
+      conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+      conn.row_factory = sqlite3.Row
+      conn.execute(
+        "CREATE TABLE IF NOT EXISTS pipeline_jobs ("
+        "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+        "status TEXT NOT NULL, progress TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+        "worker_id TEXT, lease_until REAL, created_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+      )
+      conn.execute("CREATE INDEX IF NOT EXISTS pipeline_jobs_status_idx ON pipeline_jobs (status, created_at)")
+      conn.execute("CREATE INDEX IF NOT EXISTS pipeline_jobs_user_idx ON pipeline_jobs (user_id, created_at)")
+      self._conn = conn
+    return self._conn
+
+
+class SupabaseJobQueue(JobQueue):
+  """
+  Production backend on the pipeline_jobs table (migrations/step7_pipeline_jobs.sql). Claims go
+  through the claim_pipeline_job function, which locks with FOR UPDATE SKIP LOCKED so any number
+  of workers can poll the same table.
+  """
+
+  def enqueue(self, user_id: str, kind: str, payload: Dict[str, Any]) -> Job:
+    now = _utcnow()
+    row = {
+      "id": str(uuid.uuid4()),
+      "user_id": user_id,
+      "kind": kind,
+      "payload": payload,
+      "status": "queued",
+      "progress": {},
+      "attempts": 0,
+      "created_at": now,
+      "updated_at": now,
+    }
+    get_supabase_client().table(SUPABASE_TABLE).insert(row).execute()
+    return Job.from_row(row)
+
+  def claim(self, worker_id: str) -> Optional[Job]:
+    resp = get_supabase_client().rpc(
+      SUPABASE_CLAIM_FUNCTION,
+      {"p_worker_id": worker_id, "p_lease_seconds": self.lease_seconds, "p_max_attempts": self.max_attempts},
+    ).execute()
+    rows = resp.data if hasattr(resp, "data") else None
+    if isinstance(rows, dict):
+      rows = [rows]
+    return Job.from_row(rows[0]) if rows else None
+
+  def heartbeat(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> bool:
+    lease_until = datetime.fromtimestamp(time.time() + self.lease_seconds, timezone.utc).isoformat()
+    return self._update_owned(job_id, worker_id, {"progress": progress, "lease_until": lease_until})
+
+  def complete(self, job_id: str, worker_id: str, result: Dict[str, Any], *, progress: Optional[Dict[str, Any]] = None) -> bool:
+    values = {"status": "succeeded", "result": result, "lease_until": None}
+    return self._update_owned(job_id, worker_id, {**values, **({"progress": progress} if progress is not None else {})})
+
+  def fail(self, job_id: str, worker_id: str, error: str, *, progress: Optional[Dict[str, Any]] = None) -> bool:
+    values = {"status": "failed", "error": error, "lease_until": None}
+    return self._update_owned(job_id, worker_id, {**values, **({"progress": progress} if progress is not None else {})})
+
+  def get(self, job_id: str) -> Optional[Job]:
+    resp = get_supabase_client().table(SUPABASE_TABLE).select("*").eq("id", job_id).maybe_single().execute()
+    row = resp.data if resp is not None and hasattr(resp, "data") else None
+    return Job.from_row(row) if row else None
+
+  def list_jobs(self, user_id: str, *, limit: int = 20) -> List[Job]:
+    resp = (
+      get_supabase_client()
+      .table(SUPABASE_TABLE)
+      .select("id, user_id, kind, payload, status, progress, error, attempts, worker_id, created_at, updated_at")
+      .eq("user_id", user_id)
+      .order("created_at", desc=True)
+      .limit(limit)
+      .execute()
+    )
+    return [Job.from_row(row) for row in (resp.data if hasattr(resp, "data") else None) or []]
+
+  def _update_owned(self, job_id: str, worker_id: str, values: Dict[str, Any]) -> bool:
+    resp = (
+      get_supabase_client()
+      .table(SUPABASE_TABLE)
+      .update({**values, "updated_at": _utcnow()})
+      .eq("id", job_id)
+      .eq("worker_id", worker_id)
+      .eq("status", "running")
+      .execute()
+    )
+    return bool(resp.data if hasattr(resp, "data") else None)
+
+
+def build_job_queue() -> JobQueue:
+  backend = settings.pipeline_job_backend
+  options = {"lease_seconds": settings.pipeline_job_lease_seconds, "max_attempts": settings.pipeline_job_max_attempts}
+  if backend == "supabase":
+    return SupabaseJobQueue(**options)
+  if backend == "sqlite":
+    return SqliteJobQueue(Path(settings.pipeline_job_db_path) if settings.pipeline_job_db_path else DEFAULT_PATH, **options)
+  raise ValueError("PIPELINE_JOB_BACKEND must be sqlite or supabase")
+
+
+job_queue = build_job_queue()
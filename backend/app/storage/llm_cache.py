@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "llm_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 512
+
+
+def make_cache_key(model: str, generation_config: Dict[str, Any], prompt_version: str, prompt: str) -> str:
+  material = json.dumps(
+    {"model": model, "config": generation_config, "version": prompt_version, "prompt": prompt},
+    sort_keys=True,
+    ensure_ascii=False,
+  )
+  return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LlmResponseCache:
+  """
+  Two-tier cache for LLM responses: an in-process LRU in front of a local SQLite table.
+  Entries expire after ``ttl_seconds`` in both tiers. Hit/miss counters are kept per purpose.
+  """
+
+  def __init__(
+    self,
+    path: Path = DEFAULT_PATH,
+    *,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    ttl_seconds: int = DEFAULT_TTL_SECONDS,
+    enabled: bool = True,
+  ):
+    self.path = path
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self.enabled = enabled
+    self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self._conn: Optional[sqlite3.Connection] = None
+    self._stats: Dict[str, Dict[str, int]] = {}
+
+  def get(self, key: str, purpose: str) -> Optional[str]:
+    if not self.enabled:
+      return None
+    now = time.time()
+    with self._lock:
+      entry = self._memory.get(key)
+      if entry and entry[1] > now:
+        self._memory.move_to_end(key)
+        self._count(purpose, "memory_hits")
+        return entry[0]
+      if entry:
+        self._memory.pop(key, None)
+
+      row = None
+      try:
+        row = self._connection().execute(
+          "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+      except sqlite3.Error:
+        row = None
+      if row and row[1] > now:
+        self._remember(key, row[0], row[1])
+        self._count(purpose, "persistent_hits")
+        return row[0]
+
+      self._count(purpose, "misses")
+      return None
+
+  def set(self, key: str, purpose: str, response: str) -> None:
+    if not self.enabled:
+      return
+    now = time.time()
+    expires_at = now + self.ttl_seconds
+    with self._lock:
+      self._remember(key, response, expires_at)
+      try:
+        conn = self._connection()
+        conn.execute(
+          "INSERT OR REPLACE INTO llm_cache (key, purpose, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+          (key, purpose, response, now, expires_at),
+        )
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        conn.commit()
+      except sqlite3.Error:
+        # Best-effort; the in-memory tier still serves this process.
+        pass
+
+  def invalidate(self, key: str) -> None:
+    with self._lock:
+      self._memory.pop(key, None)
+      try:
+        conn = self._connection()
+        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        conn.commit()
+      except sqlite3.Error:
+        pass
+
+  def clear(self) -> None:
+    with self._lock:
+      self._memory.clear()
+      self._stats.clear()
+      try:
+        conn = self._connection()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+      except sqlite3.Error:
+        pass
+
+  def stats(self) -> Dict[str, Dict[str, Any]]:
+    with self._lock:
+      report: Dict[str, Dict[str, Any]] = {}
+      for purpose, counters in self._stats.items():
+        hits = counters.get("memory_hits", 0) + counters.get("persistent_hits", 0)
+        lookups = hits + counters.get("misses", 0)
+        report[purpose] = {
+          **counters,
+          "hits": hits,
+          "lookups": lookups,
+          "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+      return report
+
+  def _remember(self, key: str, response: str, expires_at: float) -> None:
+    self._memory[key] = (response, expires_at)
+    self._memory.move_to_end(key)
+    while len(self._memory) > self.max_entries:
+      self._memory.popitem(last=False)
+
+  def _count(self, purpose: str, counter: str) -> None:
+    bucket = self._stats.setdefault(purpose, {"memory_hits": 0, "persistent_hits": 0, "misses": 0})
+    bucket[counter] += 1
+
+  def _connection(self) -> sqlite3.Connection:
+    if self._conn is None:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      conn = sqlite3.connect(str(self.path), check_same_thread=False)
+      conn.execute(
+        "CREATE TABLE IF NOT EXISTS llm_cache ("
+        "key TEXT PRIMARY KEY, purpose TEXT NOT NULL, response TEXT NOT NULL, "
+        "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+      )
+      conn.commit()
+      self._conn = conn
+    return self._conn
+
+
+llm_cache = LlmResponseCache(
+  Path(settings.llm_cache_path) if settings.llm_cache_path else DEFAULT_PATH,
+  max_entries=settings.llm_cache_max_entries,
+  ttl_seconds=settings.llm_cache_ttl_seconds,
+  enabled=settings.llm_cache_enabled,
+)
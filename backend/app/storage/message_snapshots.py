@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..config import settings
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "message_snapshots.sqlite3"
+DEFAULT_TTL_SECONDS = 14 * 24 * 3600
+COMPRESSION_LEVEL = 6
+
+
+class MessageSnapshotStore:
+  """
+  Parsed Gmail messages (body plus extracted attachment text) kept as zlib-compressed JSON per
+  (user, message_id). Gmail messages are immutable, so a snapshot written when a message is
+  ingested can serve every later action until it expires after ``ttl_seconds``.
+  """
+
+  def __init__(self, path: Path = DEFAULT_PATH, *, ttl_seconds: int = DEFAULT_TTL_SECONDS, enabled: bool = True):
+    self.path = path
+    self.ttl_seconds = ttl_seconds
+    self.enabled = enabled
+    self._lock = threading.Lock()
+    self._conn: Optional[sqlite3.Connection] = None
+    self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "stored_bytes": 0, "raw_bytes": 0}
+
+  def get(self, user_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+    if not self.enabled:
+      return None
+    with self._lock:
+      try:
+        row = self._connection().execute(
+          "SELECT data, expires_at FROM message_snapshots WHERE user_id = ? AND message_id = ?", (user_id, message_id)
+        ).fetchone()
+      except sqlite3.Error:
+        row = None
+      if not row or row[1] <= time.time():
+        self._stats["misses"] += 1
+        return None
+      self._stats["hits"] += 1
+    return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+  def put(self, user_id: str, message_id: str, snapshot: Dict[str, Any]) -> None:
+    self.put_many(user_id, {message_id: snapshot})
+
+  def put_many(self, user_id: str, snapshots: Dict[str, Dict[str, Any]]) -> None:
+    if not self.enabled or not snapshots:
+      return
+    now = time.time()
+    rows = []
+    raw_bytes = stored_bytes = 0
+    for message_id, snapshot in snapshots.items():
+      raw = json.dumps(snapshot, ensure_ascii=False).encode("utf-8")
+      data = zlib.compress(raw, COMPRESSION_LEVEL)
+      raw_bytes += len(raw)
+      stored_bytes += len(data)
+      rows.append((user_id, message_id, data, now, now + self.ttl_seconds))
+    with self._lock:
+      try:
+        conn = self._connection()
+        conn.executemany(
+          "INSERT OR REPLACE INTO message_snapshots (user_id, message_id, data, created_at, expires_at) "
+          "VALUES (?, ?, ?, ?, ?)",
+          rows,
+        )
+        conn.execute("DELETE FROM message_snapshots WHERE expires_at <= ?", (now,))
+        conn.commit()
+      except sqlite3.Error:
+        # Best-effort; a missing snapshot only means the next action refetches from Gmail.
+        return
+      self._stats["writes"] += len(rows)
+      self._stats["raw_bytes"] += raw_bytes
+      self._stats["stored_bytes"] += stored_bytes
+
+  def invalidate(self, user_id: str, message_id: str) -> None:
+    with self._lock:
+      try:
+        conn = self._connection()
+        conn.execute("DELETE FROM message_snapshots WHERE user_id = ? AND message_id = ?", (user_id, message_id))
+        conn.commit()
+      except sqlite3.Error:
+        pass
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      lookups = self._stats["hits"] + self._stats["misses"]
+      return {
+        "enabled": self.enabled,
+        "ttl_seconds": self.ttl_seconds,
+        **self._stats,
+        "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        "compression_ratio": (
+          round(self._stats["stored_bytes"] / self._stats["raw_bytes"], 4) if self._stats["raw_bytes"] else None
+        ),
+      }
+
+  def _connection(self) -> sqlite3.Connection:
+    if self._conn is None:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      conn = sqlite3.connect(str(self.path), check_same_thread=False)
+      conn.execute(
+        "CREATE TABLE IF NOT EXISTS message_snapshots ("
+        "user_id TEXT NOT NULL, message_id TEXT NOT NULL, data BLOB NOT NULL, "
+        "created_at REAL NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (user_id, message_id))"
+      )
+      conn.execute("CREATE INDEX IF NOT EXISTS message_snapshots_expiry_idx ON message_snapshots (expires_at)")
+      conn.commit()
+      self._conn = conn
+    return self._conn
+
+
+message_snapshots = MessageSnapshotStore(
+  Path(settings.message_snapshot_path) if settings.message_snapshot_path else DEFAULT_PATH,
+  ttl_seconds=settings.message_snapshot_ttl_seconds,
+  enabled=settings.message_snapshot_enabled,
+)
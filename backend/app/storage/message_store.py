@@ -13,12 +13,18 @@ from ..services.supabase_client import get_supabase_client
 DEFAULT_PATH = Path(__file__).resolve().parents[2] / "inbox_messages.json"
 DEFAULT_BUCKET = {"last_checked_at": None, "messages": {}}
 MAX_STORED_MESSAGES = 10
+PREVIEW_CHARS = 800
 
 
 def _utcnow() -> str:
   return datetime.now(timezone.utc).isoformat()
 
 
+def preview_text(body_text: Optional[str]) -> str:
+  """The start of a message body kept in the ``preview`` column."""
+  return (body_text or "").strip()[:PREVIEW_CHARS]
+
+
 class MessageStore:
   def __init__(self, path: Path = DEFAULT_PATH):
     self.path = path
@@ -68,7 +74,7 @@ class MessageStore:
       "subject": message.subject or "(no subject)",
       "sender": message.sender,
       "snippet": message.snippet,
-      "preview": body_sample[:800],
+      "preview": preview_text(body_sample),
       "received_at": message.sent_at.isoformat() if message.sent_at else None,
       "status": "pending_ai_analysis",
       "has_attachments": has_attachments,
@@ -99,7 +105,7 @@ class MessageStore:
       "subject": message.subject or "(no subject)",
       "sender": message.sender,
       "snippet": message.snippet,
-      "preview": body_sample[:800],
+      "preview": preview_text(body_sample),
       "status": "pending_ai_analysis",
       "has_attachments": has_attachments,
       "has_images": has_images,
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import settings
+from ..prompt_versions import ANALYSIS_VERSION
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / "stage_checkpoints.sqlite3"
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+PIPELINE_STAGES = ("fetch", "route", "extract", "validate", "plan", "crm_write")
+# Stages whose output depends on the prompts; they are only reused under the same ANALYSIS_VERSION.
+ANALYSIS_STAGES = ("route", "extract", "validate", "plan")
+
+
+@dataclass
+class Checkpoint:
+  user_id: str
+  message_id: str
+  # Output of every completed stage, by stage name.
+  outputs: Dict[str, Any] = field(default_factory=dict)
+  # What an interrupted stage had already done (HubSpot ids created before a CRM write failed).
+  partial: Dict[str, Any] = field(default_factory=dict)
+  error: Optional[str] = None
+  updated_at: Optional[float] = None
+  # Whether the failed run was writing to HubSpot, so a retry resumes with the same intent.
+  execute_hubspot: bool = False
+
+  def first_incomplete(self) -> Optional[str]:
+    return next((stage for stage in PIPELINE_STAGES if stage not in self.outputs), None)
+
+  def to_dict(self) -> Dict[str, Any]:
+    return {
+      "message_id": self.message_id,
+      "completed": [stage for stage in PIPELINE_STAGES if stage in self.outputs],
+      "next_stage": self.first_incomplete(),
+      "partial": self.partial,
+      "error": self.error,
+      "execute_hubspot": self.execute_hubspot,
+      "updated_at": self.updated_at,
+    }
+
+
+class StageCheckpointStore:
+  """
+  Per-message pipeline checkpoints: each stage (fetch, route, extract, validate, plan, crm_write)
+  records its output as it completes, so a retry after a failure resumes from the first stage
+  without one instead of repeating LLM calls or recreating CRM objects. Analysis outputs written
+  under another prompt ``version`` are dropped on load; fetch and CRM progress are kept.
+  """
+
+  def __init__(
+    self,
+    path: Path = DEFAULT_PATH,
+    *,
+    ttl_seconds: int = DEFAULT_TTL_SECONDS,
+    enabled: bool = True,
+    version: str = ANALYSIS_VERSION,
+  ):
+    self.path = path
+    self.ttl_seconds = ttl_seconds
+    self.enabled = enabled
+    self.version = version
+    # Re-entrant: _update loads and writes under one hold so concurrent stages do not drop outputs.
+    self._lock = threading.RLock()
+    self._conn: Optional[sqlite3.Connection] = None
+
+  def load(self, user_id: str, message_id: str) -> Checkpoint:
+    empty = Checkpoint(user_id=user_id, message_id=message_id)
+    if not self.enabled:
+      return empty
+    with self._lock:
+      try:
+        row = self._connection().execute(
+          "SELECT message_id, outputs, partial, error, updated_at, version, execute_hubspot, expires_at FROM stage_checkpoints "
+          "WHERE user_id = ? AND message_id = ?",
+          (user_id, message_id),
+        ).fetchone()
+      except sqlite3.Error:
+        row = None
+    if not row or row[7] <= time.time():
+      return empty
+    return self._checkpoint(user_id, row)
+
+  def record(self, user_id: str, message_id: str, stage: str, output: Any = True) -> None:
+    """Mark ``stage`` complete with its output; this also clears partial progress and the last error."""
+    if stage not in PIPELINE_STAGES:
+      raise ValueError(f"Unknown pipeline stage: {stage}")
+
+    def complete(checkpoint: Checkpoint) -> None:
+      checkpoint.outputs[stage] = output
+      checkpoint.partial = {}
+
+    self._update(user_id, message_id, complete)
+
+  def record_partial(self, user_id: str, message_id: str, partial: Dict[str, Any]) -> None:
+    self._update(user_id, message_id, lambda checkpoint: checkpoint.partial.update(partial))
+
+  def mark_failed(self, user_id: str, message_id: str, error: str, *, execute_hubspot: bool = False) -> None:
+    def fail(checkpoint: Checkpoint) -> None:
+      checkpoint.error = error
+      checkpoint.execute_hubspot = execute_hubspot
+
+    self._update(user_id, message_id, fail)
+
+  def failed(self, user_id: str, *, limit: int = 50) -> List[Checkpoint]:
+    """Checkpoints whose last attempt failed, newest first."""
+    if not self.enabled:
+      return []
+    with self._lock:
+      try:
+        rows = self._connection().execute(
+          "SELECT message_id, outputs, partial, error, updated_at, version, execute_hubspot FROM stage_checkpoints "
+          "WHERE user_id = ? AND error IS NOT NULL AND expires_at > ? ORDER BY updated_at DESC LIMIT ?",
+          (user_id, time.time(), limit),
+        ).fetchall()
+      except sqlite3.Error:
+        rows = []
+    return [self._checkpoint(user_id, row) for row in rows]
+
+  def clear(self, user_id: str, message_id: str) -> None:
+    if not self.enabled:
+      return
+    with self._lock:
+      try:
+        conn = self._connection()
+        conn.execute("DELETE FROM stage_checkpoints WHERE user_id = ? AND message_id = ?", (user_id, message_id))
+        conn.commit()
+      except sqlite3.Error:
+        pass
+
+  def _checkpoint(self, user_id: str, row) -> Checkpoint:
+    outputs = json.loads(row[1])
+    if row[5] != self.version:
+      for stage in ANALYSIS_STAGES:
+        outputs.pop(stage, None)
+    return Checkpoint(user_id, row[0], outputs, json.loads(row[2]), row[3], row[4], bool(row[6]))
+
+  def _update(self, user_id: str, message_id: str, change: Callable[[Checkpoint], None]) -> None:
+    if not self.enabled:
+      return
+    with self._lock:
+      checkpoint = self.load(user_id, message_id)
+      checkpoint.error = None
+      change(checkpoint)
+      self._write(checkpoint)
+
+  def _write(self, checkpoint: Checkpoint) -> None:
+    now = time.time()
+    try:
+      conn = self._connection()
+      conn.execute(
+        "INSERT OR REPLACE INTO stage_checkpoints "
+        "(user_id, message_id, outputs, partial, error, version, execute_hubspot, updated_at, expires_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+          checkpoint.user_id,
+          checkpoint.message_id,
+          json.dumps(checkpoint.outputs),
+          json.dumps(checkpoint.partial),
+          checkpoint.error,
+          self.version,
+          int(checkpoint.execute_hubspot),
+          now,
+          now + self.ttl_seconds,
+        ),
+      )
+      conn.execute("DELETE FROM stage_checkpoints WHERE expires_at <= ?", (now,))
+      conn.commit()
+    except sqlite3.Error:
+      # Best-effort; without a checkpoint a retry simply redoes the stage.
+      pass
+
+  def _connection(self) -> sqlite3.Connection:
+    if self._conn is None:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      conn = sqlite3.connect(str(self.path), check_same_thread=False)
+      conn.execute(
+        "CREATE TABLE IF NOT EXISTS stage_checkpoints ("
+        "user_id TEXT NOT NULL, message_id TEXT NOT NULL, outputs TEXT NOT NULL, partial TEXT NOT NULL, "
+        "error TEXT, version TEXT, execute_hubspot INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL, "
+        "expires_at REAL NOT NULL, PRIMARY KEY (user_id, message_id))"
+      )
+      # Checkpoint files created before these columns existed.
+      for column in ("version TEXT", "execute_hubspot INTEGER NOT NULL DEFAULT 0"):
+        try:
+          conn.execute(f"ALTER TABLE stage_checkpoints ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+          pass
+      conn.commit()
+      self._conn = conn
+    return self._conn
+
+
+stage_checkpoints = StageCheckpointStore(
+  Path(settings.stage_checkpoint_path) if settings.stage_checkpoint_path else DEFAULT_PATH,
+  ttl_seconds=settings.stage_checkpoint_ttl_seconds,
+  enabled=settings.stage_checkpoint_enabled,
+)
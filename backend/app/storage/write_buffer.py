@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_SECONDS = 2.0
+
+RowFailed = Callable[[Dict[str, Any], Exception], None]
+
+
+class SupabaseWriteBuffer:
+  """
+  Collects upsert rows for one table and writes them as multi-row upserts once ``batch_size``
+  rows are waiting or the oldest has waited ``flush_seconds``. A rejected batch is retried row
+  by row so one bad row cannot lose the others; rows that still fail go to ``on_row_failed``.
+  Use it as an async context manager: leaving the block (normally, on error or on
+  cancellation) flushes whatever is left.
+  """
+
+  def __init__(
+    self,
+    supabase,
+    table: str,
+    *,
+    on_conflict: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+    on_row_failed: Optional[RowFailed] = None,
+  ):
+    self.supabase = supabase
+    self.table = table
+    self.on_conflict = on_conflict
+    self.batch_size = max(1, batch_size)
+    self.flush_seconds = flush_seconds
+    self.on_row_failed = on_row_failed
+    self._conflict_columns = tuple(column.strip() for column in on_conflict.split(","))
+    # Keyed by the conflict columns: a later row for the same key replaces the pending one, since
+    # Postgres rejects an upsert that touches the same row twice.
+    self._pending: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    self._flush_lock = asyncio.Lock()
+    self._timer: Optional[asyncio.Task] = None
+    self._stats = {"rows": 0, "batches": 0, "row_fallbacks": 0, "failed": 0}
+
+  async def __aenter__(self) -> "SupabaseWriteBuffer":
+    return self
+
+  async def __aexit__(self, *exc_info) -> None:
+    await self.close()
+
+  async def add(self, row: Dict[str, Any]) -> None:
+    self._pending[tuple(row.get(column) for column in self._conflict_columns)] = row
+    if len(self._pending) >= self.batch_size:
+      await self.flush()
+    elif self._timer is None:
+      self._timer = asyncio.create_task(self._flush_later())
+
+  async def flush(self) -> None:
+    async with self._flush_lock:
+      if self._timer is not None and self._timer is not asyncio.current_task():
+        self._timer.cancel()
+      self._timer = None
+      rows, self._pending = list(self._pending.values()), {}
+      if rows:
+        await run_in_threadpool(self._write, rows)
+
+  async def close(self) -> None:
+    # Shielded so a cancelled request or worker still writes out what it buffered.
+    await asyncio.shield(self.flush())
+
+  def stats(self) -> Dict[str, int]:
+    return dict(self._stats)
+
+  async def _flush_later(self) -> None:
+    await asyncio.sleep(self.flush_seconds)
+    try:
+      await self.flush()
+    except Exception:
+      logger.exception("Buffered write failed", extra={"table": self.table})
+
+  def _write(self, rows: List[Dict[str, Any]]) -> None:
+    # PostgREST takes the columns of a bulk upsert from its rows, so only rows of one shape share a request.
+    shapes: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for row in rows:
+      shapes.setdefault(tuple(sorted(row)), []).append(row)
+    for batch in shapes.values():
+      try:
+        self.supabase.table(self.table).upsert(batch, on_conflict=self.on_conflict).execute()
+        self._stats["batches"] += 1
+        self._stats["rows"] += len(batch)
+        continue
+      except Exception as exc:
+        if len(batch) == 1:
+          self._row_failed(batch[0], exc)
+          continue
+        logger.warning(
+          "Batch upsert failed; writing rows one by one",
+          extra={"table": self.table, "rows": len(batch), "error": str(exc)},
+        )
+      for row in batch:
+        self._stats["row_fallbacks"] += 1
+        try:
+          self.supabase.table(self.table).upsert(row, on_conflict=self.on_conflict).execute()
+          self._stats["rows"] += 1
+        except Exception as exc:
+          self._row_failed(row, exc)
+
+  def _row_failed(self, row: Dict[str, Any], exc: Exception) -> None:
+    self._stats["failed"] += 1
+    logger.error("Row upsert failed", extra={"table": self.table, "error": str(exc)})
+    if self.on_row_failed:
+      self.on_row_failed(row, exc)
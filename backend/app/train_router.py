@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Any, Dict, List
+
+from .services.learned_router import (
+  CONFIRMED_KEY,
+  KnnRoutingModel,
+  TrainingExample,
+  evaluate,
+  example_from_row,
+  learned_router,
+  split_holdout,
+)
+from .services.supabase_client import get_supabase_client
+
+PAGE_SIZE = 1000
+
+
+def fetch_examples(user_id: str, *, limit: int) -> List[TrainingExample]:
+  supabase = get_supabase_client()
+  rows: List[Dict[str, Any]] = []
+  while len(rows) < limit:
+    start = len(rows)
+    end = min(start + PAGE_SIZE, limit) - 1
+    resp = (
+      supabase.table("gmail_messages")
+      .select("message_id, subject, sender, preview, status, ai_routing_decision")
+      .eq("user_id", user_id)
+      # Only routings a user accepted via /api/pipeline/accept; automatic runs are the model's own output.
+      .eq(f"ai_routing_decision->>{CONFIRMED_KEY}", "true")
+      .order("updated_at", desc=True)
+      .range(start, end)
+      .execute()
+    )
+    page = (resp.data if hasattr(resp, "data") else None) or []
+    rows.extend(page)
+    if len(page) < end - start + 1:
+      break
+  return [example for example in (example_from_row(row) for row in rows) if example]
+
+
+def train(user_id: str, *, holdout: float, limit: int, min_confidence: float, save: bool) -> Dict[str, Any]:
+  examples = fetch_examples(user_id, limit=limit)
+  if not examples:
+    raise RuntimeError(f"No labeled routing decisions found for user {user_id}")
+
+  train_set, holdout_set = split_holdout(examples, holdout)
+  report = {
+    "user_id": user_id,
+    "examples": len(examples),
+    "train": len(train_set),
+    **evaluate(KnnRoutingModel.train(train_set), holdout_set, min_confidence=min_confidence),
+  }
+  if save:
+    # The saved model uses every example; the holdout was only for the report.
+    report["model_path"] = str(learned_router.save(user_id, KnnRoutingModel.train(examples)))
+  return report
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Train a workspace's learned email router from past routing decisions.")
+  parser.add_argument("--user-id", required=True)
+  parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of examples held out for the report")
+  parser.add_argument("--limit", type=int, default=5000, help="Most recent labeled rows to train on")
+  parser.add_argument("--min-confidence", type=float, default=learned_router.min_confidence)
+  parser.add_argument("--dry-run", action="store_true", help="Report only; do not save the model")
+  args = parser.parse_args()
+  result = train(args.user_id, holdout=args.holdout, limit=args.limit, min_confidence=args.min_confidence, save=not args.dry_run)
+  print(json.dumps(result, indent=2))
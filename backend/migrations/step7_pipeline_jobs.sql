@@ -0,0 +1,58 @@
+-- ================================================================
+-- STEP 7: Create pipeline_jobs table (background /api/pipeline/run jobs)
+-- ================================================================
+
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    progress JSONB NOT NULL DEFAULT '{}'::jsonb,
+    result JSONB,
+    error TEXT,
+
+    -- Lease held by the worker running the job; an expired lease makes the job claimable again
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_until TIMESTAMP WITH TIME ZONE,
+
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_claimable ON pipeline_jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_user ON pipeline_jobs(user_id, created_at DESC);
+
+-- Hands the oldest claimable job to one worker. SKIP LOCKED lets concurrent workers pass over
+-- rows another worker is claiming instead of waiting on them.
+CREATE OR REPLACE FUNCTION claim_pipeline_job(p_worker_id TEXT, p_lease_seconds INTEGER, p_max_attempts INTEGER)
+RETURNS SETOF pipeline_jobs AS $$
+BEGIN
+    UPDATE pipeline_jobs
+    SET status = 'failed', error = 'Lease expired after the last attempt', updated_at = NOW()
+    WHERE status = 'running' AND lease_until < NOW() AND attempts >= p_max_attempts;
+
+    RETURN QUERY
+    UPDATE pipeline_jobs
+    SET status = 'running',
+        worker_id = p_worker_id,
+        lease_until = NOW() + make_interval(secs => p_lease_seconds),
+        attempts = attempts + 1,
+        updated_at = NOW()
+    WHERE id = (
+        SELECT id FROM pipeline_jobs
+        WHERE status = 'queued' OR (status = 'running' AND lease_until < NOW())
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE pipeline_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their pipeline jobs"
+    ON pipeline_jobs FOR SELECT
+    USING (user_id = auth.uid()::text);
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from app.services.gmail_ingest import AttachmentText, GmailMessage
+
+
+def make_message(
+  message_id: str = "msg_1",
+  body: str = "Please send a quote for 50 seats.",
+  *,
+  subject: Optional[str] = "Quote",
+  sender: Optional[str] = "Jane <jane@acme.com>",
+  recipients: Iterable[str] = (),
+  thread_id: Optional[str] = None,
+  sent_at: Optional[datetime] = None,
+  snippet: Optional[str] = None,
+  attachments: Iterable[AttachmentText] = (),
+  headers: Optional[Dict[str, str]] = None,
+) -> GmailMessage:
+  """A GmailMessage for tests; override only the fields a test is about."""
+  return GmailMessage(
+    message_id=message_id,
+    thread_id=thread_id,
+    subject=subject,
+    sender=sender,
+    recipients=list(recipients),
+    sent_at=sent_at,
+    snippet=snippet,
+    body_text=body,
+    attachments=list(attachments),
+    headers=dict(headers or {}),
+  )
@@ -0,0 +1,138 @@
+"""Local stand-in for the Gemini REST API, served over real HTTP for client tests."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class GeminiStandIn:
+  """
+  Answers ``:generateContent`` with the configured text in one piece and
+  ``:streamGenerateContent?alt=sse`` with the same text split into ``chunk_size`` pieces,
+  pausing ``chunk_delay`` seconds between events. ``statuses`` are served (with an error body)
+  before the first successful response, e.g. ``[429]`` to exercise key rotation. ``usage`` is
+  returned as usageMetadata (on the last event when streaming).
+
+  ``/cachedContents`` create and TTL-update calls are answered as well (404 when
+  ``context_caching`` is off); they are logged in ``cache_requests`` and never consume ``statuses``.
+  A request referencing a cached content adds ``cachedContentTokenCount`` to the usage.
+  """
+
+  def __init__(
+    self,
+    text: str = "{}",
+    *,
+    chunk_size: int = 16,
+    chunk_delay: float = 0.0,
+    statuses: Optional[List[int]] = None,
+    usage: Optional[Dict[str, int]] = None,
+    context_caching: bool = True,
+  ):
+    self.text = text
+    self.usage = usage
+    self.chunk_size = chunk_size
+    self.chunk_delay = chunk_delay
+    self.statuses = list(statuses or [])
+    self.context_caching = context_caching
+    self.requests: List[Dict[str, Any]] = []
+    self.cache_requests: List[Dict[str, Any]] = []
+    self.cached_contents: Dict[str, str] = {}
+    self.chunks_sent = 0
+    self._server: Optional[ThreadingHTTPServer] = None
+
+  @property
+  def url(self) -> str:
+    host, port = self._server.server_address[:2]
+    return f"http://{host}:{port}/models"
+
+  def __enter__(self) -> "GeminiStandIn":
+    stand_in = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = "HTTP/1.1"
+
+      def do_POST(self):
+        parsed, body = self._read()
+        if parsed.path.endswith("/cachedContents"):
+          self._cache_call("POST", parsed, body)
+          return
+        stand_in.requests.append({"path": parsed.path, "query": parse_qs(parsed.query), "body": body})
+
+        if stand_in.statuses:
+          status = stand_in.statuses.pop(0)
+          self._send(status, json.dumps({"error": {"code": status}}).encode())
+          return
+        usage = stand_in.usage
+        if body.get("cachedContent"):
+          cached = stand_in.cached_contents.get(body["cachedContent"])
+          if cached is None:
+            self._send(404, json.dumps({"error": {"code": 404}}).encode())
+            return
+          usage = {**(usage or {}), "cachedContentTokenCount": len(cached) // 4}
+        if parsed.path.endswith(":streamGenerateContent"):
+          self._stream(usage)
+        else:
+          self._send(200, json.dumps(_candidate(stand_in.text, usage)).encode())
+
+      def do_PATCH(self):
+        parsed, body = self._read()
+        self._cache_call("PATCH", parsed, body)
+
+      def _read(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        return parsed, json.loads(self.rfile.read(length) or b"{}")
+
+      def _cache_call(self, method: str, parsed, body: Dict[str, Any]) -> None:
+        stand_in.cache_requests.append({"method": method, "path": parsed.path, "query": parse_qs(parsed.query), "body": body})
+        name = parsed.path.split("/", 1)[1] if method == "PATCH" else f"cachedContents/c{len(stand_in.cached_contents)}"
+        if not stand_in.context_caching or (method == "PATCH" and name not in stand_in.cached_contents):
+          self._send(404, json.dumps({"error": {"code": 404}}).encode())
+          return
+        if method == "POST":
+          stand_in.cached_contents[name] = body["contents"][0]["parts"][0]["text"]
+        self._send(200, json.dumps({"name": name, "model": body.get("model")}).encode())
+
+      def _send(self, status: int, payload: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+      def _stream(self, usage: Optional[Dict[str, int]]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        text = stand_in.text
+        for start in range(0, len(text), stand_in.chunk_size):
+          last = start + stand_in.chunk_size >= len(text)
+          candidate = _candidate(text[start : start + stand_in.chunk_size], usage if last else None)
+          event = f"data: {json.dumps(candidate)}\r\n\r\n".encode()
+          self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+          self.wfile.flush()
+          stand_in.chunks_sent += 1
+          time.sleep(stand_in.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+      def log_message(self, *args):
+        pass
+
+    self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self._server.shutdown()
+    self._server.server_close()
+
+
+def _candidate(text: str, usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+  payload: Dict[str, Any] = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+  if usage:
+    payload["usageMetadata"] = usage
+  return payload
@@ -0,0 +1,118 @@
+import asyncio
+import json
+from functools import partial
+
+from app.services import ai_router as ai_router_module
+from app.services.ai_router import ai_router
+from app.services.validator import validator_service
+from tests.conftest import make_message
+
+
+_message = partial(
+  make_message,
+  body="Quote for 100 licenses - $50,000",
+  thread_id="thr_1",
+  subject="Quote request",
+  sender="Jane Doe <jane@acme.com>",
+  recipients=["sales@nextedge.ai"],
+)
+
+
+def test_classify_and_extract_uses_single_call(monkeypatch):
+  calls = []
+  combined = {
+    "routing": {"primary_object": "Deals", "target_crm": ["hubspot"], "confidence": 0.9, "intent": "Sales"},
+    "extraction": {
+      "people": [{"name": "Jane Doe", "email": "jane@acme.com"}],
+      "company": {"name": "Acme", "domain": "acme.com"},
+      "amount": "50000",
+      "summary": "Quote request",
+      "evidence": "Quote for 100 licenses",
+    },
+  }
+
+  async def fake_analyze_and_route(email, **kwargs):
+    calls.append(email.message_id)
+    return json.dumps(combined)
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "analyze_and_route", fake_analyze_and_route)
+
+  message = _message()
+  routing, raw_json = asyncio.run(ai_router.aclassify_and_extract(message))
+  extraction = asyncio.run(validator_service.avalidate(message, raw_json))
+
+  assert calls == ["msg_1"]
+  assert routing.primary_object == "deals"
+  assert routing.intent == "sales"
+  assert extraction.amount == "50000"
+  assert extraction.people[0].email == "jane@acme.com"
+
+
+def test_classify_and_extract_falls_back_on_bad_routing(monkeypatch):
+  payload = {"routing": "oops", "extraction": {"summary": "s", "evidence": "e"}}
+  async def fake_analyze_and_route(email, **kwargs):
+    return json.dumps(payload)
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "analyze_and_route", fake_analyze_and_route)
+
+  routing, raw_json = asyncio.run(ai_router.aclassify_and_extract(_message()))
+
+  assert routing.primary_object == "contacts"
+  assert routing.reasoning == "fallback"
+  # The extraction is kept, with the sender and amount found locally filled in.
+  extraction = json.loads(raw_json)
+  assert (extraction["summary"], extraction["evidence"]) == ("s", "e")
+  assert extraction["people"] == [{"name": "Jane Doe", "email": "jane@acme.com"}]
+  assert extraction["amount"] == "$50,000"
+
+
+def test_async_classify_and_extract_passes_user(monkeypatch):
+  seen = {}
+
+  async def fake_analyze_and_route(email, *, user_id=None):
+    seen["user_id"] = user_id
+    return json.dumps({"routing": {"primary_object": "tickets"}, "extraction": {"summary": "s", "evidence": "e"}})
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "analyze_and_route", fake_analyze_and_route)
+
+  routing, raw_json = asyncio.run(ai_router.aclassify_and_extract(_message(), user_id="user_1"))
+
+  assert seen["user_id"] == "user_1"
+  assert routing.primary_object == "tickets"
+  assert json.loads(raw_json)["summary"] == "s"
+
+
+def test_packed_batch_recovers_dropped_and_duplicated_entries(monkeypatch):
+  packs = []
+  singles = []
+
+  async def fake_classify_email_routes(emails, *, user_id=None):
+    packs.append(sorted(emails))
+    if len(emails) == 4:
+      # E2 is dropped and E3 is returned twice (mixed up); only E1 and E4 are trusted.
+      return json.dumps(
+        [
+          {"id": "E1", "primary_object": "deals"},
+          {"id": "E3", "primary_object": "tickets"},
+          {"id": "E3", "primary_object": "leads"},
+          {"id": "E4", "primary_object": "campaigns"},
+        ]
+      )
+    return json.dumps([{"id": key, "primary_object": "cases"} for key in emails])
+
+  async def fake_classify_email_route(email, *, user_id=None):
+    singles.append(email.message_id)
+    return json.dumps({"primary_object": "orders"})
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "classify_email_routes", fake_classify_email_routes)
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "classify_email_route", fake_classify_email_route)
+
+  messages = [_message(body=f"body {idx}") for idx in range(4)]
+  for idx, message in enumerate(messages):
+    message.message_id = f"msg_{idx}"
+
+  decisions = asyncio.run(ai_router.aclassify_batch(messages, batch_size=4))
+
+  assert [d.primary_object for d in decisions] == ["deals", "cases", "cases", "campaigns"]
+  assert packs == [["E1", "E2", "E3", "E4"], ["E1", "E2"]]
+  assert singles == []
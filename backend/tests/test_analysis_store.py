@@ -0,0 +1,71 @@
+import asyncio
+import json
+from functools import partial
+
+from app.routers import pipeline as pipeline_module
+from app.services.ai_router import RoutingDecision
+from app.storage.analysis_store import AnalysisArtifactStore
+from app.storage.stage_checkpoints import StageCheckpointStore
+from tests.conftest import make_message
+
+
+_message = partial(
+  make_message,
+  body="Could you send a quote for 20 seats?",
+  subject="Quote for 20 seats",
+  sender="Jane Doe <jane@acme.com>",
+)
+
+
+def test_parts_merge_and_prompt_version_scopes_entries(tmp_path):
+  store = AnalysisArtifactStore(tmp_path / "artifacts.sqlite3", version="v1")
+  assert store.get("user-1", "msg_1") == {}
+
+  store.save("user-1", "msg_1", routing={"primary_object": "deals"})
+  store.save("user-1", "msg_1", plan={"object_type": "deals"}, extraction=None)
+  assert store.get("user-1", "msg_1") == {"routing": {"primary_object": "deals"}, "plan": {"object_type": "deals"}}
+  assert store.get("user-2", "msg_1") == {}
+
+  # A fresh process reads the persisted artifact; a new prompt version does not.
+  reopened = AnalysisArtifactStore(tmp_path / "artifacts.sqlite3", version="v1")
+  assert reopened.get("user-1", "msg_1")["routing"] == {"primary_object": "deals"}
+  assert AnalysisArtifactStore(tmp_path / "artifacts.sqlite3", version="v2").get("user-1", "msg_1") == {}
+
+  store.invalidate("user-1", "msg_1")
+  assert store.get("user-1", "msg_1") == {}
+  assert (store.stats()["hits"], store.stats()["misses"], store.stats()["writes"]) == (1, 3, 2)
+
+
+def test_analysis_graph_reuses_stored_artifacts_unless_forced(monkeypatch, tmp_path):
+  store = AnalysisArtifactStore(tmp_path / "artifacts.sqlite3")
+  monkeypatch.setattr(pipeline_module, "analysis_store", store)
+  monkeypatch.setattr(pipeline_module, "stage_checkpoints", StageCheckpointStore(enabled=False))
+  calls = []
+
+  async def classify_and_extract(email, *, user_id=None, shortcuts_checked=False, use_cache=True):
+    calls.append((email.message_id, use_cache))
+    decision = RoutingDecision(primary_object="deals", confidence=0.9, intent="sales")
+    extraction = {"people": [{"name": "Jane Doe", "email": "jane@acme.com"}], "summary": "Quote", "evidence": "seats"}
+    return decision, json.dumps(extraction)
+
+  monkeypatch.setattr(pipeline_module.ai_router, "aclassify_and_extract", classify_and_extract)
+
+  def analyze(**kwargs):
+    done = asyncio.run(pipeline_module._analysis_graph("user-1", _message(), **kwargs).run())
+    return done["analysis"][0], done["extraction"], done["plan"]
+
+  routing, extraction, plan = analyze()
+  assert calls == [("msg_1", True)]
+  assert set(store.get("user-1", "msg_1")) == {"routing", "extraction", "plan"}
+
+  reused_routing, reused_extraction, reused_plan = analyze(note_override="Call back Monday")
+  assert calls == [("msg_1", True)]
+  assert reused_routing == routing
+  assert reused_extraction.model_dump() == extraction.model_dump()
+  assert reused_plan.note.body == "Call back Monday"
+  # The override is applied per request, not stored.
+  assert store.get("user-1", "msg_1")["plan"] == plan.model_dump()
+
+  # Forcing also skips Gemini's cached answer.
+  analyze(force=True)
+  assert calls == [("msg_1", True), ("msg_1", False)]
@@ -0,0 +1,50 @@
+from app.services.gemini_keys import GeminiKeyPool, parse_retry_after
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+def test_round_robin_spreads_first_choice():
+  pool = GeminiKeyPool(["k1", "k2", "k3"], clock=FakeClock())
+  first_choices = [pool.ordered()[0] for _ in range(6)]
+  assert first_choices == [0, 1, 2, 0, 1, 2]
+
+
+def test_least_loaded_key_preferred():
+  pool = GeminiKeyPool(["k1", "k2"], clock=FakeClock())
+  with pool.lease(0):
+    assert pool.ordered()[0] == 1
+
+
+def test_rate_limited_key_cools_down_honoring_retry_after():
+  clock = FakeClock()
+  pool = GeminiKeyPool(["k1", "k2"], clock=clock)
+  pool.record_failure(0, status=429, retry_after="20")
+  assert pool.ordered() == [1, 0]
+  assert pool.ordered() == [1, 0]
+
+  clock.now += 21
+  pool.record_success(1, 100.0)
+  assert sorted(pool.ordered()) == [0, 1]
+
+  stats = pool.stats()
+  assert stats[0]["failures"] == 1
+  assert stats[1]["success_rate"] == 1.0
+  assert stats[1]["avg_latency_ms"] == 100.0
+  assert "k1" not in repr(stats)
+
+
+def test_client_errors_do_not_cool_down():
+  pool = GeminiKeyPool(["k1", "k2"], clock=FakeClock())
+  pool.record_failure(0, status=400)
+  assert pool.stats()[0]["cooling_down"] is False
+
+
+def test_parse_retry_after_http_date():
+  assert parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412500.0) == 10.0
+  assert parse_retry_after("garbage") is None
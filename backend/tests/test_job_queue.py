@@ -0,0 +1,121 @@
+import asyncio
+
+from app.background import pipeline_worker as pipeline_worker_module
+from app.background.pipeline_worker import PipelineWorker
+from app.storage.job_queue import SqliteJobQueue
+
+
+def test_claim_heartbeat_and_complete(tmp_path):
+  queue = SqliteJobQueue(tmp_path / "jobs.sqlite3", lease_seconds=60)
+  job = queue.enqueue("user-1", "pipeline_run", {"max_results": 5})
+
+  claimed = queue.claim("worker-a")
+  assert claimed.id == job.id and claimed.status == "running" and claimed.attempts == 1
+  assert claimed.payload == {"max_results": 5}
+  # Leased jobs are not handed out twice.
+  assert queue.claim("worker-b") is None
+
+  assert queue.heartbeat(job.id, "worker-a", {"processed": 2}) is True
+  assert queue.heartbeat(job.id, "worker-b", {"processed": 9}) is False
+  assert queue.get(job.id).progress == {"processed": 2}
+
+  queue.complete(job.id, "worker-a", {"processed": 5}, progress={"processed": 5})
+  done = queue.get(job.id)
+  assert (done.status, done.result, done.progress) == ("succeeded", {"processed": 5}, {"processed": 5})
+  assert [item.id for item in queue.list_jobs("user-1")] == [job.id]
+  assert queue.list_jobs("user-2") == []
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(tmp_path):
+  queue = SqliteJobQueue(tmp_path / "jobs.sqlite3", lease_seconds=-1, max_attempts=2)
+  job = queue.enqueue("user-1", "pipeline_run", {})
+
+  assert queue.claim("worker-a").attempts == 1
+  retried = queue.claim("worker-b")
+  assert (retried.id, retried.worker_id, retried.attempts) == (job.id, "worker-b", 2)
+  # The first worker lost the job and can no longer finish it.
+  assert queue.complete(job.id, "worker-a", {"processed": 1}) is False
+  assert queue.get(job.id).status == "running"
+
+  assert queue.claim("worker-c") is None
+  failed = queue.get(job.id)
+  assert failed.status == "failed" and "Lease expired" in failed.error
+
+
+def test_worker_runs_handlers_and_records_failures(tmp_path):
+  queue = SqliteJobQueue(tmp_path / "jobs.sqlite3")
+
+  async def handler(job, report):
+    report({"stage": "processing", "total": 2, "processed": 2})
+    if job.payload.get("explode"):
+      raise RuntimeError("Gmail is down")
+    return {"processed": 2}
+
+  worker = PipelineWorker(queue, handlers={"pipeline_run": handler}, worker_id="worker-a")
+  queue.enqueue("user-1", "pipeline_run", {})
+  queue.enqueue("user-1", "pipeline_run", {"explode": True})
+  queue.enqueue("user-1", "mystery", {})
+
+  done = asyncio.run(worker.run_once())
+  assert done.status == "succeeded" and done.result == {"processed": 2}
+  assert done.progress["processed"] == 2
+
+  failed = asyncio.run(worker.run_once())
+  assert (failed.status, failed.error) == ("failed", "Gmail is down")
+  assert failed.progress["stage"] == "processing"
+
+  unknown = asyncio.run(worker.run_once())
+  assert unknown.status == "failed" and "Unknown job kind" in unknown.error
+  assert asyncio.run(worker.run_once()) is None
+
+
+def test_worker_stops_while_slots_are_busy_and_abandons_lost_leases(monkeypatch, tmp_path):
+  queue = SqliteJobQueue(tmp_path / "jobs.sqlite3")
+  monkeypatch.setattr(pipeline_worker_module, "HEARTBEAT_SECONDS", 0.01)
+  started, cancelled = asyncio.Event(), []
+
+  async def handler(job, report):
+    started.set()
+    try:
+      await asyncio.sleep(60)
+    except asyncio.CancelledError:
+      cancelled.append(job.id)
+      raise
+
+  worker = PipelineWorker(queue, handlers={"pipeline_run": handler}, worker_id="worker-a", poll_interval=0.01)
+  first = queue.enqueue("user-1", "pipeline_run", {})
+
+  async def stop_when_busy():
+    stop = asyncio.Event()
+    runner = asyncio.create_task(worker.run(stop))
+    await started.wait()
+    stop.set()
+    await asyncio.wait_for(runner, timeout=1)
+
+  asyncio.run(stop_when_busy())
+  assert cancelled == [first.id]
+
+  # Another worker takes the job over; the first one cancels its handler instead of finishing it.
+  second = queue.enqueue("user-1", "pipeline_run", {})
+  claimed = queue.claim("worker-a")
+  monkeypatch.setattr(queue, "heartbeat", lambda job_id, worker_id, progress: False)
+  asyncio.run(asyncio.wait_for(worker._run_job(claimed), timeout=1))
+  assert cancelled[-1] == claimed.id and queue.get(second.id).status == "running"
+
+
+def test_run_rejects_users_without_gmail_before_queueing(monkeypatch, tmp_path):
+  from fastapi.testclient import TestClient
+
+  from app.main import app
+  from app.routers import pipeline as pipeline_module
+
+  queue = SqliteJobQueue(tmp_path / "jobs.sqlite3")
+  monkeypatch.setattr(pipeline_module, "job_queue", queue)
+
+  def ensure_ready(user_id):
+    raise RuntimeError("Gmail is not connected for this user.")
+
+  monkeypatch.setattr(pipeline_module.gmail_ingestor, "ensure_ready", ensure_ready)
+  response = TestClient(app).post("/api/pipeline/run", json={"user_id": "user-1"})
+  assert response.status_code == 400 and "not connected" in response.json()["detail"]
+  assert queue.list_jobs("user-1") == []
@@ -0,0 +1,66 @@
+import asyncio
+from functools import partial
+
+import pytest
+
+from app.services import validator as validator_module
+from app.services.json_repair import coerce_extraction, lenient_loads
+from app.services.validator import ValidationService
+from tests.conftest import make_message
+
+
+_message = partial(make_message, "msg_repair", "body", subject="Order", sender="a@b.com")
+
+
+def test_lenient_loads_fixes_common_slips():
+  assert lenient_loads('```json\n{"a": [1, 2,],}\n```') == {"a": [1, 2]}
+  assert lenient_loads("Here you go: {'a': 'it\\'s', 'b': None, 'c': True}") == {"a": "it's", "b": None, "c": True}
+  with pytest.raises(ValueError):
+    lenient_loads("not json at all")
+
+
+def test_coerce_extraction_shapes():
+  fixed = coerce_extraction(
+    {
+      "people": "Jane Doe <jane@acme.com>",
+      "company": "Acme",
+      "amount": 5000,
+      "dates": None,
+      "next_steps": "Send contract",
+      "summary": None,
+      "evidence": "quote",
+    }
+  )
+  assert fixed["people"] == [{"name": "Jane Doe", "email": "jane@acme.com"}]
+  assert fixed["company"] == {"name": "Acme"}
+  assert fixed["amount"] == "5000"
+  assert fixed["dates"] == []
+  assert fixed["next_steps"] == ["Send contract"]
+  assert fixed["summary"] == ""
+
+
+def test_validator_repairs_locally_without_llm(monkeypatch):
+  def fail(*args, **kwargs):
+    raise AssertionError("remote repair should not run")
+
+  monkeypatch.setattr(validator_module.async_gemini_client, "repair", fail)
+  service = ValidationService()
+
+  raw = "```json\n{'summary': 's', 'evidence': 'e', 'amount': 12.5, 'dates': null,}\n```"
+  extraction = asyncio.run(service.avalidate(_message(), raw))
+
+  assert extraction.amount == "12.5"
+  assert service.repair_stats() == {"local": 1, "remote": 0}
+
+
+def test_validator_falls_back_to_llm_for_schema_miss(monkeypatch):
+  async def repair(email, error, **kwargs):
+    return '{"summary": "s", "evidence": "e"}'
+
+  monkeypatch.setattr(validator_module.async_gemini_client, "repair", repair)
+  service = ValidationService()
+
+  extraction = asyncio.run(service.avalidate(_message(), '{"summary": "s"}'))
+
+  assert extraction.evidence == "e"
+  assert service.repair_stats() == {"local": 0, "remote": 1}
@@ -0,0 +1,113 @@
+import json
+from functools import partial
+
+from app.routers.pipeline import _build_supabase_row
+from app.services import ai_router as ai_router_module
+from app.services.ai_router import ai_router
+from app.services.learned_router import (
+  KnnRoutingModel,
+  LearnedRouter,
+  TrainingExample,
+  evaluate,
+  example_from_row,
+  split_holdout,
+)
+from tests.conftest import make_message
+
+SUPPORT = "Our dashboard login is broken again, users see error {n} after the update. Please fix urgently."
+SALES = "We would like pricing for {n} seats on the enterprise plan and a call with your sales team."
+
+
+def _decision(primary, crm="hubspot", intent="other"):
+  return {"primary_object": primary, "target_crm": [crm], "intent": intent, "urgency": "medium", "confidence": 0.9, "confirmed_by_user": True}
+
+
+def _examples():
+  examples = []
+  for n in range(12):
+    examples.append(TrainingExample("Login broken", f"ops{n}@client.com", SUPPORT.format(n=n), "tickets|hubspot", _decision("tickets", intent="support"), f"t{n}"))
+    examples.append(TrainingExample("Enterprise pricing", f"buyer{n}@prospect.io", SALES.format(n=n), "deals|hubspot", _decision("deals", intent="sales"), f"d{n}"))
+  return examples
+
+
+_message = partial(make_message, subject="Login broken", sender="new@client.com", snippet="snippet")
+
+
+def test_knn_model_predicts_batch_and_round_trips(tmp_path):
+  model = KnnRoutingModel.train(_examples())
+  emails = [
+    _message("q1", SUPPORT.format(n=99)),
+    _message("q2", SALES.format(n=40), subject="Enterprise pricing", sender="cfo@prospect.io"),
+    _message("q3", "Lunch on friday?", subject="hey", sender="friend@gmail.com"),
+  ]
+  predictions = model.predict(emails)
+  assert [p.label for p in predictions[:2]] == ["tickets|hubspot", "deals|hubspot"]
+  assert predictions[0].confidence > 0.9
+  assert predictions[0].decision["intent"] == "support"
+  assert predictions[2].confidence == 0.0
+
+  model.save(tmp_path / "model.npz")
+  reloaded = KnnRoutingModel.load(tmp_path / "model.npz")
+  assert [p.label for p in reloaded.predict(emails)] == [p.label for p in predictions]
+
+
+def test_holdout_report():
+  train_set, holdout = split_holdout(_examples(), 0.25)
+  assert holdout and train_set
+  report = evaluate(KnnRoutingModel.train(train_set), holdout, min_confidence=0.8)
+  assert report["holdout"] == len(holdout)
+  assert report["accuracy"] == 1.0
+  assert report["coverage"] == 1.0
+
+
+def test_example_from_row_keeps_only_confirmed_model_decisions():
+  row = {"message_id": "m1", "subject": "s", "sender": "a@b.com", "preview": "body", "ai_routing_decision": json.dumps(_decision("deals"))}
+  assert example_from_row(row).label == "deals|hubspot"
+  assert example_from_row({**row, "ai_routing_decision": {**_decision("none"), "source": "rule:newsletter"}}) is None
+  assert example_from_row({**row, "ai_routing_decision": None}) is None
+  # The router's own and copied decisions are not labels, and neither is anything a user never confirmed.
+  for source in ("learned", "dedupe:m0"):
+    assert example_from_row({**row, "ai_routing_decision": {**_decision("deals"), "source": source}}) is None
+  assert example_from_row({**row, "ai_routing_decision": {**_decision("deals"), "confirmed_by_user": False}}) is None
+
+
+def test_accepted_rows_train_on_the_text_prediction_reads():
+  body = "Hello there, " * 30 + "we need an enterprise renewal quote for our warehouse scanners."
+  message = _message("m-acc", body, subject="Renewal", sender="ops@warehouse.io")
+  row = _build_supabase_row(
+    user_id="user-1", message=message, status="ai_analyzed", routing=_decision("deals"), hubspot_result={}, updated_at="now"
+  )
+  example = example_from_row(row)
+  # Beyond the Gmail snippet: the distinctive words sit past its ~200 characters.
+  assert "warehouse scanners" in example.body
+
+  (prediction,) = KnnRoutingModel.train([example, *_examples()]).predict([message])
+  assert prediction.label == "deals|hubspot" and prediction.similarity == 1.0
+
+
+def test_confident_prediction_skips_llm(monkeypatch, tmp_path):
+  router = LearnedRouter(tmp_path, min_confidence=0.8)
+  router.save("user-1", KnnRoutingModel.train(_examples()))
+  monkeypatch.setattr(ai_router_module, "learned_router", router)
+
+  def fail(*args, **kwargs):
+    raise AssertionError("LLM routing should not be called")
+
+  monkeypatch.setattr(ai_router_module.gemini_client, "classify_email_route", fail)
+
+  decision = ai_router.classify(_message("q1", SUPPORT.format(n=7)), user_id="user-1")
+  assert decision.source == "learned"
+  assert decision.primary_object == "tickets"
+  assert router.stats()["confident"] == 1
+
+  calls = []
+
+  def classify_email_route(email, **kwargs):
+    calls.append(kwargs)
+    return json.dumps(_decision("contacts"))
+
+  monkeypatch.setattr(ai_router_module.gemini_client, "classify_email_route", classify_email_route)
+  decision = ai_router.classify(_message("q2", "Lunch on friday?", subject="hey", sender="friend@gmail.com"), user_id="user-1")
+  assert decision.source == "llm"
+  # Attributed to the user so the per-user telemetry covers the sync (Salesforce) path too.
+  assert calls[0]["user_id"] == "user-1"
@@ -0,0 +1,59 @@
+from app.storage.llm_cache import LlmResponseCache, make_cache_key
+
+
+def test_cache_key_depends_on_prompt_version():
+  config = {"temperature": 0.2}
+  key_v1 = make_cache_key("gemini-2.0-flash", config, "analysis-v1", "prompt")
+  key_v2 = make_cache_key("gemini-2.0-flash", config, "analysis-v2", "prompt")
+  assert key_v1 != key_v2
+  assert key_v1 == make_cache_key("gemini-2.0-flash", {"temperature": 0.2}, "analysis-v1", "prompt")
+
+
+def test_cache_tiers_and_hit_rates(tmp_path):
+  path = tmp_path / "cache.sqlite3"
+  cache = LlmResponseCache(path, max_entries=1)
+  assert cache.get("a", "analysis") is None
+  cache.set("a", "analysis", '{"summary": "a"}')
+  cache.set("b", "routing", '{"primary_object": "deals"}')
+
+  # "a" was evicted from the LRU tier but is still served from SQLite.
+  assert cache.get("a", "analysis") == '{"summary": "a"}'
+  assert cache.get("a", "analysis") == '{"summary": "a"}'
+
+  stats = cache.stats()["analysis"]
+  assert stats["misses"] == 1
+  assert stats["persistent_hits"] == 1
+  assert stats["memory_hits"] == 1
+  assert stats["hit_rate"] == round(2 / 3, 4)
+
+  fresh = LlmResponseCache(path)
+  assert fresh.get("b", "routing") == '{"primary_object": "deals"}'
+
+
+def test_expired_entries_are_not_served(tmp_path):
+  cache = LlmResponseCache(tmp_path / "cache.sqlite3", ttl_seconds=-1)
+  cache.set("a", "repair", "{}")
+  assert cache.get("a", "repair") is None
+
+
+def test_client_caches_only_parseable_non_repair_responses(monkeypatch, tmp_path):
+  from app.services import llm as llm_module
+
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(tmp_path / "cache.sqlite3"))
+  client = llm_module.GeminiClient()
+  answers = iter(['{"summary": ', '{"summary": "ok"}', '{"summary": "fixed"}', '{"summary": "fixed again"}'])
+  requests = []
+
+  def request(prompt, message_id, purpose, call=None):
+    requests.append(purpose)
+    return next(answers)
+
+  monkeypatch.setattr(client, "_request", request)
+  # A truncated answer is returned to the caller but not replayed from the cache.
+  assert client._invoke("prompt", "msg_1", "analysis") == '{"summary": '
+  assert client._invoke("prompt", "msg_1", "analysis") == '{"summary": "ok"}'
+  assert client._invoke("prompt", "msg_1", "analysis") == '{"summary": "ok"}'
+  # Each repair attempt goes back to the model.
+  assert client._invoke("repair", "msg_1", "repair") == '{"summary": "fixed"}'
+  assert client._invoke("repair", "msg_1", "repair") == '{"summary": "fixed again"}'
+  assert requests == ["analysis", "analysis", "repair", "repair"]
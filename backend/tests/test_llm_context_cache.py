@@ -0,0 +1,86 @@
+import asyncio
+
+from app.services import llm as llm_module
+from app.services.gemini_keys import GeminiKeyPool
+from app.services.llm import COMBINED_INSTRUCTIONS, AsyncGeminiClient
+from app.services.llm_context_cache import UNAVAILABLE_RETRY_SECONDS, ContextCacheRegistry
+from app.storage.llm_cache import LlmResponseCache
+from tests.conftest import make_message
+from tests.gemini_stand_in import GeminiStandIn
+
+COMBINED = '{"routing": {"primary_object": "deals"}, "extraction": {"summary": "s", "evidence": "e"}}'
+
+
+def _run(monkeypatch, stand_in, registry, *message_ids):
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(enabled=False))
+  monkeypatch.setattr(llm_module, "context_cache", registry)
+  monkeypatch.setattr(llm_module.settings, "llm_streaming_enabled", False)
+
+  async def scenario():
+    client = AsyncGeminiClient(max_in_flight=2)
+    client.endpoint = stand_in.url
+    client.key_pool = GeminiKeyPool(["key-a"])
+    for message_id in message_ids:
+      await client.analyze_and_route(make_message(message_id, f"Please send a quote for {message_id}."))
+    await client.aclose()
+
+  asyncio.run(scenario())
+
+
+def _prompt(request) -> str:
+  return request["body"]["contents"][0]["parts"][0]["text"]
+
+
+def test_registry_claims_refreshes_and_backs_off():
+  now = [0.0]
+  registry = ContextCacheRegistry(ttl_seconds=600, clock=lambda: now[0])
+  slot = (0, "m", "routing", "routing-v1")
+
+  assert registry.acquire(slot) == (None, "create")
+  assert registry.acquire(slot) == (None, None)  # someone else is creating it; go inline
+  handle = registry.store(slot, "cachedContents/a")
+  assert registry.acquire(slot) == (handle, None)
+
+  now[0] = 600 - registry.refresh_margin + 1
+  assert registry.acquire(slot) == (handle, "refresh")
+  registry.fail(slot, "status 500")
+  assert registry.acquire(slot) == (handle, None)
+
+  now[0] = 601
+  assert registry.acquire(slot) == (None, None)  # expired, and still backing off after the failure
+  now[0] += UNAVAILABLE_RETRY_SECONDS
+  assert registry.acquire(slot) == (None, "create")
+
+
+def test_instructions_are_sent_once_and_referenced_after(monkeypatch):
+  usage = {"promptTokenCount": 1200, "candidatesTokenCount": 40}
+  with GeminiStandIn(COMBINED, usage=usage) as stand_in:
+    _run(monkeypatch, stand_in, ContextCacheRegistry(), "m1", "m2")
+
+  (create,) = stand_in.cache_requests
+  assert create["body"]["contents"][0]["parts"][0]["text"] == COMBINED_INSTRUCTIONS
+  assert create["body"]["ttl"] == "3600s"
+  for request in stand_in.requests:
+    assert request["body"]["cachedContent"] == "cachedContents/c0"
+    assert COMBINED_INSTRUCTIONS not in _prompt(request)
+    assert "m1" in _prompt(request) or "m2" in _prompt(request)
+
+
+def test_falls_back_inline_when_caching_is_unavailable_or_rejected(monkeypatch):
+  with GeminiStandIn(COMBINED, context_caching=False) as stand_in:
+    registry = ContextCacheRegistry()
+    _run(monkeypatch, stand_in, registry, "m1", "m2")
+  assert len(stand_in.cache_requests) == 1  # not retried until the back-off ends
+  assert all(COMBINED_INSTRUCTIONS in _prompt(r) and "cachedContent" not in r["body"] for r in stand_in.requests)
+  assert registry.stats()["inline"] == 2
+
+  with GeminiStandIn(COMBINED) as stand_in:
+    registry = ContextCacheRegistry()
+    slot = (0, llm_module.settings.gemini_model, "combined", llm_module.PROMPT_VERSIONS["combined"])
+    registry.acquire(slot)
+    registry.store(slot, "cachedContents/deleted")
+    _run(monkeypatch, stand_in, registry, "m1")
+  first, retry = stand_in.requests
+  assert first["body"]["cachedContent"] == "cachedContents/deleted"
+  assert "cachedContent" not in retry["body"] and COMBINED_INSTRUCTIONS in _prompt(retry)
+  assert registry.stats()["invalidated"] == 1
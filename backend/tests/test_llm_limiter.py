@@ -0,0 +1,45 @@
+import asyncio
+
+from app.services.llm_limiter import FairConcurrencyLimiter
+
+
+def test_limiter_caps_in_flight_and_alternates_tenants():
+  async def scenario():
+    limiter = FairConcurrencyLimiter(1)
+    order = []
+    peak = 0
+
+    async def job(tenant, idx):
+      nonlocal peak
+      async with limiter.slot(tenant):
+        peak = max(peak, limiter.in_flight)
+        order.append((tenant, idx))
+        await asyncio.sleep(0)
+
+    await limiter.acquire("bulk")
+    tasks = [asyncio.create_task(job("bulk", i)) for i in range(3)]
+    tasks.append(asyncio.create_task(job("interactive", 0)))
+    await asyncio.sleep(0)
+    limiter.release()
+    await asyncio.gather(*tasks)
+    return order, peak, limiter.in_flight
+
+  order, peak, in_flight = asyncio.run(scenario())
+  assert peak == 1
+  assert in_flight == 0
+  # The interactive user is served right after the first queued bulk job, not after all of them.
+  assert order[:2] == [("bulk", 0), ("interactive", 0)]
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+  async def scenario():
+    limiter = FairConcurrencyLimiter(1)
+    await limiter.acquire("a")
+    waiter = asyncio.create_task(limiter.acquire("b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    limiter.release()
+    return limiter.in_flight
+
+  assert asyncio.run(scenario()) == 0
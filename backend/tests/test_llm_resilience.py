@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from app.services import ai_router as ai_router_module
+from app.services import llm as llm_module
+from app.services.gemini_keys import GeminiKeyPool
+from app.services.llm import AsyncGeminiClient
+from app.services.llm_resilience import BreakerRegistry, CircuitBreaker, CircuitOpenError, hedged
+from app.storage.llm_cache import LlmResponseCache
+from tests.conftest import make_message
+from tests.gemini_stand_in import GeminiStandIn
+
+
+def test_breaker_opens_then_probes_once():
+  now = [0.0]
+  breaker = CircuitBreaker("m@e", failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+  breaker.before_call()
+  breaker.record_failure()
+  breaker.record_success()
+  breaker.record_failure()
+  assert breaker.state == "closed"
+  breaker.record_failure()
+  assert breaker.state == "open"
+  with pytest.raises(CircuitOpenError):
+    breaker.before_call()
+
+  now[0] = 10.0
+  breaker.before_call()  # the single half-open probe
+  with pytest.raises(CircuitOpenError):
+    breaker.before_call()
+  breaker.record_failure()
+  assert breaker.state == "open"
+
+  now[0] = 20.0
+  breaker.before_call()
+  breaker.record_success()
+  assert breaker.state == "closed"
+  assert breaker.stats()["opened"] == 2
+
+
+def test_hedge_wins_and_cancels_the_slow_copy():
+  calls, cancelled = [], []
+
+  async def attempt():
+    calls.append(len(calls))
+    try:
+      await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+    except asyncio.CancelledError:
+      cancelled.append(True)
+      raise
+    return len(calls)
+
+  result, fired = asyncio.run(hedged(attempt, 0.05))
+  assert (result, fired) == (2, True)
+  assert cancelled == [True]
+
+  assert asyncio.run(hedged(lambda: asyncio.sleep(0, result="fast"), 0.05)) == ("fast", False)
+
+
+def test_open_breaker_fails_fast_and_router_falls_back(monkeypatch):
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(enabled=False))
+  monkeypatch.setattr(llm_module, "breaker_registry", BreakerRegistry(failure_threshold=2, reset_timeout=60))
+  monkeypatch.setattr(llm_module.settings, "llm_streaming_enabled", False)
+  message = make_message("msg_outage", snippet="snippet")
+
+  async def scenario(stand_in):
+    client = AsyncGeminiClient(max_in_flight=1)
+    client.endpoint = stand_in.url
+    client.key_pool = GeminiKeyPool(["key-a"])
+    for _ in range(2):
+      with pytest.raises(llm_module.GeminiUnavailableError):
+        await client._invoke("prompt", "msg_1", "routing")
+    with pytest.raises(CircuitOpenError):
+      await client._invoke("prompt", "msg_2", "routing")
+
+    monkeypatch.setattr(ai_router_module, "async_gemini_client", client)
+    result = await ai_router_module.ai_router.aclassify_and_extract(message, user_id=None, shortcuts_checked=True)
+    await client.aclose()
+    return result
+
+  with GeminiStandIn("{}", statuses=[503, 503, 503, 503]) as stand_in:
+    routing, extraction = asyncio.run(scenario(stand_in))
+    # Two failing calls reached the server; the fail-fast ones did not.
+    assert len(stand_in.requests) == 2
+
+  assert routing.source == "fallback"
+  assert extraction
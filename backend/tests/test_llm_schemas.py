@@ -0,0 +1,69 @@
+import dataclasses
+import json
+import typing
+
+import pytest
+
+from app.services.ai_router import RoutingDecision
+from app.services.llm_schemas import (
+  RESPONSE_SCHEMAS,
+  CombinedPayload,
+  ExtractionPayload,
+  PackedRoutingEntry,
+  RoutingPayload,
+  SheetsEnrichment,
+)
+from app.services.validator import ValidatedExtraction
+
+SCHEMA_MODELS = {
+  "analysis": ExtractionPayload,
+  "repair": ExtractionPayload,
+  "routing": RoutingPayload,
+  "combined": CombinedPayload,
+  "sheets_enrichment": SheetsEnrichment,
+}
+
+
+def _assert_matches(schema, model):
+  assert schema["type"] == "OBJECT"
+  assert set(schema["properties"]) == set(model.model_fields)
+  assert schema["propertyOrdering"] == list(model.model_fields)
+  required = {name for name, info in model.model_fields.items() if info.is_required()}
+  assert set(schema.get("required", [])) == required
+  for name, info in model.model_fields.items():
+    annotation = info.annotation
+    prop = schema["properties"][name]
+    if typing.get_origin(annotation) is typing.Literal:
+      assert prop["enum"] == [str(value) for value in typing.get_args(annotation)]
+    nested = next((arg for arg in typing.get_args(annotation) if isinstance(arg, type) and hasattr(arg, "model_fields")), None)
+    if isinstance(annotation, type) and hasattr(annotation, "model_fields"):
+      _assert_matches(prop, annotation)
+    elif nested is not None:
+      _assert_matches(prop["items"] if prop["type"] == "ARRAY" else prop, nested)
+
+
+@pytest.mark.parametrize("purpose", sorted(SCHEMA_MODELS))
+def test_schema_matches_model(purpose):
+  _assert_matches(RESPONSE_SCHEMAS[purpose], SCHEMA_MODELS[purpose])
+
+
+def test_packed_routing_schema_is_array_of_entries():
+  schema = RESPONSE_SCHEMAS["routing_batch"]
+  assert schema["type"] == "ARRAY"
+  _assert_matches(schema["items"], PackedRoutingEntry)
+
+
+def test_schemas_use_only_gemini_supported_keywords():
+  dumped = json.dumps(RESPONSE_SCHEMAS)
+  for keyword in ("$ref", "$defs", "title", "default", "additionalProperties"):
+    assert f'"{keyword}"' not in dumped
+
+
+def test_payload_models_line_up_with_runtime_types():
+  extraction_fields = set(ValidatedExtraction.model_fields) - {"message_id", "routing_decision"}
+  assert extraction_fields == set(ExtractionPayload.model_fields)
+  for name in extraction_fields:
+    assert ValidatedExtraction.model_fields[name].annotation == ExtractionPayload.model_fields[name].annotation
+
+  decision_fields = {field.name for field in dataclasses.fields(RoutingDecision)}
+  assert set(RoutingPayload.model_fields) <= decision_fields
@@ -0,0 +1,83 @@
+import asyncio
+import json
+from functools import partial
+
+from app.services import llm as llm_module
+from app.services.gemini_keys import GeminiKeyPool
+from app.services.json_stream import IncrementalJsonParser
+from app.services.llm import AsyncGeminiClient
+from app.storage.llm_cache import LlmResponseCache
+from tests.conftest import make_message
+from tests.gemini_stand_in import GeminiStandIn
+
+COMBINED = json.dumps(
+  {
+    "routing": {"target_crm": ["hubspot"], "primary_object": "deals", "confidence": 0.92, "reasoning": "quote request"},
+    "extraction": {"people": [], "summary": "Quote for 50 seats " + "x" * 400, "evidence": "quote"},
+  }
+)
+
+
+_message = partial(make_message, "msg_stream", snippet="snippet")
+
+
+def test_incremental_parser_reports_values_as_they_complete():
+  parser = IncrementalJsonParser([("routing", "primary_object"), ("routing",), ("items", 1, "k")])
+  doc = '{"routing": {"primary_object": "dea\\"ls", "nested": {"a": [1, 2]}}, "items": [0, {"k": true}]}'
+  seen = []
+  for idx, char in enumerate(doc):
+    for path, value in parser.feed(char):
+      seen.append((path, value, idx))
+
+  assert seen[0][:2] == (("routing", "primary_object"), 'dea"ls')
+  assert seen[0][2] < doc.index('"nested"')
+  assert seen[1][:2] == (("routing",), {"primary_object": 'dea"ls', "nested": {"a": [1, 2]}})
+  assert seen[2][:2] == (("items", 1, "k"), True)
+
+
+def test_stream_surfaces_routing_before_response_ends(monkeypatch):
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(enabled=False))
+
+  async def scenario(stand_in):
+    client = AsyncGeminiClient(max_in_flight=2)
+    client.endpoint = stand_in.url
+    client.key_pool = GeminiKeyPool(["key-a", "key-b"])
+    early = []
+    text = await client.analyze_and_route(
+      _message(), user_id="user-1", on_routing=lambda fields: early.append((fields, stand_in.chunks_sent))
+    )
+    await client.aclose()
+    return text, early
+
+  with GeminiStandIn(COMBINED, chunk_size=24, chunk_delay=0.01, statuses=[429]) as stand_in:
+    text, early = asyncio.run(scenario(stand_in))
+    total_chunks = stand_in.chunks_sent
+    requests = stand_in.requests
+
+  assert text == COMBINED
+  assert len(early) == 1
+  fields, chunks_at_callback = early[0]
+  assert fields == {"primary_object": "deals", "target_crm": ["hubspot"], "confidence": 0.92}
+  assert chunks_at_callback < total_chunks
+  # The throttled first key was rotated away from; the retry streamed over SSE.
+  assert [r["query"]["key"][0] for r in requests] == ["key-a", "key-b"]
+  assert all(r["path"].endswith(":streamGenerateContent") and r["query"]["alt"] == ["sse"] for r in requests)
+
+
+def test_callback_fires_without_streaming(monkeypatch):
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(enabled=False))
+  monkeypatch.setattr(llm_module.settings, "llm_streaming_enabled", False)
+
+  async def scenario(stand_in):
+    client = AsyncGeminiClient(max_in_flight=1)
+    client.endpoint = stand_in.url
+    client.key_pool = GeminiKeyPool(["key-a"])
+    early = []
+    await client.analyze_and_route(_message(), on_routing=early.append)
+    await client.aclose()
+    return early
+
+  with GeminiStandIn(COMBINED) as stand_in:
+    early = asyncio.run(scenario(stand_in))
+    assert stand_in.requests[0]["path"].endswith(":generateContent")
+  assert early == [{"primary_object": "deals", "target_crm": ["hubspot"], "confidence": 0.92}]
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app.services import llm as llm_module
+from app.services.gemini_keys import GeminiKeyPool
+from app.services.llm import AsyncGeminiClient
+from app.services.llm_telemetry import LlmCall, LlmTelemetry
+from app.storage.llm_cache import LlmResponseCache
+from tests.gemini_stand_in import GeminiStandIn
+
+
+def test_summary_percentiles_costs_and_groups():
+  now = [0.0]
+  telemetry = LlmTelemetry(input_price_per_mtok=1.0, output_price_per_mtok=2.0, interval=10, clock=lambda: now[0])
+  for latency in range(1, 101):
+    telemetry.record(
+      LlmCall(purpose="routing", model="m", user_id="u1", latency_ms=float(latency), prompt_tokens=1000, response_tokens=500, attempts=1)
+    )
+  telemetry.record(LlmCall(purpose="routing", model="m", user_id="u2", outcome="cache_hit", latency_ms=0.1, prompt_tokens=1000))
+  telemetry.record(LlmCall(purpose="analysis", model="m", user_id="u2", outcome="error", latency_ms=5.0, attempts=3))
+
+  by_purpose = telemetry.summary("purpose")
+  routing = by_purpose["groups"]["routing"]
+  assert routing["calls"] == 101
+  assert routing["cache_hit"] == 1
+  assert routing["latency_ms"]["p50"] == pytest.approx(50.5)
+  assert routing["latency_ms"]["p99"] == pytest.approx(99.01)
+  # 100 billed calls x (1000 in @ $1/M + 500 out @ $2/M); the cache hit is free.
+  assert routing["cost_usd"] == pytest.approx(0.2)
+  assert by_purpose["groups"]["analysis"]["error"] == 1
+
+  by_user = telemetry.summary("user")
+  assert by_user["groups"]["u2"]["calls"] == 2
+
+  # Aggregates are reused within the interval and refreshed after it.
+  telemetry.record(LlmCall(purpose="routing", model="m", latency_ms=1.0))
+  assert telemetry.summary("purpose")["groups"]["routing"]["calls"] == 101
+  now[0] = 11.0
+  assert telemetry.summary("purpose")["groups"]["routing"]["calls"] == 102
+
+
+def test_ring_buffer_keeps_recent_calls_and_lifetime_totals():
+  telemetry = LlmTelemetry(capacity=2)
+  for idx in range(3):
+    telemetry.record(LlmCall(purpose="routing", model="m", message_id=f"m{idx}"))
+  assert [call["message_id"] for call in telemetry.recent()] == ["m2", "m1"]
+  summary = telemetry.summary(fresh=True)
+  assert summary["window_calls"] == 2
+  assert summary["groups"]["routing"]["calls"] == 3
+
+
+def test_client_records_usage_attempts_and_key_index(monkeypatch):
+  telemetry = LlmTelemetry()
+  monkeypatch.setattr(llm_module, "llm_telemetry", telemetry)
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(enabled=False))
+  usage = {"promptTokenCount": 120, "candidatesTokenCount": 30, "totalTokenCount": 150}
+
+  async def scenario(stand_in):
+    client = AsyncGeminiClient(max_in_flight=1)
+    client.endpoint = stand_in.url
+    client.key_pool = GeminiKeyPool(["key-a", "key-b"])
+    await client._invoke("prompt", "msg_1", "routing", user_id="user-1")
+    await client.aclose()
+
+  with GeminiStandIn('{"primary_object": "deals"}', statuses=[503], usage=usage) as stand_in:
+    asyncio.run(scenario(stand_in))
+
+  (call,) = telemetry.recent()
+  assert call["outcome"] == "ok"
+  assert call["attempts"] == 2
+  assert call["key_index"] == 1
+  assert (call["prompt_tokens"], call["response_tokens"]) == (120, 30)
+  assert call["estimated_tokens"] is False
+  assert call["user_id"] == "user-1"
+  assert "key-b" not in str(call)
+
+
+def test_cached_prompt_tokens_bill_at_the_cached_rate():
+  telemetry = LlmTelemetry(input_price_per_mtok=1.0, output_price_per_mtok=2.0, cached_input_price_per_mtok=0.25)
+  call = LlmCall(purpose="combined", model="m", prompt_tokens=1200, cached_tokens=1000, response_tokens=100)
+  assert telemetry.cost(call) == pytest.approx((200 * 1.0 + 1000 * 0.25 + 100 * 2.0) / 1_000_000)
+
+
+def test_telemetry_endpoints_only_show_the_callers_calls(monkeypatch):
+  from fastapi.testclient import TestClient
+
+  from app.main import app
+  from app.routers import llm_metrics
+
+  telemetry = LlmTelemetry(input_price_per_mtok=1.0)
+  monkeypatch.setattr(llm_metrics, "llm_telemetry", telemetry)
+  telemetry.record(LlmCall(purpose="routing", model="m", user_id="u1", message_id="mine", prompt_tokens=1000))
+  telemetry.record(LlmCall(purpose="analysis", model="m", user_id="u2", message_id="theirs", prompt_tokens=9000))
+  client = TestClient(app)
+
+  assert client.get("/api/llm/telemetry").status_code == 401
+  summary = client.get("/api/llm/telemetry", params={"user_id": "u1"}).json()
+  assert list(summary["groups"]) == ["routing"] and summary["window_calls"] == 1
+  recent = client.get("/api/llm/telemetry/recent", params={"user_id": "u1"}).json()["calls"]
+  assert [call["message_id"] for call in recent] == ["mine"] and "user_id" not in recent[0]
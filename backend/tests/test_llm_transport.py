@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from app.services import llm as llm_module
+from app.services.gemini_keys import GeminiKeyPool
+from app.services.llm import AsyncGeminiClient, GeminiClient
+from app.services.llm_schemas import CombinedPayload, PackedRoutingEntry
+from app.storage.llm_cache import LlmResponseCache
+from tests.conftest import make_message
+from tests.gemini_stand_in import GeminiStandIn
+
+COMBINED = json.dumps(
+  {
+    "routing": {"target_crm": ["hubspot"], "primary_object": "deals", "confidence": 0.92},
+    "extraction": {"people": [], "summary": "Quote for 50 seats", "evidence": "quote"},
+  }
+)
+
+
+def _client(monkeypatch, mode: str, tmp_path, endpoint: str = "http://offline.invalid/models") -> AsyncGeminiClient:
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(enabled=False))
+  monkeypatch.setattr(llm_module.settings, "llm_transport_mode", mode)
+  monkeypatch.setattr(llm_module.settings, "llm_fixture_dir", str(tmp_path))
+  client = AsyncGeminiClient(max_in_flight=2)
+  client.endpoint = endpoint
+  client.key_pool = GeminiKeyPool(["key-a"])
+  return client
+
+
+def test_recorded_response_replays_offline_streamed_or_not(monkeypatch, tmp_path):
+  async def record(stand_in):
+    client = _client(monkeypatch, "record", tmp_path, stand_in.url)
+    monkeypatch.setattr(llm_module.settings, "llm_streaming_enabled", True)
+    text = await client.analyze_and_route(make_message(), on_routing=lambda fields: None)
+    await client.aclose()
+    return text
+
+  with GeminiStandIn(COMBINED, chunk_size=10, usage={"promptTokenCount": 9, "candidatesTokenCount": 3}) as stand_in:
+    assert asyncio.run(record(stand_in)) == COMBINED
+  (fixture,) = list(tmp_path.glob("*.json"))
+  assert "key-a" not in fixture.read_text()
+
+  async def replay():
+    client = _client(monkeypatch, "replay", tmp_path)
+    monkeypatch.setattr(llm_module.settings, "llm_streaming_enabled", False)
+    early = []
+    text = await client.analyze_and_route(make_message(), on_routing=early.append)
+    await client.aclose()
+    return text, early
+
+  text, early = asyncio.run(replay())
+  assert text == COMBINED
+  assert early == [{"primary_object": "deals", "target_crm": ["hubspot"], "confidence": 0.92}]
+
+  # Requests that were never recorded fail instead of reaching the network.
+  sync_client = GeminiClient()
+  sync_client.endpoint = "http://offline.invalid/models"
+  sync_client.key_pool = GeminiKeyPool(["key-a"])
+  try:
+    sync_client.analyze_email(make_message(body="Something else entirely."))
+  except RuntimeError as exc:
+    assert "404" in str(exc)
+  else:
+    raise AssertionError("expected a missing-fixture error")
+
+
+def test_synthetic_responses_match_schemas_and_are_deterministic(monkeypatch, tmp_path):
+  monkeypatch.setattr(llm_module.settings, "llm_transport_latency_ms", 30.0)
+
+  async def scenario():
+    client = _client(monkeypatch, "synthetic", tmp_path)
+    first = await client.analyze_and_route(make_message())
+    again = await client.analyze_and_route(make_message())
+    packed = await client.classify_email_routes({"e1": make_message("a"), "e2": make_message("b", "Invoice overdue")})
+    await client.aclose()
+    return first, again, packed
+
+  first, again, packed = asyncio.run(scenario())
+  assert first == again
+  CombinedPayload.model_validate_json(first)
+  entries = [PackedRoutingEntry.model_validate(entry) for entry in json.loads(packed)]
+  assert [entry.id for entry in entries] == ["e1", "e2"]
@@ -0,0 +1,92 @@
+import json
+from functools import partial
+
+from app.services.llm import KNOWN_FIELDS_INSTRUCTIONS, GeminiClient
+from app.services.local_extractor import LocalExtractor, organisation_domain
+from tests.conftest import make_message
+
+BODY = """Hi team,
+
+Could you send a quote for 120 seats? Budget is around $48,000 and we'd like to sign by March 15, 2026.
+
+Best regards,
+Jane Doe
+Head of Procurement | Acme Widgets, Inc.
+Tel: +1 (415) 555-0134
+www.acme.com
+
+On Mon, Jan 5, 2026 at 9:00 AM Sales <sales@ours.example> wrote:
+> Our list price is $99 per seat.
+"""
+
+
+_message = partial(make_message, body=BODY, subject="Quote for 120 seats")
+
+
+def test_sender_signature_company_amount_and_dates():
+  local = LocalExtractor().extract(_message(sender="Jane Doe <Jane.Doe@mail.acme.com>"))
+
+  assert local.people == [
+    {"name": "Jane Doe", "email": "jane.doe@mail.acme.com", "job_title": "Head of Procurement", "phone": "+1 (415) 555-0134"}
+  ]
+  assert local.company == {"name": "Acme Widgets, Inc.", "domain": "acme.com"}
+  # Quoted history is ignored, so the old list price does not win.
+  assert local.amount == "$48,000"
+  assert local.dates == ["March 15, 2026"]
+  assert organisation_domain("sales.acme.co.uk") == "acme.co.uk"
+
+
+def test_free_mail_sender_has_no_company_domain():
+  local = LocalExtractor().extract(_message(sender="bob@gmail.com", body="Hello\n\nThanks\nBob Smith\nFounder, Smith Labs Ltd"))
+
+  assert local.people == [{"name": "Bob Smith", "email": "bob@gmail.com", "job_title": "Founder"}]
+  assert local.company == {"name": "Smith Labs Ltd"}
+  assert local.amount is None and local.dates == []
+
+
+def test_forwarded_and_internal_mail_leave_the_lead_to_the_model():
+  extractor = LocalExtractor()
+  forwarded = extractor.extract(_message(sender="Sam Rep <sam@ours.example>", subject="FW: Quote for 120 seats"))
+  colleague = extractor.extract(_message(sender="Sam Rep <sam@ours.example>", recipients=["Me <me@mail.ours.example>"]))
+
+  for local in (forwarded, colleague):
+    assert local.people == [] and local.company is None
+    assert local.amount == "$48,000"
+  # A lead who happens to write to a free-mail user is still the sender.
+  external = extractor.extract(_message(sender="Jane Doe <jane.doe@acme.com>", recipients=["me@gmail.com"]))
+  assert external.people[0]["email"] == "jane.doe@acme.com"
+
+
+def test_merge_keeps_model_values_and_fills_gaps():
+  extractor = LocalExtractor()
+  local = extractor.extract(_message(sender="Jane Doe <jane.doe@acme.com>"))
+  raw = json.dumps(
+    {
+      "people": [{"name": "Bob Lee", "email": "bob@acme.com"}, {"name": "Jane", "email": "JANE.DOE@acme.com", "job_title": ""}],
+      "company": None,
+      "amount": "48000 USD",
+      "dates": [],
+      "summary": "s",
+      "evidence": "e",
+    }
+  )
+
+  merged = json.loads(extractor.merge(raw, local))
+
+  assert [person["email"] for person in merged["people"]] == ["JANE.DOE@acme.com", "bob@acme.com"]
+  assert merged["people"][0]["job_title"] == "Head of Procurement"
+  assert merged["company"]["domain"] == "acme.com"
+  assert merged["amount"] == "48000 USD"
+  assert merged["dates"] == ["March 15, 2026"]
+  assert extractor.stats()["company"] == 1 and extractor.stats()["amount"] == 0
+  assert extractor.merge("not json", local) == "not json"
+
+
+def test_extraction_prompts_list_known_fields():
+  client = GeminiClient.__new__(GeminiClient)
+  prompt = client._build_prompt(_message(sender="Jane Doe <jane.doe@acme.com>"))
+  assert KNOWN_FIELDS_INSTRUCTIONS.split("{known}")[0] in prompt
+  assert '"job_title": "Head of Procurement"' in prompt
+
+  routing_prompt = client._build_routing_prompt(_message(sender="Jane Doe <jane.doe@acme.com>"))
+  assert "KNOWN FIELDS" not in routing_prompt
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from functools import partial
+
+from app.services import llm as llm_module
+from app.services import long_text as long_text_module
+from app.services.gemini_keys import GeminiKeyPool
+from app.services.gmail_ingest import AttachmentText
+from app.services.llm import AsyncGeminiClient
+from app.services.long_text import MAX_CHUNKS, LongTextReducer, split_chunks
+from app.storage.llm_cache import LlmResponseCache
+from tests.conftest import make_message
+from tests.gemini_stand_in import GeminiStandIn
+
+
+_message = partial(make_message, "msg_long", subject="Contract renewal")
+
+
+def _paragraphs(count: int) -> str:
+  return "\n\n".join(f"Paragraph {idx}: " + " ".join(["term"] * 30) for idx in range(count))
+
+
+def test_split_chunks_respects_paragraphs_and_caps_chunk_count():
+  text = _paragraphs(6)
+  chunks = split_chunks(text, 100)
+  assert len(chunks) == 3
+  assert all(chunk.startswith("Paragraph") for chunk in chunks)
+  assert "\n\n".join(chunks) == text
+
+  # A paragraph larger than a chunk is hard-split.
+  assert [len(chunk) for chunk in split_chunks("x" * 1000, 100)] == [400, 400, 200]
+  # Too many chunks: they grow instead.
+  assert len(split_chunks("y" * 40000, 10)) <= MAX_CHUNKS
+
+
+def test_map_runs_under_the_cap_and_falls_back_past_the_deadline(monkeypatch):
+  in_flight, peak = [0], [0]
+
+  class FakeClient:
+    async def summarize_chunk(self, email, chunk, index, total, *, user_id=None):
+      in_flight[0] += 1
+      peak[0] = max(peak[0], in_flight[0])
+      try:
+        await asyncio.sleep(5 if index == 3 else 0.01)
+        if index == 2:
+          return "not json"
+        return json.dumps({"facts": [f"fact from part {index}"]})
+      finally:
+        in_flight[0] -= 1
+
+  monkeypatch.setattr(long_text_module, "async_gemini_client", FakeClient())
+  reducer = LongTextReducer(min_tokens=100, chunk_tokens=100, concurrency=2, deadline_seconds=0.5)
+  email = _message(_paragraphs(4), attachments=[AttachmentText(filename="terms.pdf", mime_type="application/pdf", text=_paragraphs(4))])
+
+  short = _message("Quick question")
+  assert asyncio.run(reducer.areduce(short)) is short
+
+  reduced = asyncio.run(reducer.areduce(email))
+  assert peak[0] == 2
+  body = reduced.body_text
+  assert "[Part 1/4]\n- fact from part 1" in body
+  assert "[Part 2/4]\n(excerpt)\nParagraph" in body  # unparseable answer
+  assert "[Part 3/4]\n(excerpt)\nAttachment: terms.pdf" in body  # still running at the deadline
+  assert body.index("[Part 3/4]") < body.index("[Part 4/4]")
+  assert reduced.attachments[0].filename == "terms.pdf" and not reduced.attachments[0].text
+  assert reduced.consolidated_text == body
+
+  stats = reducer.stats()
+  assert (stats["emails"], stats["chunks"], stats["condensed"], stats["fallback"]) == (1, 4, 2, 2)
+
+
+def test_retry_only_repeats_unfinished_chunks(monkeypatch, tmp_path):
+  monkeypatch.setattr(llm_module, "llm_cache", LlmResponseCache(tmp_path / "cache.sqlite3"))
+  monkeypatch.setattr(llm_module.settings, "llm_streaming_enabled", False)
+  reducer = LongTextReducer(min_tokens=100, chunk_tokens=100, concurrency=1)
+  email = _message(_paragraphs(6))
+
+  with GeminiStandIn(json.dumps({"facts": ["renewal due in May"]}), statuses=[400]) as stand_in:
+
+    async def scenario():
+      client = AsyncGeminiClient(max_in_flight=2)
+      client.endpoint = stand_in.url
+      client.key_pool = GeminiKeyPool(["key-a"])
+      monkeypatch.setattr(long_text_module, "async_gemini_client", client)
+      first = await reducer.areduce(email)
+      second = await reducer.areduce(email)
+      await client.aclose()
+      return first, second
+
+    first, second = asyncio.run(scenario())
+
+  assert "(excerpt)" in first.body_text
+  assert "(excerpt)" not in second.body_text
+  # Three chunks on the first pass (one failed), then only the failed one again.
+  assert len(stand_in.requests) == 4
@@ -0,0 +1,74 @@
+import base64
+from datetime import datetime, timezone
+from functools import partial
+
+from app.services import gmail_ingest as gmail_ingest_module
+from app.services.gmail_ingest import AttachmentText, GmailIngestor, message_to_snapshot
+from app.storage.message_snapshots import MessageSnapshotStore
+from tests.conftest import make_message
+
+
+_message = partial(
+  make_message,
+  thread_id="thr_1",
+  subject="Signed contract",
+  recipients=["sales@ours.example"],
+  sent_at=datetime(2026, 3, 2, 9, 30, tzinfo=timezone.utc),
+  snippet="See attached",
+  body="Contract attached. " * 200,
+  attachments=[AttachmentText(filename="contract.pdf", mime_type="application/pdf", text="Term: 12 months")],
+  headers={"Subject": "Signed contract"},
+)
+
+
+def test_snapshots_round_trip_compressed_and_expire(tmp_path):
+  store = MessageSnapshotStore(tmp_path / "snapshots.sqlite3")
+  store.put("user-1", "msg_1", message_to_snapshot(_message()))
+
+  restored = gmail_ingest_module.message_from_snapshot(store.get("user-1", "msg_1"))
+  assert restored == _message()
+  assert store.get("user-2", "msg_1") is None
+  assert store.stats()["compression_ratio"] < 0.2
+
+  expired = MessageSnapshotStore(tmp_path / "expired.sqlite3", ttl_seconds=-1)
+  expired.put("user-1", "msg_1", message_to_snapshot(_message()))
+  assert expired.get("user-1", "msg_1") is None
+
+
+def test_fetch_message_reads_the_snapshot_before_gmail(monkeypatch, tmp_path):
+  store = MessageSnapshotStore(tmp_path / "snapshots.sqlite3")
+  monkeypatch.setattr(gmail_ingest_module, "message_snapshots", store)
+  ingestor = GmailIngestor()
+  fetched = []
+
+  def fetch_detail(service, message_id):
+    fetched.append(message_id)
+    return _message()
+
+  monkeypatch.setattr(ingestor, "_service", lambda user_id: object())
+  monkeypatch.setattr(ingestor, "_fetch_message_detail", fetch_detail)
+
+  assert ingestor.fetch_message("user-1", "msg_1") == _message()
+  assert ingestor.fetch_message("user-1", "msg_1") == _message()
+  assert fetched == ["msg_1"]
+  ingestor.fetch_message("user-1", "msg_1", refresh=True)
+  assert fetched == ["msg_1", "msg_1"]
+
+
+def test_raw_messages_without_attachments_parse_without_downloads():
+  ingestor = GmailIngestor()
+  raw = {
+    "id": "msg_2",
+    "threadId": "thr_2",
+    "snippet": "Hello",
+    "payload": {
+      "headers": [{"name": "From", "value": "bob@acme.com"}, {"name": "Subject", "value": "Hi"}],
+      "parts": [{"mimeType": "text/plain", "body": {"data": base64.urlsafe_b64encode(b"Hello there").decode()}}],
+    },
+  }
+  assert not ingestor.has_attachments(raw)
+  parsed = ingestor.parse_message(raw, [])
+  assert (parsed.sender, parsed.body_text, parsed.attachments) == ("bob@acme.com", "Hello there", [])
+
+  raw["payload"]["parts"].append({"filename": "a.pdf", "mimeType": "application/pdf", "body": {"attachmentId": "att"}})
+  assert ingestor.has_attachments(raw)
@@ -0,0 +1,104 @@
+import asyncio
+import json
+from functools import partial
+
+import pytest
+
+from app.services import ai_router as ai_router_module
+from app.services.ai_router import ai_router
+from app.services.llm_resilience import GeminiUnavailableError
+from app.services.model_cascade import ModelCascade
+from tests.conftest import make_message
+
+EXTRACTION = {"people": [], "summary": "Quote request", "evidence": "Quote for 100 licenses"}
+
+
+_message = partial(make_message, subject="Quote request", sender="Jane Doe <jane@acme.com>")
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+  cascade = ModelCascade(enabled=True, model="flash-lite")
+  monkeypatch.setattr(ai_router_module, "model_cascade", cascade)
+  monkeypatch.setattr(ai_router_module, "near_duplicate_index", ai_router_module.near_duplicate_index.__class__())
+  return cascade
+
+
+def test_cascade_escalates_on_judge_or_unavailable_cheap_model():
+  cascade = ModelCascade(enabled=True, model="lite")
+  models = []
+
+  def call(model):
+    models.append(model)
+    if model == "lite" and len(models) > 2:
+      raise GeminiUnavailableError("All Gemini API keys exhausted.")
+    return 0.9 if model is None or len(models) == 1 else 0.3
+
+  judge = lambda confidence: "low_confidence" if confidence < 0.7 else None
+  assert [cascade.run("routing", call, judge) for _ in range(3)] == [0.9, 0.9, 0.9]
+  assert models == ["lite", "lite", None, "lite", None]
+
+  stats = cascade.stats()["purposes"]["routing"]
+  assert (stats["calls"], stats["escalated"]) == (3, 2)
+  assert stats["reasons"] == {"low_confidence": 1, "cheap_unavailable": 1}
+  assert stats["mean_full_ms"] is not None and stats["estimated_saved_ms"] is not None
+
+  # Disabled: straight to the purpose's own model.
+  assert ModelCascade(enabled=False).run("routing", lambda model: model, judge) is None
+
+
+def test_combined_call_escalates_low_confidence_and_invalid_extraction(monkeypatch, cascade):
+  calls = []
+
+  async def fake_analyze_and_route(email, *, user_id=None, model=None):
+    calls.append((email.message_id, model))
+    if model is None:
+      routing, extraction = {"primary_object": "deals", "confidence": 0.95}, EXTRACTION
+    elif email.message_id == "easy":
+      routing, extraction = {"primary_object": "deals", "confidence": 0.9}, EXTRACTION
+    elif email.message_id == "hard":
+      routing, extraction = {"primary_object": "contacts", "confidence": 0.4}, EXTRACTION
+    else:
+      routing, extraction = {"primary_object": "deals", "confidence": 0.9}, {"people": "nobody"}
+    return json.dumps({"routing": routing, "extraction": extraction})
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "analyze_and_route", fake_analyze_and_route)
+
+  async def scenario():
+    return [
+      await ai_router.aclassify_and_extract(_message(message_id, f"body of {message_id}"), shortcuts_checked=True)
+      for message_id in ("easy", "hard", "broken")
+    ]
+
+  results = asyncio.run(scenario())
+  assert [routing.confidence for routing, _ in results] == [0.9, 0.95, 0.95]
+  assert calls == [("easy", "flash-lite"), ("hard", "flash-lite"), ("hard", None), ("broken", "flash-lite"), ("broken", None)]
+  assert cascade.stats()["purposes"]["combined"]["reasons"] == {"low_confidence": 1, "invalid_extraction": 1}
+
+
+def test_packed_routing_repacks_only_weak_answers(monkeypatch, cascade):
+  packs = []
+
+  async def fake_classify_email_routes(emails, *, user_id=None, model=None):
+    packs.append((sorted(emails), model))
+    confidence = {"E1": 0.9, "E2": 0.2, "E3": 0.3} if model else {}
+    return json.dumps(
+      [{"id": key, "primary_object": "deals", "confidence": confidence.get(key, 0.99)} for key in emails]
+    )
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "classify_email_routes", fake_classify_email_routes)
+  messages = [_message(f"msg_{idx}", f"body {idx}") for idx in range(3)]
+
+  decisions = asyncio.run(ai_router.aclassify_batch(messages, batch_size=3))
+
+  assert [d.confidence for d in decisions] == [0.9, 0.99, 0.99]
+  assert packs == [(["E1", "E2", "E3"], "flash-lite"), (["E1", "E2"], None)]
+  stats = cascade.stats()["purposes"]["routing_batch"]
+  assert (stats["calls"], stats["escalated"]) == (3, 2)
+
+
+def test_purpose_models_come_from_settings(monkeypatch):
+  monkeypatch.setattr(ai_router_module.settings, "llm_purpose_models_raw", "routing=flash-lite, analysis=flash-pro")
+  assert ai_router_module.settings.llm_purpose_models == {"routing": "flash-lite", "analysis": "flash-pro"}
+  assert ai_router_module.async_gemini_client.model_for("routing") == "flash-lite"
+  assert ai_router_module.async_gemini_client.model_for("combined") == ai_router_module.settings.gemini_model
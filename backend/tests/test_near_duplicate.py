@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+from app.services import ai_router as ai_router_module
+from app.services.ai_router import ai_router
+from app.services.gmail_ingest import GmailMessage
+from app.services.near_duplicate import NearDuplicateIndex, hamming, normalize_text, simhash
+from tests.conftest import make_message
+
+BODY = (
+  "Hi team, I would like a quote for {seats} seats of the enterprise plan for our office. "
+  "Please include onboarding and support pricing, and send the order form to {address}. Thanks, Jane"
+)
+
+
+def _message(message_id, seats=50, address="jane@acme.com", sender="Jane <jane@acme.com>", body=None) -> GmailMessage:
+  body = body if body is not None else BODY.format(seats=seats, address=address)
+  return make_message(message_id, body, subject="Enterprise quote", sender=sender, snippet="snippet")
+
+
+def test_normalization_ignores_volatile_tokens():
+  first = normalize_text("Quote", "Order 1234 at https://a.example/x?id=1 from bob@a.com")
+  second = normalize_text("Quote", "Order 98 at https://b.example/y from sue@b.org")
+  assert first == second
+  assert simhash(first) == simhash(second)
+  assert hamming(0b1011, 0b0001) == 2
+
+
+def test_index_finds_near_duplicates_within_scope():
+  index = NearDuplicateIndex(max_distance=3)
+  index.record("user-1", _message("m1"), {"primary_object": "deals"})
+
+  hit = index.lookup("user-1", _message("m2", seats=75, address="ops@acme.com"))
+  assert hit is not None and hit.message_id == "m1"
+  assert index.lookup("user-2", _message("m3")) is None
+  assert index.lookup("user-1", _message("m4", sender="x@other.com")) is None
+  assert index.lookup("user-1", _message("m5", body="Totally unrelated note about the offsite agenda and travel plans for the whole sales team next spring")) is None
+  assert index.lookup("user-1", _message("m6", body="thanks!")) is None
+
+  stats = index.stats()
+  assert stats["hits"] == 1
+  assert stats["recorded"] == 1
+
+
+def test_index_evicts_oldest_entries():
+  index = NearDuplicateIndex(max_entries=1)
+  index.record("user-1", _message("m1"), {"primary_object": "deals"})
+  index.record("user-1", _message("m2", body="A different request entirely: please cancel our support renewal and refund the last invoice for the account"), {})
+  assert index.lookup("user-1", _message("m3")) is None
+
+
+def test_duplicate_reuses_routing_and_only_extracts(monkeypatch):
+  index = NearDuplicateIndex()
+  monkeypatch.setattr(ai_router_module, "near_duplicate_index", index)
+  combined = {
+    "routing": {"primary_object": "deals", "target_crm": ["hubspot"], "confidence": 0.9, "intent": "sales"},
+    "extraction": {"summary": "quote", "evidence": "quote"},
+  }
+  calls = []
+
+  async def analyze_and_route(email, **kwargs):
+    calls.append(("combined", email.message_id))
+    return json.dumps(combined)
+
+  async def analyze_email(email, **kwargs):
+    calls.append(("analysis", email.message_id))
+    return json.dumps({"summary": "quote", "evidence": "quote"})
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "analyze_and_route", analyze_and_route)
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "analyze_email", analyze_email)
+
+  first, _ = asyncio.run(ai_router.aclassify_and_extract(_message("m1"), user_id="user-1"))
+  second, raw = asyncio.run(ai_router.aclassify_and_extract(_message("m2", seats=80), user_id="user-1"))
+
+  assert first.source == "llm"
+  assert second.primary_object == "deals"
+  assert second.source == "dedupe:m1"
+  assert json.loads(raw)["summary"] == "quote"
+  assert calls == [("combined", "m1"), ("analysis", "m2")]
@@ -0,0 +1,48 @@
+import asyncio
+import json
+from functools import partial
+
+from app.services import ai_router as ai_router_module
+from app.services.ai_router import ai_router
+from app.services.gmail_ingest import AttachmentText
+from app.services.pre_router import DEFAULT_RULES, PreRouter
+from tests.conftest import make_message
+
+
+_message = partial(make_message, "msg_rule", "body", subject="Pricing question", snippet="snippet")
+
+
+def test_default_rules():
+  router = PreRouter(DEFAULT_RULES)
+  assert router.match(_message(headers={"List-Unsubscribe": "<mailto:x>"})).name == "newsletter"
+  assert router.match(_message(headers={"Auto-Submitted": "auto-replied"})).name == "auto_reply"
+  assert router.match(_message(headers={"Auto-Submitted": "no"})) is None
+  assert router.match(_message(sender="GitHub <noreply@github.com>")).name == "no_reply_sender"
+  invite = AttachmentText(filename="invite.ics", mime_type="text/calendar", text=None)
+  assert router.match(_message(attachments=[invite])).name == "calendar_invite"
+  assert router.match(_message()) is None
+
+  stats = router.stats()
+  assert stats["evaluated"] == 6
+  assert stats["hits"] == 4
+  assert stats["rules"]["newsletter"]["hits"] == 1
+
+
+def test_sender_domain_rule_matches_subdomains():
+  router = PreRouter([{"name": "jobs", "primary_object": "none", "sender_domains": ["linkedin.com"]}])
+  assert router.match(_message(sender="jobs@mail.linkedin.com")).name == "jobs"
+  assert router.match(_message(sender="me@notlinkedin.com")) is None
+
+
+def test_rule_hit_skips_llm(monkeypatch):
+  def fail(*args, **kwargs):
+    raise AssertionError("LLM should not be called")
+
+  monkeypatch.setattr(ai_router_module.async_gemini_client, "analyze_and_route", fail)
+
+  message = _message(headers={"Precedence": "bulk"}, subject="Weekly digest")
+  routing, raw_json = asyncio.run(ai_router.aclassify_and_extract(message))
+
+  assert routing.primary_object == "campaigns"
+  assert routing.source == "rule:newsletter"
+  assert json.loads(raw_json)["summary"] == "Weekly digest"
@@ -0,0 +1,39 @@
+from functools import partial
+
+from app.services.gmail_ingest import AttachmentText
+from app.services.prompt_budget import PromptBudgeter, estimate_tokens, split_quoted_history
+from tests.conftest import make_message
+
+
+_message = partial(make_message, "msg_budget", subject="Renewal", sender="ops@acme.com")
+
+
+def test_split_quoted_history():
+  body = "Can we renew at 10 seats?\n\nOn Mon, Jan 6, 2025 at 9:00 AM Bob <bob@x.com> wrote:\n> old text"
+  latest, history = split_quoted_history(body)
+  assert latest == "Can we renew at 10 seats?"
+  assert history.startswith("On Mon")
+
+
+def test_small_prompt_is_untouched():
+  message = _message("short body")
+  context, report = PromptBudgeter(1000).build_context(message, reserved_tokens=100)
+  assert context == message.consolidated_text
+  assert not report.trimmed
+
+
+def test_budget_prioritizes_body_over_attachments_and_history():
+  latest = "Please send the signed order form. " * 20
+  history = "-----Original Message-----\n" + "older reply " * 400
+  sheet = AttachmentText(filename="report.xlsx", mime_type="application/vnd.ms-excel", text="row,value\n" * 2000)
+  message = _message(latest + "\n" + history, attachments=[sheet])
+  budgeter = PromptBudgeter(600)
+
+  context, report = budgeter.build_context(message, reserved_tokens=200)
+
+  assert latest.strip() in context
+  assert estimate_tokens(context) <= 400
+  trimmed = {entry["section"]: entry for entry in report.trimmed_sections()}
+  assert "attachment:report.xlsx" in trimmed
+  assert trimmed["quoted_history"]["dropped"] is True
+  assert budgeter.stats()["trimmed_prompts"] == 1
@@ -0,0 +1,157 @@
+import asyncio
+import json
+from functools import partial
+
+from app.routers import pipeline as pipeline_module
+from app.services.ai_router import RoutingDecision
+from app.storage.analysis_store import AnalysisArtifactStore
+from app.storage.stage_checkpoints import StageCheckpointStore
+from app.storage.write_buffer import SupabaseWriteBuffer
+from tests.conftest import make_message
+
+
+class _Table:
+  def __init__(self, rows):
+    self.rows = rows
+
+  def upsert(self, rows, on_conflict=None):
+    self.rows.extend(rows if isinstance(rows, list) else [rows])
+    return self
+
+  def execute(self):
+    return None
+
+
+class _Supabase:
+  def __init__(self):
+    self.rows = []
+
+  def table(self, name):
+    return _Table(self.rows)
+
+
+_message = partial(
+  make_message,
+  body="Could you send a quote for 20 seats? Budget is $9,000.",
+  subject="Quote for 20 seats",
+  sender="Jane Doe <jane@acme.com>",
+)
+
+
+def test_checkpoint_records_stages_partials_and_failures(tmp_path):
+  store = StageCheckpointStore(tmp_path / "checkpoints.sqlite3")
+  assert store.load("user-1", "msg_1").first_incomplete() == "fetch"
+
+  store.record("user-1", "msg_1", "fetch")
+  store.record("user-1", "msg_1", "route", {"primary_object": "deals"})
+  store.record_partial("user-1", "msg_1", {"contact_id": "c1"})
+  store.mark_failed("user-1", "msg_1", "HubSpot 500")
+
+  checkpoint = store.load("user-1", "msg_1")
+  assert checkpoint.first_incomplete() == "extract"
+  assert (checkpoint.partial, checkpoint.error) == ({"contact_id": "c1"}, "HubSpot 500")
+  assert [item.message_id for item in store.failed("user-1")] == ["msg_1"]
+
+  # Completing a stage clears the interrupted stage's partial output and the error.
+  store.record("user-1", "msg_1", "extract", "{}")
+  checkpoint = store.load("user-1", "msg_1")
+  assert (checkpoint.partial, checkpoint.error) == ({}, None)
+  assert store.failed("user-1") == []
+
+
+def test_prompt_version_bump_drops_analysis_outputs_but_keeps_crm_progress(tmp_path):
+  path = tmp_path / "checkpoints.sqlite3"
+  old = StageCheckpointStore(path, version="v1")
+  for stage in ("fetch", "route", "extract", "validate", "plan"):
+    old.record("user-1", "msg_1", stage, {"stage": stage})
+  old.record_partial("user-1", "msg_1", {"contact_id": "c1"})
+  old.mark_failed("user-1", "msg_1", "HubSpot 500")
+
+  checkpoint = StageCheckpointStore(path, version="v2").load("user-1", "msg_1")
+  assert list(checkpoint.outputs) == ["fetch"]
+  assert checkpoint.first_incomplete() == "route"
+  assert (checkpoint.partial, checkpoint.error) == ({"contact_id": "c1"}, "HubSpot 500")
+  assert old.load("user-1", "msg_1").first_incomplete() == "crm_write"
+
+
+def test_retry_resumes_crm_write_without_repeating_llm_calls_or_objects(monkeypatch, tmp_path):
+  checkpoints = StageCheckpointStore(tmp_path / "checkpoints.sqlite3")
+  monkeypatch.setattr(pipeline_module, "stage_checkpoints", checkpoints)
+  monkeypatch.setattr(pipeline_module, "analysis_store", AnalysisArtifactStore(tmp_path / "artifacts.sqlite3"))
+  llm_calls, crm_calls = [], []
+
+  async def classify_and_extract(email, *, user_id=None, shortcuts_checked=False, on_routing=None, use_cache=True):
+    llm_calls.append(email.message_id)
+    decision = RoutingDecision(primary_object="deals", confidence=0.9, intent="sales")
+    extraction = {"people": [{"name": "Jane Doe", "email": "jane@acme.com"}], "summary": "Quote", "evidence": "seats"}
+    return decision, json.dumps(extraction)
+
+  def execute_enhanced_plan(user_id, plan, *, resume=None, on_progress=None):
+    crm_calls.append(dict(resume or {}))
+    result = dict(resume or {})
+    if "contact_id" not in result:
+      result["contact_id"] = "contact-1"
+      on_progress(dict(result))
+    if len(crm_calls) == 1:
+      raise RuntimeError("HubSpot deals API unavailable")
+    return {**result, "deal_id": "deal-1"}
+
+  monkeypatch.setattr(pipeline_module.ai_router, "aclassify_and_extract", classify_and_extract)
+  monkeypatch.setattr(pipeline_module.hubspot_client, "execute_enhanced_plan", execute_enhanced_plan)
+  monkeypatch.setattr(pipeline_module.hubspot_client, "prefetch", lambda user_id, email: None)
+  supabase = _Supabase()
+
+  def process(**kwargs):
+    async def run():
+      async with SupabaseWriteBuffer(supabase, "gmail_messages", on_conflict="user_id,message_id") as rows:
+        return await pipeline_module._process_message("user-1", _message(), True, rows, **kwargs)
+
+    return asyncio.run(run())
+
+  first = process()
+  assert first is None and supabase.rows[-1]["status"] == "error"
+  failed = checkpoints.load("user-1", "msg_1")
+  assert failed.first_incomplete() == "crm_write"
+  assert failed.partial == {"contact_id": "contact-1"}
+  assert "unavailable" in failed.error
+  assert failed.execute_hubspot is True
+
+  second = process(shortcuts_checked=False)
+  assert second["hubspot"] == {"contact_id": "contact-1", "deal_id": "deal-1"}
+  assert llm_calls == ["msg_1"]
+  assert crm_calls == [{}, {"contact_id": "contact-1"}]
+  assert checkpoints.load("user-1", "msg_1").first_incomplete() is None
+
+  # Once written, the CRM stage is not repeated either.
+  process()
+  assert len(crm_calls) == 2
+
+  # Forcing starts over: analysis and the CRM write run again, without resuming stale ids.
+  checkpoints.record_partial("user-1", "msg_1", {"contact_id": "stale"})
+
+  async def forced():
+    done = await pipeline_module._analysis_graph("user-1", _message(), force=True).run()
+    return await pipeline_module._execute_hubspot("user-1", done["plan"], None, done["prior"])
+
+  assert asyncio.run(forced())["deal_id"] == "deal-1"
+  assert llm_calls == ["msg_1", "msg_1"]
+  assert crm_calls[-1] == {} and len(crm_calls) == 3
+
+
+def test_retry_defaults_to_the_failed_runs_hubspot_intent(monkeypatch, tmp_path):
+  from fastapi.testclient import TestClient
+
+  from app.main import app
+
+  checkpoints = StageCheckpointStore(tmp_path / "checkpoints.sqlite3")
+  monkeypatch.setattr(pipeline_module, "stage_checkpoints", checkpoints)
+  monkeypatch.setattr(pipeline_module, "_resolve_message_identifiers", lambda user_id, raw: (raw, None))
+  for stage in ("fetch", "route", "extract", "validate", "plan"):
+    checkpoints.record("user-1", "msg_1", stage)
+  checkpoints.mark_failed("user-1", "msg_1", "Supabase 503", execute_hubspot=False)
+
+  # The failed run only analysed the message, so the retry must not go on to write HubSpot.
+  response = TestClient(app).post("/api/pipeline/retry", json={"user_id": "user-1", "message_id": "msg_1"})
+  assert response.status_code == 200
+  assert response.json()["status"] == "complete"
+  assert response.json()["checkpoint"]["execute_hubspot"] is False
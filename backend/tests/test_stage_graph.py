@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.stage_graph import StageGraph
+
+
+def test_independent_stages_overlap_and_dependents_see_results():
+  async def sleep_then(value, delay=0.1):
+    await asyncio.sleep(delay)
+    return value
+
+  graph = (
+    StageGraph()
+    .add("routing", lambda _: sleep_then("deals"))
+    .add("hubspot_token", lambda _: sleep_then("token"))
+    .add("plan", lambda done: sleep_then(f"{done['routing']}:{done['hubspot_token']}"), after=("routing", "hubspot_token"))
+  )
+  start = time.perf_counter()
+  results = asyncio.run(graph.run())
+  elapsed = time.perf_counter() - start
+
+  assert results["plan"] == "deals:token"
+  assert elapsed < 0.28  # two levels of 0.1s, not three stages back to back
+  assert set(graph.timings) == {"routing", "hubspot_token", "plan"}
+
+
+def test_failure_cancels_pending_stages():
+  cancelled = []
+
+  async def slow(_):
+    try:
+      await asyncio.sleep(1)
+    except asyncio.CancelledError:
+      cancelled.append(True)
+      raise
+
+  async def boom(_):
+    raise RuntimeError("gemini down")
+
+  graph = StageGraph().add("slow", slow).add("analysis", boom).add("plan", slow, after=("analysis",))
+  with pytest.raises(RuntimeError, match="gemini down"):
+    asyncio.run(graph.run())
+  assert cancelled == [True]
+
+  with pytest.raises(ValueError):
+    StageGraph().add("plan", slow, after=("analysis",))
@@ -0,0 +1,97 @@
+import asyncio
+
+from app.storage.write_buffer import SupabaseWriteBuffer
+
+
+class _Supabase:
+  def __init__(self, reject=lambda rows: False):
+    self.requests = []
+    self.reject = reject
+
+  def table(self, name):
+    return _Upsert(self)
+
+
+class _Upsert:
+  def __init__(self, client):
+    self.client = client
+    self.rows = None
+
+  def upsert(self, rows, on_conflict=None):
+    self.rows = rows if isinstance(rows, list) else [rows]
+    return self
+
+  def execute(self):
+    if self.client.reject(self.rows):
+      raise RuntimeError("invalid input syntax")
+    self.client.requests.append([row["message_id"] for row in self.rows])
+
+
+def _row(message_id, status="ai_analyzed", **extra):
+  return {"user_id": "user-1", "message_id": message_id, "status": status, **extra}
+
+
+def test_flushes_on_batch_size_and_keeps_the_latest_row_per_key():
+  supabase = _Supabase()
+
+  async def scenario():
+    async with SupabaseWriteBuffer(supabase, "gmail_messages", on_conflict="user_id,message_id", batch_size=3) as rows:
+      await rows.add(_row("m1", status="error"))
+      await rows.add(_row("m1"))
+      await rows.add(_row("m2"))
+      assert supabase.requests == []
+      await rows.add(_row("m3"))
+      assert supabase.requests == [["m1", "m2", "m3"]]
+      await rows.add(_row("m4"))
+    return rows.stats()
+
+  stats = asyncio.run(scenario())
+  # The rest is written when the block ends.
+  assert supabase.requests == [["m1", "m2", "m3"], ["m4"]]
+  assert (stats["rows"], stats["batches"]) == (4, 2)
+
+
+def test_flushes_after_the_delay_and_on_cancellation():
+  supabase = _Supabase()
+
+  async def scenario():
+    rows = SupabaseWriteBuffer(supabase, "gmail_messages", on_conflict="user_id,message_id", flush_seconds=0.05)
+    await rows.add(_row("m1"))
+    await asyncio.sleep(0.2)
+    assert supabase.requests == [["m1"]]
+
+    async def run():
+      async with rows:
+        await rows.add(_row("m2"))
+        await asyncio.sleep(10)
+
+    task = asyncio.create_task(run())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+  asyncio.run(scenario())
+  assert supabase.requests == [["m1"], ["m2"]]
+
+
+def test_failed_batches_fall_back_to_single_rows():
+  supabase = _Supabase(reject=lambda rows: any(row["message_id"] == "bad" for row in rows))
+  failed = []
+
+  async def scenario():
+    async with SupabaseWriteBuffer(
+      supabase,
+      "gmail_messages",
+      on_conflict="user_id,message_id",
+      on_row_failed=lambda row, exc: failed.append(row["message_id"]),
+    ) as rows:
+      for message_id in ("m1", "bad", "m2"):
+        await rows.add(_row(message_id))
+      # A differently shaped row goes out in its own request.
+      await rows.add(_row("m3", ai_summary="Quote"))
+    return rows.stats()
+
+  stats = asyncio.run(scenario())
+  assert supabase.requests == [["m1"], ["m2"], ["m3"]]
+  assert failed == ["bad"]
+  assert (stats["row_fallbacks"], stats["failed"], stats["rows"]) == (3, 1, 3)